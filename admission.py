@@ -0,0 +1,146 @@
+import functools
+import math
+import time
+from collections import OrderedDict
+
+from .metrics import METRICS
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "notified")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.notified = False  # 本轮限流是否已提示过，避免对刷屏者逐条回复
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost, now):
+        """取得 cost 个令牌还需等待的秒数，足够时为 0（不扣除令牌）"""
+        self._refill(now)
+        # 单次消耗超过桶容量时按装满计算，避免大批量请求永远无法通过
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost):
+        self.tokens -= min(cost, self.burst)
+        self.notified = False
+
+
+class AdmissionController:
+    """命令准入控制：按发送者与群聊分别限流，并合并同一会话中正在处理的相同请求
+
+    每个发送者、每个群各有一个令牌桶，两者都有足够令牌时才放行并同时扣除；
+    同一会话发出的相同命令在前一次处理完成前不会重复执行。
+    """
+
+    def __init__(self, user_rate=6.0, user_burst=5.0, group_rate=20.0, group_burst=15.0,
+                 merge_inflight=True, max_buckets=4096):
+        # 速率配置单位为 次/分钟，内部换算为 次/秒
+        self.user_rate = max(0.0, float(user_rate)) / 60.0
+        self.user_burst = max(1.0, float(user_burst))
+        self.group_rate = max(0.0, float(group_rate)) / 60.0
+        self.group_burst = max(1.0, float(group_burst))
+        self.merge_inflight = merge_inflight
+        self.max_buckets = max(1, int(max_buckets))
+        self._buckets = OrderedDict()  # (类型, ID) -> TokenBucket
+        self._inflight = set()  # (会话, 命令文本)
+
+    def _bucket(self, kind, ident, rate, burst, now):
+        key = (kind, ident)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, burst, now)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, origin, request, sender, group, cost=1.0):
+        """申请执行一个请求，返回 (凭据, 提示文本)
+
+        放行时凭据不为 None，处理结束后必须调用 release；
+        被拒绝时凭据为 None，提示文本为 None 表示本轮已提示过，应静默忽略。
+        """
+        key = (origin, request)
+        if self.merge_inflight and key in self._inflight:
+            METRICS.inc("admission_merged_total")
+            return None, "⏳ 相同的请求正在处理中，结果稍后发送，请勿重复发送"
+
+        now = time.monotonic()
+        buckets = [("", self._bucket("user", sender, self.user_rate, self.user_burst, now))]
+        if group:
+            buckets.append(("本群", self._bucket("group", group, self.group_rate, self.group_burst, now)))
+        for scope, bucket in buckets:
+            wait = bucket.wait_time(cost, now)
+            if wait > 0:
+                METRICS.inc("admission_rejected_total", scope="group" if scope else "user")
+                if bucket.notified:
+                    return None, None
+                bucket.notified = True
+                retry = "稍后" if math.isinf(wait) else f"{math.ceil(wait)}秒后"
+                return None, f"⏳ {scope}请求过于频繁，请{retry}再试"
+        for _, bucket in buckets:
+            bucket.take(cost)
+
+        if self.merge_inflight:
+            self._inflight.add(key)
+        return key, None
+
+    def release(self, ticket):
+        self._inflight.discard(ticket)
+
+
+def _command_words(event):
+    """命令文本按空白、换行和逗号拆分后的词列表（首个为命令本身，@ 等非文本消息忽略）"""
+    text = "".join(getattr(message, "text", "") for message in event.get_messages())
+    return text.replace(",", " ").split()
+
+
+def admission_controlled(cost=1.0, per_argument=0.0):
+    """命令处理器的准入控制装饰器，放在 @filter.command 之下
+
+    每次调用消耗 cost + per_argument × 参数个数 个令牌；插件需提供
+    _admission（AdmissionController，为 None 时不限制）与 _admission_exempt(event)。
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(self, event, *args, **kwargs):
+            controller = self._admission
+            if controller is None or self._admission_exempt(event):
+                async for item in handler(self, event, *args, **kwargs):
+                    yield item
+                return
+
+            words = _command_words(event)
+            ticket, notice = controller.admit(
+                event.unified_msg_origin, (handler.__name__, " ".join(words)),
+                event.get_sender_id(), event.get_group_id(),
+                cost + per_argument * max(0, len(words) - 1),
+            )
+            if ticket is None:
+                if notice:
+                    yield event.plain_result(notice)
+                return
+            try:
+                async for item in handler(self, event, *args, **kwargs):
+                    yield item
+            finally:
+                controller.release(ticket)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,29 @@
+import asyncio
+import random
+
+
+class BackgroundLoop:
+    """后台周期任务的启动与停止：子类实现 _run，并可重写 enabled 决定是否需要启动"""
+
+    _task = None
+
+    @property
+    def enabled(self):
+        return True
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        raise NotImplementedError
+
+
+async def startup_delay(max_delay):
+    """启动后稍作随机延迟（1 秒到 max_delay 秒）再开始首轮工作，避免与插件加载同时发起大量请求"""
+    await asyncio.sleep(random.uniform(1.0, max(1.0, max_delay)))
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+
+from .ttl_cache import TTLCache
+
+# 查询结果状态
+STATUS_OK = "ok"
+STATUS_INVALID = "invalid"
+STATUS_ERROR = "error"
+
+
+class BalanceResult(str):
+    """余额查询结果：文本即展示内容，同时携带结构化的状态信息
+
+    remaining 为可比较的剩余余额（无法确定时为 None），currency 为其单位。
+    """
+
+    def __new__(cls, text, status=STATUS_OK, remaining=None, currency=""):
+        obj = super().__new__(cls, text)
+        obj.status = status
+        obj.remaining = remaining
+        obj.currency = currency
+        return obj
+
+    def with_text(self, text):
+        """返回状态信息相同、展示文本不同的新结果"""
+        clone = BalanceResult(text)
+        clone.__dict__.update(self.__dict__)
+        return clone
+
+
+def result_status(result):
+    """获取查询结果状态，普通字符串视为查询出错"""
+    return getattr(result, "status", STATUS_ERROR)
+
+
+def hash_api_key(api_key):
+    """计算API密钥的摘要，缓存与存储中不保留明文密钥"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+class BalanceCache:
+    """按 (平台, 密钥摘要) 缓存余额结果的TTL+LRU缓存，并合并并发的相同查询"""
+
+    def __init__(self, ttl=60.0, negative_ttl=15.0, max_entries=512):
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self._store = TTLCache(max_entries)  # key -> 结果
+        self._inflight = {}  # key -> 正在进行的查询任务
+        self._waiters = {}  # 查询任务 -> 等待它的调用方数量
+
+    def _ttl_for(self, result):
+        """成功结果使用常规TTL，无效密钥(401/403)使用较短的负缓存TTL，其余不缓存"""
+        status = result_status(result)
+        if status == STATUS_OK:
+            return self.ttl
+        if status == STATUS_INVALID:
+            return self.negative_ttl
+        return 0.0
+
+    def get(self, key):
+        """读取未过期的缓存，返回 (结果, 数据年龄秒数)，未命中返回 None"""
+        return self._store.get(key)
+
+    def lookup(self, provider, api_key):
+        """按平台和明文密钥读取缓存，返回值同 get"""
+        return self.get((provider, hash_api_key(api_key)))
+
+    def put(self, key, result):
+        self._store.put(key, result, self._ttl_for(result))
+
+    def clear(self):
+        self._store.clear()
+
+    async def fetch(self, provider, api_key, fetcher):
+        """优先返回缓存结果；未命中时执行 fetcher，同一密钥的并发查询共享同一个请求
+
+        返回 (结果, 数据年龄秒数)，新查询的数据年龄为 0。
+        最后一个等待者被取消（超时、被更快的结果取代）时一并取消上游请求。
+        """
+        key = (provider, hash_api_key(api_key))
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        # 已结束（完成回调尚未移除）的任务不再复用，重新发起查询
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._load(key, fetcher))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # shield：某个等待者超时取消时不影响其他共享该请求的等待者
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # 已无其他等待者时没有必要继续请求上游；立即移除该任务，
+            # 之后到达的相同查询发起新请求，而不是加入这个已取消的任务
+            if self._waiters[task] == 1:
+                task.cancel()
+                self._forget(key, task)
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+        return result, 0.0
+
+    def _forget(self, key, task):
+        """从进行中的查询里移除 task（该键已被新任务替换时不动）"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _load(self, key, fetcher):
+        result = await fetcher()
+        self.put(key, result)
+        return result
+
+
+def format_cache_age(age):
+    """格式化缓存数据年龄"""
+    if age < 60:
+        return f"{age:.0f}秒"
+    if age < 3600:
+        return f"{age / 60:.0f}分钟"
+    return f"{age / 3600:.1f}小时"
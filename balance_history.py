@@ -0,0 +1,152 @@
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+
+# 指数加权的时间常数：短期用于“每小时”速率，长期用于“每天”速率与耗尽预测
+SHORT_TAU_HOURS = 6.0
+LONG_TAU_HOURS = 72.0
+# 两次记录间隔过短时不写入，避免缓存/重复查询产生大量冗余行
+MIN_RECORD_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS balance_history (
+    provider TEXT NOT NULL,
+    key_hash TEXT NOT NULL,
+    ts REAL NOT NULL,
+    remaining REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_balance_history_key ON balance_history (provider, key_hash, ts);
+CREATE TABLE IF NOT EXISTS balance_trend (
+    provider TEXT NOT NULL,
+    key_hash TEXT NOT NULL,
+    currency TEXT NOT NULL DEFAULT '',
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    last_remaining REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    rate_short REAL,
+    rate_long REAL,
+    PRIMARY KEY (provider, key_hash)
+);
+"""
+
+
+def _ewma(previous, observed, dt_hours, tau_hours):
+    """按时间间隔加权的指数移动平均：间隔越长，新观测的权重越大"""
+    if previous is None:
+        return observed
+    alpha = 1.0 - math.exp(-dt_hours / tau_hours)
+    return previous + alpha * (observed - previous)
+
+
+class BalanceHistory:
+    """余额历史存储（SQLite WAL）
+
+    每次成功查询写入一行紧凑记录，同时增量更新每个密钥的趋势汇总
+    （消耗速率的指数加权平均），查询趋势时只读汇总行，无需扫描历史。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def record(self, provider, key_hash, remaining, currency="", ts=None):
+        """写入一条余额记录并增量更新趋势，返回是否写入"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT last_ts, last_remaining, samples, rate_short, rate_long FROM balance_trend "
+                "WHERE provider = ? AND key_hash = ?",
+                (provider, key_hash),
+            ).fetchone()
+
+            with conn:
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO balance_trend (provider, key_hash, currency, first_ts, last_ts, last_remaining, samples) "
+                        "VALUES (?, ?, ?, ?, ?, ?, 1)",
+                        (provider, key_hash, currency, ts, ts, remaining),
+                    )
+                else:
+                    last_ts, last_remaining, samples, rate_short, rate_long = row
+                    dt = ts - last_ts
+                    if dt < MIN_RECORD_INTERVAL:
+                        return False
+                    spent = last_remaining - remaining
+                    if spent >= 0:
+                        # 充值（余额增加）不计入消耗速率
+                        dt_hours = dt / 3600.0
+                        observed = spent / dt_hours
+                        rate_short = _ewma(rate_short, observed, dt_hours, SHORT_TAU_HOURS)
+                        rate_long = _ewma(rate_long, observed, dt_hours, LONG_TAU_HOURS)
+                    conn.execute(
+                        "UPDATE balance_trend SET currency = ?, last_ts = ?, last_remaining = ?, samples = ?, "
+                        "rate_short = ?, rate_long = ? WHERE provider = ? AND key_hash = ?",
+                        (currency, ts, remaining, samples + 1, rate_short, rate_long, provider, key_hash),
+                    )
+                conn.execute(
+                    "INSERT INTO balance_history (provider, key_hash, ts, remaining) VALUES (?, ?, ?, ?)",
+                    (provider, key_hash, ts, remaining),
+                )
+            return True
+
+    def trends(self, key_hash, provider=None):
+        """读取密钥的趋势汇总，返回字典列表（可按平台过滤）"""
+        sql = (
+            "SELECT provider, currency, first_ts, last_ts, last_remaining, samples, rate_short, rate_long "
+            "FROM balance_trend WHERE key_hash = ?"
+        )
+        params = [key_hash]
+        if provider:
+            sql += " AND provider = ?"
+            params.append(provider)
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+
+        trends = []
+        for provider, currency, first_ts, last_ts, last_remaining, samples, rate_short, rate_long in rows:
+            hourly = rate_short
+            daily = rate_long * 24 if rate_long is not None else None
+            rate = rate_long if rate_long else rate_short
+            hours_left = last_remaining / rate if rate and rate > 0 else None
+            trends.append({
+                "provider": provider,
+                "currency": currency,
+                "first_ts": first_ts,
+                "last_ts": last_ts,
+                "remaining": last_remaining,
+                "samples": samples,
+                "hourly_rate": hourly,
+                "daily_rate": daily,
+                "hours_left": hours_left,
+            })
+        return trends
+
+    async def arecord(self, *args, **kwargs):
+        return await asyncio.to_thread(self.record, *args, **kwargs)
+
+    async def atrends(self, *args, **kwargs):
+        return await asyncio.to_thread(self.trends, *args, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,171 @@
+import asyncio
+import random
+import time
+
+from astrbot.api import logger
+
+from .background import BackgroundLoop, startup_delay
+from .balance_cache import STATUS_INVALID, STATUS_OK, hash_api_key, result_status
+
+MIN_POLL_SLEEP = 5.0  # 两次轮询之间的最短间隔（秒）
+
+
+class MonitorEntry:
+    """一个被监控的密钥"""
+
+    __slots__ = ("provider", "api_key", "alias", "threshold")
+
+    def __init__(self, provider, api_key, alias, threshold):
+        self.provider = provider
+        self.api_key = api_key
+        self.alias = alias
+        self.threshold = threshold
+
+
+def parse_monitor_entries(lines, known_providers, default_threshold):
+    """解析监控配置，每行格式：平台|密钥|别名|阈值（别名和阈值可省略）
+
+    返回 (监控条目列表, 无效行说明列表)
+    """
+    entries = []
+    errors = []
+    for line in lines or []:
+        parts = [part.strip() for part in str(line).split("|")]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            errors.append(f"格式错误: {line}")
+            continue
+        provider = parts[0].lower()
+        if provider not in known_providers:
+            errors.append(f"未知平台 {parts[0]}，可选: {', '.join(known_providers)}")
+            continue
+        alias = parts[2] if len(parts) > 2 and parts[2] else None
+        threshold = default_threshold
+        if len(parts) > 3 and parts[3]:
+            try:
+                threshold = float(parts[3])
+            except ValueError:
+                errors.append(f"阈值不是数字: {line}")
+                continue
+        entries.append(MonitorEntry(provider, parts[1], alias, threshold))
+    return entries, errors
+
+
+class _Snapshot:
+    __slots__ = ("result", "updated_at", "alerted")
+
+    def __init__(self, result, updated_at, alerted):
+        self.result = result
+        self.updated_at = updated_at
+        self.alerted = alerted
+
+
+class BalanceMonitor(BackgroundLoop):
+    """后台余额监控：按带抖动的周期批量轮询配置的密钥，余额低于阈值或密钥失效时发出预警
+
+    poll_func(provider, api_keys) -> 结果列表（与 api_keys 顺序一致），
+    同一平台的密钥合并为一次批量查询，不同平台之间并发进行；
+    alert_func(text) 用于推送预警消息。
+    """
+
+    def __init__(self, entries, poll_func, alert_func, interval=1800.0, jitter=60.0):
+        self.entries = entries
+        self.interval = max(10.0, float(interval))
+        # 抖动不超过半个周期，否则轮询间隔可能接近0甚至为负
+        self.jitter = min(max(0.0, float(jitter)), self.interval * 0.5)
+        self._poll_func = poll_func
+        self._alert_func = alert_func
+        self._snapshots = {}  # (provider, 密钥摘要) -> _Snapshot
+        self.last_poll_at = None
+
+    @property
+    def stale_after(self):
+        """快照在两个轮询周期内视为有效"""
+        return self.interval * 2 + self.jitter
+
+    @property
+    def enabled(self):
+        return bool(self.entries)
+
+    def snapshot(self, provider, api_key):
+        """返回监控密钥的最新快照 (结果, 数据年龄秒数)，无快照或已过期返回 None"""
+        snap = self._snapshots.get((provider, hash_api_key(api_key)))
+        if snap is None:
+            return None
+        age = time.monotonic() - snap.updated_at
+        if age > self.stale_after:
+            return None
+        return snap.result, age
+
+    def status_rows(self):
+        """返回 [(监控条目, 结果或None, 数据年龄秒数或None)]，用于状态展示"""
+        now = time.monotonic()
+        rows = []
+        for entry in self.entries:
+            snap = self._snapshots.get((entry.provider, hash_api_key(entry.api_key)))
+            if snap is None:
+                rows.append((entry, None, None))
+            else:
+                rows.append((entry, snap.result, now - snap.updated_at))
+        return rows
+
+    async def _run(self):
+        await startup_delay(1.0 + self.jitter)
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"余额监控轮询失败: {e}")
+            await asyncio.sleep(max(MIN_POLL_SLEEP, self.interval + random.uniform(-self.jitter, self.jitter)))
+
+    async def poll_once(self):
+        """轮询全部监控密钥：按平台分组，各组并发批量查询"""
+        groups = {}
+        for entry in self.entries:
+            groups.setdefault(entry.provider, []).append(entry)
+
+        async def _poll_group(provider, group):
+            results = await self._poll_func(provider, [entry.api_key for entry in group])
+            for entry, result in zip(group, results):
+                await self._update(entry, result)
+
+        await asyncio.gather(*(_poll_group(provider, group) for provider, group in groups.items()))
+        self.last_poll_at = time.time()
+
+    async def _update(self, entry, result):
+        key = (entry.provider, hash_api_key(entry.api_key))
+        previous = self._snapshots.get(key)
+        status = result_status(result)
+        if status not in (STATUS_OK, STATUS_INVALID):
+            # 临时错误不覆盖已有快照，也不触发预警
+            return
+
+        remaining = getattr(result, "remaining", None)
+        low = status == STATUS_INVALID or (
+            remaining is not None and entry.threshold is not None and remaining < entry.threshold
+        )
+        alerted = previous.alerted if previous else False
+        if low and not alerted:
+            await self._alert(entry, result)
+            alerted = True
+        elif not low:
+            alerted = False
+        self._snapshots[key] = _Snapshot(result, time.monotonic(), alerted)
+
+    async def _alert(self, entry, result):
+        name = entry.alias or entry.provider
+        if result_status(result) == STATUS_INVALID:
+            text = f"⚠️ 余额监控预警\n密钥 {name}（{entry.provider}）已失效或无权限，请检查"
+        else:
+            currency = getattr(result, "currency", "") or ""
+            text = (
+                f"⚠️ 余额监控预警\n"
+                f"密钥 {name}（{entry.provider}）余额不足\n"
+                f"当前余额: {result.remaining:g} {currency}\n"
+                f"预警阈值: {entry.threshold:g} {currency}"
+            )
+        try:
+            await self._alert_func(text)
+        except Exception as e:
+            logger.warning(f"发送余额预警失败: {e}")
@@ -0,0 +1,84 @@
+"""ping输出解析器的正确性检查与微基准
+
+用法：python bench/ping_parser_bench.py [--iterations N]
+
+逐个解析 bench/fixtures/ping 下的样例输出（按子进程原始字节逐行解码），
+与 expected.json 中的期望值比对，然后统计解析吞吐量。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(ROOT, "bench", "fixtures", "ping")
+sys.path.insert(0, ROOT)
+
+from ping_parser import LineDecoder, PingOutputParser  # noqa: E402
+
+CHECKED_FIELDS = ("sent", "received", "loss", "min", "avg", "max")
+TOLERANCE = 0.001
+
+
+def parse_bytes(data):
+    """模拟流式读取：按行解码并增量解析"""
+    decoder = LineDecoder()
+    parser = PingOutputParser()
+    for line in data.splitlines():
+        parser.feed(decoder.decode(line))
+    return parser.stats()
+
+
+def check_fixtures(fixtures, expected):
+    """返回不符合期望的 (文件名, 字段, 期望值, 实际值) 列表"""
+    mismatches = []
+    for name, data in fixtures.items():
+        stats = parse_bytes(data)
+        for field in CHECKED_FIELDS:
+            want = expected[name][field]
+            got = getattr(stats, field)
+            if want is None or got is None:
+                ok = want is got
+            else:
+                ok = abs(want - got) <= TOLERANCE
+            if not ok:
+                mismatches.append((name, field, want, got))
+    return mismatches
+
+
+def benchmark(fixtures, iterations):
+    """返回 (每份输出平均耗时us, 每秒解析行数)"""
+    total_lines = sum(len(data.splitlines()) for data in fixtures.values()) * iterations
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for data in fixtures.values():
+            parse_bytes(data)
+    elapsed = time.perf_counter() - started
+    return elapsed / (iterations * len(fixtures)) * 1e6, total_lines / elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="ping输出解析器微基准")
+    arg_parser.add_argument("--iterations", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    with open(os.path.join(FIXTURE_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    fixtures = {}
+    for name in sorted(expected):
+        with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+            fixtures[name] = f.read()
+
+    mismatches = check_fixtures(fixtures, expected)
+    print(f"正确性: {len(fixtures) - len({m[0] for m in mismatches})}/{len(fixtures)} 份样例通过")
+    for name, field, want, got in mismatches:
+        print(f"  ❌ {name}: {field} 期望 {want}，实际 {got}")
+
+    per_output_us, lines_per_second = benchmark(fixtures, args.iterations)
+    print(f"性能: 每份输出 {per_output_us:.1f}us，{lines_per_second:,.0f} 行/秒")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
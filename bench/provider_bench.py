@@ -0,0 +1,320 @@
+"""余额查询与IP查询的离线基准
+
+用法：python bench/provider_bench.py [--sizes 1,10,100,1000] [--latency-ms 20] [--error-rate 0.05] [--json 结果.json]
+
+在本地启动模拟各平台接口（硅基流动、OpenAI 账单、DeepSeek、NEW API 令牌用量、ip-api）
+的 aiohttp 服务，把插件中的接口地址指向它，然后用 1~1000 个密钥/地址驱动
+批量余额查询（_stream_batch_query_balance）与单个IP归属地查询（_lookup_ip_geo），统计单次查询 P50/P99 延迟、吞吐量与峰值内存。
+模拟服务可配置响应延迟、5xx 错误率与 429 限流比例，不需要真实密钥和外网。
+
+插件依赖 AstrBot，需在安装了 AstrBot 的 Python 环境中运行。
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.basename(ROOT)
+sys.path.insert(0, os.path.dirname(ROOT))
+
+PROVIDERS = ("siliconflow", "openai", "deepseek", "newapi")
+BENCH_ISP = "Bench ISP"  # 模拟IP数据的运营商，查询结果的 isp 为该值即视为成功
+
+
+class StandInServer:
+    """模拟各平台接口的本地服务，按配置注入延迟、5xx 错误与 429 限流"""
+
+    def __init__(self, latency_ms=20.0, jitter_ms=5.0, error_rate=0.0, rate_429=0.0, retry_after=1, seed=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._runner = None
+        self.base_url = None
+
+    async def start(self):
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get("/v1/user/info", self._siliconflow)
+        app.router.add_get("/v1/dashboard/billing/subscription", self._openai_subscription)
+        app.router.add_get("/v1/dashboard/billing/usage", self._openai_usage)
+        app.router.add_get("/user/balance", self._deepseek)
+        app.router.add_get("/api/usage/token", self._newapi)
+        app.router.add_get("/json/{ip}", self._ip_single)
+        app.router.add_post("/batch", self._ip_batch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        self.requests += 1
+        await asyncio.sleep(max(0.0, self._random.gauss(self.latency, self.jitter)))
+        roll = self._random.random()
+        if roll < self.rate_429:
+            return web.json_response(
+                {"message": "rate limited"}, status=429,
+                headers={"Retry-After": str(self.retry_after), "X-Rl": "0", "X-Ttl": str(self.retry_after)},
+            )
+        if roll < self.rate_429 + self.error_rate:
+            return web.json_response({"message": "internal error"}, status=500)
+        response = await handler(request)
+        response.headers.setdefault("X-Rl", "1000")
+        response.headers.setdefault("X-Ttl", "60")
+        return response
+
+    async def _siliconflow(self, request):
+        return web.json_response({"code": 20000, "status": True, "data": {
+            "id": "bench", "name": "bench", "email": "bench@example.com",
+            "balance": "8.50", "chargeBalance": "1.50", "totalBalance": "10.00",
+        }})
+
+    async def _openai_subscription(self, request):
+        return web.json_response([{"soft_limit_usd": 120.0, "has_payment_method": True, "access_until": 0}])
+
+    async def _openai_usage(self, request):
+        return web.json_response({"total_usage": 1234.0})
+
+    async def _deepseek(self, request):
+        return web.json_response({"is_available": True, "balance_infos": [{
+            "currency": "CNY", "total_balance": "110.00", "granted_balance": "10.00", "topped_up_balance": "100.00",
+        }]})
+
+    async def _newapi(self, request):
+        return web.json_response({"code": True, "message": "", "data": {
+            "object": "token_usage", "name": "bench", "total_granted": 500000, "total_used": 12345,
+            "total_available": 487655, "unlimited_quota": False, "model_limits": {}, "expires_at": 0,
+        }})
+
+    @staticmethod
+    def _ip_record(ip):
+        return {
+            "status": "success", "country": "中国", "countryCode": "CN", "region": "BJ", "regionName": "北京",
+            "city": "北京", "zip": "", "lat": 39.9, "lon": 116.4, "timezone": "Asia/Shanghai",
+            "isp": BENCH_ISP, "org": "Bench Org", "as": "AS64512 Bench", "asname": "BENCH",
+            "mobile": False, "proxy": False, "hosting": True, "query": ip,
+        }
+
+    async def _ip_single(self, request):
+        return web.json_response(self._ip_record(request.match_info["ip"]))
+
+    async def _ip_batch(self, request):
+        return web.json_response([self._ip_record(ip) for ip in await request.json()])
+
+
+def _percentile(values, q):
+    """最近秩法分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def _load_plugin_modules():
+    try:
+        return importlib.import_module(f"{PACKAGE}.main"), importlib.import_module(f"{PACKAGE}.ip_geo")
+    except ImportError as e:
+        print(f"无法导入插件（{e}），请在安装了 AstrBot 的 Python 环境中运行")
+        sys.exit(2)
+
+
+def build_plugin(main, server, args):
+    """创建指向模拟服务的插件实例：关闭历史记录与缓存，保证每次查询都请求上游"""
+    main.SILICONFLOW_API_URL = f"{server.base_url}/v1/user/info"
+    main.OPENAI_API_BASE_URL = server.base_url
+    main.DEEPSEEK_API_URL = f"{server.base_url}/user/balance"
+    config = {
+        "api_config": {
+            "newapi_base_url": server.base_url,
+            "request_timeout": args.timeout,
+            "batch_concurrency": args.batch_concurrency,
+            "per_host_concurrency": args.per_host_concurrency,
+            "pool_limit_per_host": args.pool_per_host,
+        },
+        "cache_config": {"balance_cache_ttl": 0, "negative_cache_ttl": 0, "ip_geo_cache_ttl": 0},
+        "history_config": {"enable": False},
+    }
+    return main.PluginBalanceIP(None, config)
+
+
+class ProviderTimer:
+    """包装插件的平台查询函数，记录每个密钥的查询耗时（不含排队等待）与失败次数"""
+
+    def __init__(self, main, plugin):
+        self.latencies = []
+        self.failures = 0
+        original = plugin._provider_spec
+
+        def timed_spec(provider, instance=None):
+            query, platform_name, host = original(provider, instance)
+
+            async def _q(api_key):
+                started = time.perf_counter()
+                try:
+                    result = await query(api_key)
+                finally:
+                    self.latencies.append(time.perf_counter() - started)
+                if getattr(result, "status", None) != main.STATUS_OK:
+                    self.failures += 1
+                return result
+
+            return _q, platform_name, host
+
+        plugin._provider_spec = timed_spec
+
+    def reset(self):
+        self.latencies = []
+        self.failures = 0
+
+
+async def _measure(server, run):
+    """执行一个场景，返回 (耗时秒, 上游请求数, 峰值内存字节)"""
+    requests_before = server.requests
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        await run()
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, server.requests - requests_before, peak
+
+
+async def bench_balance(plugin, timer, server, provider, count, run_id):
+    timer.reset()
+    keys = [f"sk-bench-{run_id}-{provider}-{i:04d}" for i in range(count)]
+
+    async def _query():
+        # 与命令处理器相同，消费流式结果直到全部密钥查询完成
+        return [text async for text in plugin._stream_batch_query_balance(keys, provider)]
+
+    elapsed, upstream, peak = await _measure(server, _query)
+    return timer.latencies, timer.failures, elapsed, upstream, peak
+
+
+async def bench_single_ip(plugin, server, count, run_id):
+    latencies = []
+    failures = []
+
+    async def _one(ip):
+        started = time.perf_counter()
+        geo_data, _ = await plugin._lookup_ip_geo([ip])
+        latencies.append(time.perf_counter() - started)
+        if (geo_data.get(ip) or {}).get("isp") != BENCH_ISP:
+            failures.append(ip)
+
+    ips = [f"10.{run_id % 250}.{i // 250}.{i % 250 + 1}" for i in range(count)]
+    elapsed, upstream, peak = await _measure(server, lambda: asyncio.gather(*(_one(ip) for ip in ips)))
+    return latencies, len(failures), elapsed, upstream, peak
+
+
+def _row(scenario, count, latencies, failures, elapsed, upstream, peak):
+    p50 = _percentile(latencies, 0.50)
+    p99 = _percentile(latencies, 0.99)
+    return {
+        "scenario": scenario,
+        "count": count,
+        "seconds": round(elapsed, 4),
+        "queries_per_second": round(count / elapsed, 1) if elapsed else None,
+        "upstream_requests_per_second": round(upstream / elapsed, 1) if elapsed else None,
+        "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+        "p99_ms": round(p99 * 1000, 2) if p99 is not None else None,
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        "failures": failures,
+    }
+
+
+def _print_table(rows):
+    header = f"{'场景':<14}{'数量':>6}{'耗时s':>9}{'查询/秒':>10}{'上游请求/秒':>12}{'P50ms':>9}{'P99ms':>9}{'峰值MB':>9}{'失败':>6}"
+    print(header)
+    for row in rows:
+        p50 = "-" if row["p50_ms"] is None else f"{row['p50_ms']:.1f}"
+        p99 = "-" if row["p99_ms"] is None else f"{row['p99_ms']:.1f}"
+        print(
+            f"{row['scenario']:<14}{row['count']:>6}{row['seconds']:>9.3f}{row['queries_per_second']:>10.1f}"
+            f"{row['upstream_requests_per_second']:>12.1f}{p50:>9}{p99:>9}{row['peak_memory_mb']:>9.2f}{row['failures']:>6}"
+        )
+
+
+async def run(args):
+    main, ip_geo = _load_plugin_modules()
+    server = StandInServer(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_429, args.retry_after, args.seed)
+    await server.start()
+    ip_geo.IP_API_JSON_URL = f"{server.base_url}/json/"
+    ip_geo.IP_API_BATCH_URL = f"{server.base_url}/batch"
+    plugin = build_plugin(main, server, args)
+    timer = ProviderTimer(main, plugin)
+
+    rows = []
+    run_id = 0
+    try:
+        for count in args.sizes:
+            for provider in args.providers:
+                run_id += 1
+                result = await bench_balance(plugin, timer, server, provider, count, run_id)
+                rows.append(_row(provider, count, *result))
+            if not args.skip_ip:
+                run_id += 1
+                rows.append(_row("single_ip", count, *(await bench_single_ip(plugin, server, count, run_id))))
+    finally:
+        await plugin.terminate()
+        await server.stop()
+
+    print(
+        f"模拟服务: 延迟 {args.latency_ms:g}±{args.jitter_ms:g}ms，5xx {args.error_rate:.0%}，429 {args.rate_429:.0%}"
+        f"（Retry-After {args.retry_after}s）"
+    )
+    _print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": rows}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="余额查询与IP查询的离线基准")
+    arg_parser.add_argument("--sizes", default="1,10,100,1000", help="密钥/地址数量，逗号分隔")
+    arg_parser.add_argument("--providers", default=",".join(PROVIDERS), help="要测试的平台，逗号分隔")
+    arg_parser.add_argument("--skip-ip", action="store_true", help="不测试单个IP归属地查询")
+    arg_parser.add_argument("--latency-ms", type=float, default=20.0, help="模拟服务的平均响应延迟")
+    arg_parser.add_argument("--jitter-ms", type=float, default=5.0, help="响应延迟的标准差")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    arg_parser.add_argument("--rate-429", type=float, default=0.0, help="返回429的比例")
+    arg_parser.add_argument("--retry-after", type=int, default=1, help="429响应的 Retry-After 秒数")
+    arg_parser.add_argument("--timeout", type=float, default=10.0, help="插件单次请求超时")
+    arg_parser.add_argument("--batch-concurrency", type=int, default=8)
+    arg_parser.add_argument("--per-host-concurrency", type=int, default=4)
+    arg_parser.add_argument("--pool-per-host", type=int, default=10)
+    arg_parser.add_argument("--seed", type=int, default=0, help="注入错误的随机种子")
+    arg_parser.add_argument("--json", help="把结果写入JSON文件，作为回归基线")
+    args = arg_parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.providers = [provider.strip() for provider in args.providers.split(",") if provider.strip()]
+    unknown = set(args.providers) - set(PROVIDERS)
+    if unknown:
+        arg_parser.error(f"未知平台: {', '.join(sorted(unknown))}，可选: {', '.join(PROVIDERS)}")
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import asyncio
+import socket
+
+from .ttl_cache import TTLCache
+
+
+class DNSCache:
+    """异步DNS解析缓存
+
+    通过事件循环的 getaddrinfo（在线程池中执行）解析，不阻塞事件循环；
+    A 与 AAAA 记录并发查询，结果按TTL缓存，解析失败使用较短的负缓存。
+    系统解析器不返回记录的真实TTL，缓存时长由配置决定。
+    """
+
+    def __init__(self, ttl=300.0, negative_ttl=30.0, max_entries=1024):
+        self.ttl = float(ttl)
+        self.negative_ttl = float(negative_ttl)
+        self._store = TTLCache(max_entries)  # (host, family) -> 地址列表
+        self._inflight = {}  # (host, family) -> 正在进行的解析任务
+
+    async def _lookup(self, key):
+        host, family = key
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, None, family=family, type=socket.SOCK_STREAM)
+            # 去重并保持解析器返回的顺序
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        except (socket.gaierror, UnicodeError):
+            addresses = []
+        self._store.put(key, addresses, self.ttl if addresses else self.negative_ttl)
+        return addresses
+
+    async def resolve(self, host, family=socket.AF_INET):
+        """解析单个地址族，返回地址列表（解析失败返回空列表）"""
+        key = (host.lower(), family)
+        entry = self._store.get(key)
+        if entry is not None:
+            return entry[0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return list(await asyncio.shield(task))
+
+    async def resolve_all(self, host):
+        """并发解析 A 与 AAAA 记录，返回 (IPv4地址列表, IPv6地址列表)"""
+        ipv4_addresses, ipv6_addresses = await asyncio.gather(
+            self.resolve(host, socket.AF_INET),
+            self.resolve(host, socket.AF_INET6),
+        )
+        return ipv4_addresses, ipv6_addresses
+
+    def clear(self):
+        self._store.clear()
+
+
+# 未显式传入解析器时使用的默认实例
+DEFAULT_DNS_CACHE = DNSCache()
@@ -0,0 +1,278 @@
+"""本地离线IP归属地库
+
+支持两种格式：
+- MaxMind MMDB（需要安装可选依赖 maxminddb），如 GeoLite2-City / GeoLite2-ASN；
+- 插件自带的紧凑区间表（.bin），由 CSV 生成，内存映射后用二分查找定位地址区间。
+
+区间表由以下 CSV 生成（首行可为表头）：
+    start_ip,end_ip,country_code,country,region,city,asn,org
+生成命令：python geo_db.py build <输入.csv> <输出.bin>
+"""
+import bisect
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+import sys
+import time
+
+RANGE_TABLE_MAGIC = b"BGEOTBL1"
+_HEADER = struct.Struct(">8sIII")  # 魔数, IPv4记录数, IPv6记录数, 字符串区偏移
+_V4_RECORD = struct.Struct(">III")  # 起始地址, 结束地址, 数据偏移
+_V6_RECORD = struct.Struct(">QQQQI")  # 起始地址高/低64位, 结束地址高/低64位, 数据偏移
+_PAYLOAD_LEN = struct.Struct(">H")
+_PAYLOAD_FIELDS = ("countryCode", "country", "regionName", "city", "as", "org")
+
+
+class _RecordKeys:
+    """把内存映射中的记录起始地址暴露为只读序列，供 bisect 直接二分"""
+
+    __slots__ = ("_buf", "_base", "_count", "_record", "_wide")
+
+    def __init__(self, buf, base, count, record, wide):
+        self._buf = buf
+        self._base = base
+        self._count = count
+        self._record = record
+        self._wide = wide
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        fields = self._record.unpack_from(self._buf, self._base + index * self._record.size)
+        if self._wide:
+            return (fields[0] << 64) | fields[1]
+        return fields[0]
+
+    def record(self, index):
+        fields = self._record.unpack_from(self._buf, self._base + index * self._record.size)
+        if self._wide:
+            return (fields[0] << 64) | fields[1], (fields[2] << 64) | fields[3], fields[4]
+        return fields
+
+
+class RangeTableReader:
+    """内存映射的紧凑区间表，打开时不解析记录，查询为 O(log n)"""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic, v4_count, v6_count, strings_offset = _HEADER.unpack_from(self._buf, 0)
+        if magic != RANGE_TABLE_MAGIC:
+            self.close()
+            raise ValueError(f"不是有效的IP区间表文件: {path}")
+        v4_base = _HEADER.size
+        v6_base = v4_base + v4_count * _V4_RECORD.size
+        self._v4 = _RecordKeys(self._buf, v4_base, v4_count, _V4_RECORD, False)
+        self._v6 = _RecordKeys(self._buf, v6_base, v6_count, _V6_RECORD, True)
+        self._strings_offset = strings_offset
+
+    def lookup(self, ip_address):
+        ip = ipaddress.ip_address(ip_address)
+        keys = self._v4 if ip.version == 4 else self._v6
+        value = int(ip)
+        index = bisect.bisect_right(keys, value) - 1
+        if index < 0:
+            return None
+        start, end, payload_offset = keys.record(index)
+        if value > end:
+            return None
+        offset = self._strings_offset + payload_offset
+        (length,) = _PAYLOAD_LEN.unpack_from(self._buf, offset)
+        values = self._buf[offset + _PAYLOAD_LEN.size:offset + _PAYLOAD_LEN.size + length].decode("utf-8").split("\t")
+        return {field: value for field, value in zip(_PAYLOAD_FIELDS, values) if value}
+
+    def close(self):
+        self._buf.close()
+        self._file.close()
+
+
+class MMDBReader:
+    """MaxMind MMDB 读取器（依赖可选的 maxminddb 包，使用内存映射模式）"""
+
+    def __init__(self, path):
+        import maxminddb
+
+        self._reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+
+    @staticmethod
+    def _name(node, lang="zh-CN"):
+        names = (node or {}).get("names") or {}
+        return names.get(lang) or names.get("en")
+
+    def lookup(self, ip_address):
+        record = self._reader.get(ip_address)
+        if not record:
+            return None
+        country = record.get("country") or record.get("registered_country") or {}
+        subdivisions = record.get("subdivisions") or [{}]
+        location = record.get("location") or {}
+        data = {
+            "countryCode": country.get("iso_code"),
+            "country": self._name(country),
+            "regionName": self._name(subdivisions[0]),
+            "city": self._name(record.get("city")),
+            "lat": location.get("latitude"),
+            "lon": location.get("longitude"),
+            "timezone": location.get("time_zone"),
+        }
+        asn = record.get("autonomous_system_number")
+        if asn:
+            data["as"] = f"AS{asn}"
+        if record.get("autonomous_system_organization"):
+            data["org"] = record["autonomous_system_organization"]
+        return {key: value for key, value in data.items() if value is not None}
+
+    def close(self):
+        self._reader.close()
+
+
+def open_geo_database(path):
+    """按扩展名打开离线库"""
+    if path.lower().endswith(".mmdb"):
+        return MMDBReader(path)
+    return RangeTableReader(path)
+
+
+class OfflineGeoDB:
+    """离线归属地库管理：按需打开、文件更新后自动重新加载、可选定期从URL下载"""
+
+    RELOAD_CHECK_INTERVAL = 60.0  # 检查文件是否变化的最小间隔（秒）
+
+    def __init__(self, path="", url="", refresh_hours=0.0):
+        self.path = path
+        self.url = url
+        self.refresh_hours = float(refresh_hours or 0)
+        self._reader = None
+        self._loaded_mtime = None
+        self._next_check = 0.0
+        self.last_error = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def needs_download(self):
+        """配置了下载地址且本地文件不存在或已超过刷新周期"""
+        if not self.url or not self.path:
+            return False
+        try:
+            age = time.time() - os.path.getmtime(self.path)
+        except OSError:
+            return True
+        return self.refresh_hours > 0 and age > self.refresh_hours * 3600
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._reader is not None and now < self._next_check:
+            return
+        self._next_check = now + self.RELOAD_CHECK_INTERVAL
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if self._reader is not None and mtime == self._loaded_mtime:
+            return
+        try:
+            reader = open_geo_database(self.path)
+        except Exception as e:
+            self.last_error = str(e)
+            return
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = reader
+        self._loaded_mtime = mtime
+        self.last_error = None
+
+    def lookup(self, ip_address):
+        """查询离线库，返回与 ip-api 字段一致的数据；未命中或未启用返回 None"""
+        if not self.enabled:
+            return None
+        self._maybe_reload()
+        if self._reader is None:
+            return None
+        try:
+            data = self._reader.lookup(ip_address)
+        except ValueError:
+            return None
+        if not data:
+            return None
+        data["status"] = "success"
+        data["query"] = ip_address
+        data["_source"] = "offline"
+        return data
+
+    async def download(self, session):
+        """从配置的URL下载离线库，写入临时文件后原子替换"""
+        tmp_path = self.path + ".download"
+        async with session.get(self.url) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    f.write(chunk)
+        os.replace(tmp_path, self.path)
+        self._next_check = 0.0
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+def build_range_table(csv_path, out_path):
+    """由 CSV 生成紧凑区间表，返回 (IPv4区间数, IPv6区间数)"""
+    v4_rows, v6_rows = [], []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            try:
+                start = ipaddress.ip_address(row[0].strip())
+                end = ipaddress.ip_address(row[1].strip())
+            except ValueError:
+                continue  # 跳过表头或无效行
+            payload = "\t".join((row[2:] + [""] * len(_PAYLOAD_FIELDS))[:len(_PAYLOAD_FIELDS)])
+            target = v4_rows if start.version == 4 else v6_rows
+            target.append((int(start), int(end), payload))
+    v4_rows.sort()
+    v6_rows.sort()
+
+    strings = bytearray()
+    offsets = {}
+
+    def payload_offset(payload):
+        # 相同的归属信息只存一份
+        if payload not in offsets:
+            encoded = payload.encode("utf-8")[:0xFFFF]
+            offsets[payload] = len(strings)
+            strings.extend(_PAYLOAD_LEN.pack(len(encoded)))
+            strings.extend(encoded)
+        return offsets[payload]
+
+    body = bytearray()
+    for start, end, payload in v4_rows:
+        body.extend(_V4_RECORD.pack(start, end, payload_offset(payload)))
+    mask = (1 << 64) - 1
+    for start, end, payload in v6_rows:
+        body.extend(_V6_RECORD.pack(start >> 64, start & mask, end >> 64, end & mask, payload_offset(payload)))
+
+    strings_offset = _HEADER.size + len(body)
+    with open(out_path, "wb") as f:
+        f.write(_HEADER.pack(RANGE_TABLE_MAGIC, len(v4_rows), len(v6_rows), strings_offset))
+        f.write(body)
+        f.write(strings)
+    return len(v4_rows), len(v6_rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("用法: python geo_db.py build <输入.csv> <输出.bin>")
+        sys.exit(1)
+    v4_count, v6_count = build_range_table(sys.argv[2], sys.argv[3])
+    print(f"已生成 {sys.argv[3]}: IPv4区间 {v4_count} 条, IPv6区间 {v6_count} 条")
@@ -0,0 +1,225 @@
+import asyncio
+import math
+import time
+from array import array
+
+from astrbot.api import logger
+
+from .background import BackgroundLoop, startup_delay
+
+# 延迟直方图：0.1ms 起按 5% 递增的对数分桶（覆盖到约60秒），分位数误差不超过约2.5%
+_BUCKET_BASE = 0.1
+_BUCKET_RATIO = 1.05
+_LOG_RATIO = math.log(_BUCKET_RATIO)
+_BUCKET_COUNT = int(math.log(60000.0 / _BUCKET_BASE) / _LOG_RATIO) + 2
+
+MIN_INTERVAL = 5.0  # 最短探测间隔（秒）
+
+
+def _bucket_index(ms):
+    if ms <= _BUCKET_BASE:
+        return 0
+    return min(_BUCKET_COUNT - 1, int(math.log(ms / _BUCKET_BASE) / _LOG_RATIO) + 1)
+
+
+def _bucket_value(index):
+    """分桶的代表延迟：桶上下边界的几何中点"""
+    if index == 0:
+        return _BUCKET_BASE
+    return _BUCKET_BASE * _BUCKET_RATIO ** (index - 0.5)
+
+
+class LatencyRing:
+    """定长环形缓冲，保存一个目标最近 capacity 次探测的结果
+
+    延迟与丢包率存放在 array('f') 中（不可达时延迟为 NaN），写入与淘汰时增量维护
+    可达次数、丢包率与延迟之和以及对数分桶直方图，汇总耗时与样本数无关。
+    """
+
+    __slots__ = ("capacity", "latency", "loss", "stamps", "buckets", "histogram",
+                 "size", "up", "loss_sum", "latency_sum", "_next")
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.latency = array("f", [math.nan]) * self.capacity
+        self.loss = array("f", [0.0]) * self.capacity
+        self.stamps = array("d", [0.0]) * self.capacity
+        self.buckets = array("h", [-1]) * self.capacity  # 每个槽位所在的直方图分桶，淘汰时用
+        self.histogram = array("I", [0]) * _BUCKET_COUNT
+        self.size = 0
+        self.up = 0
+        self.loss_sum = 0.0
+        self.latency_sum = 0.0
+        self._next = 0
+
+    def push(self, latency, loss, ts=None):
+        """写入一次探测结果：latency 为延迟ms（不可达为 None），loss 为丢包率百分比"""
+        slot = self._next
+        if self.size == self.capacity:
+            self._evict(slot)
+        else:
+            self.size += 1
+        self.stamps[slot] = time.time() if ts is None else ts
+        self.loss[slot] = loss
+        # 统计量累加写入后的单精度值，淘汰时减去的是同一个值
+        self.loss_sum += self.loss[slot]
+        if latency is None:
+            self.latency[slot] = math.nan
+            self.buckets[slot] = -1
+        else:
+            self.latency[slot] = latency
+            stored = self.latency[slot]
+            bucket = _bucket_index(stored)
+            self.buckets[slot] = bucket
+            self.histogram[bucket] += 1
+            self.latency_sum += stored
+            self.up += 1
+        self._next = (slot + 1) % self.capacity
+
+    def _evict(self, slot):
+        self.loss_sum -= self.loss[slot]
+        bucket = self.buckets[slot]
+        if bucket >= 0:
+            self.histogram[bucket] -= 1
+            self.latency_sum -= self.latency[slot]
+            self.up -= 1
+            if not self.up:
+                self.latency_sum = 0.0
+
+    def percentile(self, q):
+        """可达样本延迟的 q 分位数（最近秩法，按直方图分桶近似），无可达样本返回 None"""
+        if not self.up:
+            return None
+        rank = max(1, math.ceil(q * self.up))
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return _bucket_value(index)
+        return None
+
+    def latest(self):
+        """最近一次探测的 (时间戳, 延迟ms或None)，尚无样本返回 None"""
+        if not self.size:
+            return None
+        slot = (self._next - 1) % self.capacity
+        latency = self.latency[slot]
+        return self.stamps[slot], None if math.isnan(latency) else latency
+
+    def summary(self):
+        """汇总缓冲内的全部样本，返回字典；尚无样本返回 None"""
+        if not self.size:
+            return None
+        ts, latency = self.latest()
+        return {
+            "samples": self.size,
+            "uptime": self.up * 100.0 / self.size,
+            "loss": self.loss_sum / self.size,
+            "avg": self.latency_sum / self.up if self.up else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "first_ts": self.stamps[self._next % self.capacity] if self.size == self.capacity else self.stamps[0],
+            "last_ts": ts,
+            "last_latency": latency,
+        }
+
+
+class HostTarget:
+    """一个被监控的主机"""
+
+    __slots__ = ("host", "ports", "alias")
+
+    def __init__(self, host, ports, alias):
+        self.host = host
+        self.ports = ports
+        self.alias = alias
+
+
+def parse_host_targets(lines):
+    """解析主机监控配置，每行格式：主机|端口|别名（端口用逗号或空格分隔，端口和别名可省略）
+
+    返回 (监控目标列表, 无效行说明列表)
+    """
+    targets = []
+    errors = []
+    seen = set()
+    for line in lines or []:
+        parts = [part.strip() for part in str(line).split("|")]
+        if not parts[0]:
+            errors.append(f"格式错误: {line}")
+            continue
+        ports = None
+        if len(parts) > 1 and parts[1]:
+            try:
+                ports = [int(port) for port in parts[1].replace(",", " ").split()]
+            except ValueError:
+                errors.append(f"端口不是数字: {line}")
+                continue
+            if not all(0 < port < 65536 for port in ports):
+                errors.append(f"端口超出范围: {line}")
+                continue
+        alias = parts[2] if len(parts) > 2 and parts[2] else None
+        key = (parts[0], tuple(ports or ()))
+        if key in seen:
+            continue
+        seen.add(key)
+        targets.append(HostTarget(parts[0], ports, alias))
+    return targets, errors
+
+
+class HostMonitor(BackgroundLoop):
+    """后台主机监控：按固定间隔并发探测配置的主机，结果写入每个目标的 LatencyRing
+
+    probe_func(target) -> (延迟ms或None, 丢包率百分比)，抛出异常的探测不计入样本；
+    缓冲容量按 window / interval 计算，恰好覆盖最近 window 秒。
+    """
+
+    def __init__(self, targets, probe_func, interval=60.0, window=3600.0):
+        self.targets = targets
+        self.interval = max(MIN_INTERVAL, float(interval))
+        self.window = max(self.interval, float(window))
+        self._probe_func = probe_func
+        self._rings = [LatencyRing(math.ceil(self.window / self.interval)) for _ in targets]
+        self.last_poll_at = None
+
+    @property
+    def enabled(self):
+        return bool(self.targets)
+
+    def status_rows(self):
+        """返回 [(监控目标, 汇总字典或None)]，用于状态展示"""
+        return [(target, ring.summary()) for target, ring in zip(self.targets, self._rings)]
+
+    async def _run(self):
+        await startup_delay(min(10.0, self.interval))
+        next_at = time.monotonic()
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"主机监控探测失败: {e}")
+            # 按固定节拍探测；某轮耗时超过间隔时跳过错过的节拍，不连续补测
+            next_at += self.interval
+            now = time.monotonic()
+            if next_at < now:
+                next_at = now + self.interval - (now - next_at) % self.interval
+            await asyncio.sleep(next_at - now)
+
+    async def poll_once(self):
+        """并发探测全部目标，各自写入环形缓冲"""
+        results = await asyncio.gather(
+            *(self._probe_func(target) for target in self.targets), return_exceptions=True
+        )
+        now = time.time()
+        for target, ring, result in zip(self.targets, self._rings, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                logger.warning(f"主机监控探测 {target.host} 失败: {result}")
+                continue
+            latency, loss = result
+            ring.push(latency, loss, now)
+        self.last_poll_at = now
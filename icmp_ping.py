@@ -0,0 +1,129 @@
+import asyncio
+import ipaddress
+import itertools
+import os
+import socket
+import struct
+import time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+_ICMP_HEADER = struct.Struct("!BBHHH")  # 类型, 代码, 校验和, 标识符, 序号
+
+# 同一进程内并发的ping使用不同的标识符，避免原始套接字之间串包
+_IDENT_COUNTER = itertools.count(os.getpid())
+
+
+class ICMPUnavailable(Exception):
+    """当前环境无法创建ICMP套接字（无权限或系统不支持）"""
+
+
+def _checksum(data):
+    """RFC 1071 互联网校验和"""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def open_icmp_socket(family=socket.AF_INET):
+    """创建非阻塞ICMP套接字，返回 (套接字, 是否为原始套接字)
+
+    优先使用 Linux/macOS 的免权限 SOCK_DGRAM ICMP 套接字
+    （Linux 需 net.ipv4.ping_group_range 包含当前用户组），失败时尝试需要权限的原始套接字。
+    """
+    proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+    errors = []
+    for sock_type, raw in ((socket.SOCK_DGRAM, False), (socket.SOCK_RAW, True)):
+        try:
+            sock = socket.socket(family, sock_type, proto)
+        except (PermissionError, OSError) as e:
+            errors.append(str(e))
+            continue
+        sock.setblocking(False)
+        return sock, raw
+    raise ICMPUnavailable("; ".join(errors))
+
+
+def icmp_supported(family=socket.AF_INET):
+    """检测是否可以创建ICMP套接字，返回 (是否支持, 是否为原始套接字)"""
+    try:
+        sock, raw = open_icmp_socket(family)
+    except ICMPUnavailable:
+        return False, False
+    sock.close()
+    return True, raw
+
+
+def _build_echo_request(family, ident, seq, payload):
+    request_type = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMPV6_ECHO_REQUEST
+    header = _ICMP_HEADER.pack(request_type, 0, 0, ident, seq)
+    if family == socket.AF_INET6:
+        # ICMPv6 校验和包含伪首部，由内核计算
+        return header + payload
+    checksum = _checksum(header + payload)
+    return _ICMP_HEADER.pack(request_type, 0, checksum, ident, seq) + payload
+
+
+def _parse_echo_reply(family, data, raw):
+    """解析收到的数据，返回 (标识符, 序号)；不是回显应答时返回 None"""
+    if family == socket.AF_INET and data and data[0] >> 4 == 4:
+        # 原始套接字（以及 macOS 的 DGRAM 套接字）会带上IPv4首部
+        data = data[(data[0] & 0x0F) * 4:]
+    if len(data) < _ICMP_HEADER.size:
+        return None
+    reply_type, _, _, ident, seq = _ICMP_HEADER.unpack_from(data)
+    expected = ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY
+    if reply_type != expected:
+        return None
+    return ident, seq
+
+
+async def iter_icmp_echo(address, count=4, timeout=1.0, interval=1.0, payload_size=56):
+    """向IP地址发送ICMP回显请求，逐个产出 (序号, 往返时间ms)，超时的请求往返时间为 None
+
+    address 必须是IP地址；无法创建ICMP套接字时抛出 ICMPUnavailable。
+    """
+    family = socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+    sock, raw = open_icmp_socket(family)
+    loop = asyncio.get_running_loop()
+    # DGRAM 套接字的标识符由内核按套接字分配并过滤应答，只需匹配序号
+    ident = next(_IDENT_COUNTER) & 0xFFFF
+    payload = bytes(range(256))[:payload_size].ljust(payload_size, b"\0")
+    try:
+        sock.connect((address, 0))
+        for seq in range(1, count + 1):
+            started = time.perf_counter()
+            await loop.sock_sendall(sock, _build_echo_request(family, ident, seq, payload))
+            rtt = None
+            deadline = started + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    data = await asyncio.wait_for(loop.sock_recv(sock, 2048), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                reply = _parse_echo_reply(family, data, raw)
+                if reply is None:
+                    continue
+                reply_ident, reply_seq = reply
+                if reply_seq == seq and (not raw or reply_ident == ident):
+                    rtt = (time.perf_counter() - started) * 1000
+                    break
+            yield seq, rtt
+            if seq < count:
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+    finally:
+        sock.close()
+
+
+async def icmp_ping(address, count=4, timeout=1.0, interval=1.0):
+    """发送 count 个ICMP回显请求，返回往返时间列表（ms，丢失的为 None）"""
+    return [rtt async for _, rtt in iter_icmp_echo(address, count, timeout, interval)]
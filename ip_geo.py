@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+from .request_policy import RETRYABLE_STATUS
+from .ttl_cache import TTLCache
+
+IP_API_JSON_URL = "http://ip-api.com/json/"
+IP_API_BATCH_URL = "http://ip-api.com/batch"
+# 请求所有可用字段以获取最完整的信息
+IP_API_FIELDS = "status,message,country,countryCode,region,regionName,city,zip,lat,lon,timezone,isp,org,as,asname,mobile,proxy,hosting,query"
+IP_API_BATCH_SIZE = 100  # ip-api 批量接口单次最多100个地址
+# ip-api 限流时不带 Retry-After，而是通过 X-Ttl 告知窗口重置时间：429 不交给请求策略重试，按 X-Ttl 等待
+IP_API_RETRY_STATUS = RETRYABLE_STATUS - {429}
+
+
+class IPGeoRateLimited(Exception):
+    """ip-api 限流窗口已用完且等待时间过长"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"IP查询接口请求过于频繁，请约{retry_after:.0f}秒后再试")
+
+
+class _RateWindow:
+    """根据 ip-api 返回的 X-Rl（窗口内剩余请求数）/X-Ttl（窗口重置秒数）控制请求节奏"""
+
+    __slots__ = ("remaining", "reset_at")
+
+    def __init__(self):
+        self.remaining = None  # 尚未收到响应头时不限制
+        self.reset_at = 0.0
+
+    async def acquire(self, max_wait):
+        if self.remaining is not None and self.remaining <= 0:
+            wait = self.reset_at - time.monotonic()
+            if wait > max_wait:
+                raise IPGeoRateLimited(wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.remaining = None
+        if self.remaining is not None:
+            # 预先扣减，避免并发请求同时用掉最后的额度
+            self.remaining -= 1
+
+    def update(self, headers, status):
+        rl = headers.get("X-Rl")
+        ttl = headers.get("X-Ttl")
+        try:
+            if rl is not None and ttl is not None:
+                self.remaining = int(rl)
+                self.reset_at = time.monotonic() + int(ttl)
+            elif status == 429:
+                self.remaining = 0
+                self.reset_at = time.monotonic() + 60
+        except ValueError:
+            pass
+
+
+class IPGeoLookup:
+    """ip-api 地理位置查询引擎
+
+    多个地址使用 /batch 接口一次查询，单个地址使用 /json 接口；
+    两个接口的限流窗口分别跟踪，查询结果按TTL缓存并按LRU淘汰。
+    """
+
+    def __init__(self, ttl=21600.0, max_entries=4096, max_rate_wait=5.0, lang="zh-CN"):
+        self.ttl = float(ttl)
+        self.max_rate_wait = float(max_rate_wait)
+        self.lang = lang
+        self._store = TTLCache(max_entries)  # ip -> 数据
+        self._single_window = _RateWindow()
+        self._batch_window = _RateWindow()
+
+    async def _request(self, session, policy, window, method, url, **kwargs):
+        """在限流窗口内发送请求；429 时按 X-Ttl 等待窗口重置后再试一次，需要等待过久时抛出 IPGeoRateLimited"""
+        for _ in range(2):
+            await window.acquire(self.max_rate_wait)
+            response = await policy.request(
+                session, method, url, raise_for_status=False, expect_json=False,
+                retry_statuses=IP_API_RETRY_STATUS, **kwargs
+            )
+            window.update(response.headers, response.status)
+            if response.status != 429:
+                return response
+        raise IPGeoRateLimited(max(1.0, window.reset_at - time.monotonic()))
+
+    async def _fetch_single(self, session, policy, ip):
+        url = f"{IP_API_JSON_URL}{ip}"
+        params = {"lang": self.lang, "fields": IP_API_FIELDS}
+        response = await self._request(session, policy, self._single_window, "GET", url, params=params)
+        if not isinstance(response.data, dict):
+            return {}
+        return {ip: response.data}
+
+    async def _fetch_batch(self, session, policy, ips):
+        params = {"lang": self.lang, "fields": IP_API_FIELDS}
+        response = await self._request(
+            session, policy, self._batch_window, "POST", IP_API_BATCH_URL, params=params, json=list(ips)
+        )
+        if not isinstance(response.data, list):
+            return {}
+        return {ip: data for ip, data in zip(ips, response.data)}
+
+    async def lookup(self, session, ips, policy):
+        """查询多个IP地址，返回 {ip: ip-api 原始数据}，优先使用缓存"""
+        results = {}
+        missing = []
+        for ip in dict.fromkeys(ips):
+            entry = self._store.get(ip)
+            if entry is not None:
+                results[ip] = entry[0]
+            else:
+                missing.append(ip)
+
+        if len(missing) == 1:
+            fetched = await self._fetch_single(session, policy, missing[0])
+        elif missing:
+            chunks = [missing[i:i + IP_API_BATCH_SIZE] for i in range(0, len(missing), IP_API_BATCH_SIZE)]
+            fetched = {}
+            for chunk in chunks:
+                fetched.update(await self._fetch_batch(session, policy, chunk))
+        else:
+            fetched = {}
+
+        for ip, data in fetched.items():
+            if isinstance(data, dict):
+                self._store.put(ip, data, self.ttl)
+                results[ip] = data
+        return results
@@ -1,54 +1,136 @@
 import aiohttp
 import asyncio
-import platform
-import subprocess
+import os
 import re
-import socket
 import time
 from datetime import datetime
+from urllib.parse import urlparse
 from astrbot.api.message_components import At
-from astrbot.api.event import filter, AstrMessageEvent
-from astrbot.api import AstrBotConfig
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
+from astrbot.api import AstrBotConfig, logger
 from astrbot.api.star import Context, Star, register
+from .dns_cache import DNSCache
+from .ip_geo import IPGeoLookup, IPGeoRateLimited
+from .geo_db import OfflineGeoDB
+from .net_capabilities import start_capability_probe
+from .request_policy import CircuitOpenError, RequestPolicy
+from .balance_cache import (
+    BalanceCache,
+    BalanceResult,
+    STATUS_INVALID,
+    STATUS_OK,
+    format_cache_age,
+    hash_api_key,
+    result_status,
+)
+from .balance_history import LONG_TAU_HOURS, SHORT_TAU_HOURS, BalanceHistory
+from .balance_monitor import BalanceMonitor, parse_monitor_entries
+from .host_monitor import HostMonitor, parse_host_targets
+from .admission import AdmissionController, admission_controlled
+from .metrics import METRICS, PrometheusExporter, instrument_provider
+from .newapi_instances import first_ok, parse_newapi_instances
 
 # API配置常量
 SILICONFLOW_API_URL = "https://api.siliconflow.cn/v1/user/info"
 OPENAI_API_BASE_URL = "https://api.openai.com"
 DEEPSEEK_API_URL = "https://api.deepseek.com/user/balance"
-IP_API_URL = "http://ip-api.com/json/"
 NEWAPI_TOKEN_USAGE_PATH = "/api/usage/token"
 
-async def query_siliconflow_balance(api_key):
+# 支持的余额平台：标识 -> 显示名称
+PROVIDER_NAMES = {
+    "siliconflow": "硅基流动",
+    "deepseek": "DeepSeek",
+    "openai": "OpenAI",
+    "newapi": "NEW API",
+}
+
+# 连接池参数
+POOL_KEEPALIVE_TIMEOUT = 30  # 空闲连接保活时间（秒）
+POOL_DNS_CACHE_TTL = 300  # 连接器内置DNS缓存时间（秒）
+
+# 插件名称（数据目录名），以及插件数据目录下的余额历史数据库默认文件名
+PLUGIN_NAME = "astrbot_plugin_balance"
+DEFAULT_HISTORY_DB_NAME = "balance_history.db"
+
+# 要求输出完整详细信息的命令参数
+DETAIL_FLAGS = ("详细", "-v", "--full")
+# 要求 /ping 做 IPv4/IPv6 双栈测试的命令参数
+DUAL_STACK_FLAGS = ("双栈", "-46", "--dual-stack")
+# 要求余额批量查询输出汇总表的命令参数，以及“只列出余额低于阈值的密钥”的参数前缀（如 <5、低于5）
+SUMMARY_FLAGS = ("汇总", "-s", "--summary")
+BELOW_PREFIXES = ("<", "低于")
+# 要求 /NEW余额 把密钥同时发往全部实例并逐实例对比的命令参数
+COMPARE_FLAGS = ("对比", "--compare")
+
+# 密钥格式识别：OpenAI 新式前缀与旧式密钥中的固定标记、DeepSeek 的32位十六进制、硅基流动的48位小写字母
+OPENAI_KEY_PREFIXES = ("sk-proj-", "sk-svcacct-", "sk-admin-")
+OPENAI_KEY_MARKER = "T3BlbkFJ"
+_DEEPSEEK_KEY_RE = re.compile(r"sk-[0-9a-f]{32}")
+_SILICONFLOW_KEY_RE = re.compile(r"sk-[a-z]{48}")
+# 无法识别格式的密钥同时尝试的候选平台
+KEY_TRIAL_ORDER = ("newapi", "siliconflow", "deepseek", "openai")
+
+# 请求策略层可能抛出的异常
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError)
+
+def _to_float(value):
+    """将余额字段转换为浮点数，无法转换时返回 None"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _request_error_result(e):
+    """将请求异常转换为结果文本，401/403 标记为无效密钥以便短暂负缓存"""
+    if isinstance(e, CircuitOpenError):
+        return str(e)
+    if isinstance(e, asyncio.TimeoutError):
+        return "请求错误: 请求超时"
+    if isinstance(e, aiohttp.ClientResponseError) and e.status in (401, 403):
+        return BalanceResult(f"请求错误: {e}", STATUS_INVALID)
+    return f"请求错误: {e}"
+
+def classify_api_key(api_key):
+    """按前缀与格式识别密钥所属平台，无法确定时返回 None"""
+    if api_key.startswith(OPENAI_KEY_PREFIXES) or OPENAI_KEY_MARKER in api_key:
+        return "openai"
+    if _DEEPSEEK_KEY_RE.fullmatch(api_key):
+        return "deepseek"
+    if _SILICONFLOW_KEY_RE.fullmatch(api_key):
+        return "siliconflow"
+    return None
+
+@instrument_provider("siliconflow")
+async def query_siliconflow_balance(api_key, session: aiohttp.ClientSession, policy: RequestPolicy):
     """查询硅基流动平台余额信息"""
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(SILICONFLOW_API_URL, headers=headers) as response:
-                response.raise_for_status()
-                data = await response.json()
-
-                if data.get('status') and data.get('data'):
-                    balance_info = data['data']
-                    result = (
-                        f"硅基流动账户余额信息:\n"
-                        f"用户ID: {balance_info['id']}\n"
-                        f"用户名: {balance_info['name']}\n"
-                        f"邮箱: {balance_info['email']}\n"
-                        f"余额(美元): {balance_info['balance']}\n"
-                        f"充值余额(美元): {balance_info['chargeBalance']}\n"
-                        f"总余额(美元): {balance_info['totalBalance']}\n"
-                    )
-                    return result
-                else:
-                    return "获取硅基流动余额失败：" + data.get('message', '未知错误')
-        except aiohttp.ClientError as e:
-            return f"请求错误: {e}"
+    try:
+        response = await policy.request(session, "GET", SILICONFLOW_API_URL, headers=headers)
+    except REQUEST_ERRORS as e:
+        return _request_error_result(e)
+
+    data = response.data
+    if data.get('status') and data.get('data'):
+        balance_info = data['data']
+        result = (
+            f"硅基流动账户余额信息:\n"
+            f"用户ID: {balance_info['id']}\n"
+            f"用户名: {balance_info['name']}\n"
+            f"邮箱: {balance_info['email']}\n"
+            f"余额(美元): {balance_info['balance']}\n"
+            f"充值余额(美元): {balance_info['chargeBalance']}\n"
+            f"总余额(美元): {balance_info['totalBalance']}\n"
+        )
+        return BalanceResult(result, remaining=_to_float(balance_info['totalBalance']), currency="美元")
+    else:
+        return "获取硅基流动余额失败：" + data.get('message', '未知错误')
 
-async def query_openai_balance(api_key):
+@instrument_provider("openai")
+async def query_openai_balance(api_key, session: aiohttp.ClientSession, policy: RequestPolicy):
     """查询OpenAI平台余额信息"""
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -59,62 +141,56 @@ async def query_openai_balance(api_key):
         today = datetime.today().strftime('%Y-%m-%d')
 
         subscription_url = f"{OPENAI_API_BASE_URL}/v1/dashboard/billing/subscription"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(subscription_url, headers=headers) as subscription_response:
-                subscription_response.raise_for_status()
-                subscription_data = await subscription_response.json()
-
-            usage_url = f"{OPENAI_API_BASE_URL}/v1/dashboard/billing/usage?start_date={today}&end_date={today}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(usage_url, headers=headers) as usage_response:
-                    usage_response.raise_for_status()
-                    usage_data = await usage_response.json()
-
-        account_balance = subscription_data[0].get("soft_limit_usd", 0)
-        used_balance = usage_data.get("total_usage", 0) / 100
-        remaining_balance = account_balance - used_balance
-
-        result = (
-            f"OpenAI账户余额信息:\n"
-            f"是否已绑定支付方式: {'是' if subscription_data[0].get('has_payment_method') else '否'}\n"
-            f"账户额度(美元): {account_balance:.2f}\n"
-            f"已使用额度(美元): {used_balance:.2f}\n"
-            f"剩余额度(美元): {remaining_balance:.2f}\n"
-            f"API访问权限截止时间: {subscription_data[0].get('access_until', '无限制')}\n"
-        )
-        return result
-    except aiohttp.ClientError as e:
-        return f"请求错误: {e}"
-
-async def query_ds_balance(api_key):
+        subscription_data = (await policy.request(session, "GET", subscription_url, headers=headers)).data
+
+        usage_url = f"{OPENAI_API_BASE_URL}/v1/dashboard/billing/usage?start_date={today}&end_date={today}"
+        usage_data = (await policy.request(session, "GET", usage_url, headers=headers)).data
+    except REQUEST_ERRORS as e:
+        return _request_error_result(e)
+
+    account_balance = subscription_data[0].get("soft_limit_usd", 0)
+    used_balance = usage_data.get("total_usage", 0) / 100
+    remaining_balance = account_balance - used_balance
+
+    result = (
+        f"OpenAI账户余额信息:\n"
+        f"是否已绑定支付方式: {'是' if subscription_data[0].get('has_payment_method') else '否'}\n"
+        f"账户额度(美元): {account_balance:.2f}\n"
+        f"已使用额度(美元): {used_balance:.2f}\n"
+        f"剩余额度(美元): {remaining_balance:.2f}\n"
+        f"API访问权限截止时间: {subscription_data[0].get('access_until', '无限制')}\n"
+    )
+    return BalanceResult(result, remaining=remaining_balance, currency="美元")
+
+@instrument_provider("deepseek")
+async def query_ds_balance(api_key, session: aiohttp.ClientSession, policy: RequestPolicy):
     """查询DeepSeek平台余额信息"""
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Accept": "application/json"
     }
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(DEEPSEEK_API_URL, headers=headers) as response:
-                response.raise_for_status()
-                data = await response.json()
-
-                if data.get('is_available') is False:
-                    return "DeepSeek账户不可用或无余额信息（未充值）"
-
-                balance_info = data['balance_infos'][0]
-                result = (
-                    f"DeepSeek账户余额信息:\n"
-                    f"币种: {balance_info['currency']}\n"
-                    f"总余额: {balance_info['total_balance']}\n"
-                    f"已授予余额: {balance_info['granted_balance']}\n"
-                    f"充值余额: {balance_info['topped_up_balance']}\n"
-                )
-                return result
-        except aiohttp.ClientError as e:
-            return f"请求错误: {e}"
-
-async def query_newapi_balance(api_base_url: str, api_key: str, request_timeout: float = 10.0, max_retries: int = 3):
+    try:
+        response = await policy.request(session, "GET", DEEPSEEK_API_URL, headers=headers)
+    except REQUEST_ERRORS as e:
+        return _request_error_result(e)
+
+    data = response.data
+    if data.get('is_available') is False:
+        return BalanceResult("DeepSeek账户不可用或无余额信息（未充值）", remaining=0.0)
+
+    balance_info = data['balance_infos'][0]
+    result = (
+        f"DeepSeek账户余额信息:\n"
+        f"币种: {balance_info['currency']}\n"
+        f"总余额: {balance_info['total_balance']}\n"
+        f"已授予余额: {balance_info['granted_balance']}\n"
+        f"充值余额: {balance_info['topped_up_balance']}\n"
+    )
+    return BalanceResult(result, remaining=_to_float(balance_info['total_balance']), currency=balance_info['currency'])
+
+@instrument_provider("newapi")
+async def query_newapi_balance(api_base_url: str, api_key: str, session: aiohttp.ClientSession, policy: RequestPolicy):
     """查询自定义 NEW API 的令牌用量信息
 
     接口：GET {api_base_url}/api/usage/token
@@ -130,449 +206,64 @@ async def query_newapi_balance(api_base_url: str, api_key: str, request_timeout:
         "Accept": "application/json"
     }
 
-    timeout = aiohttp.ClientTimeout(total=request_timeout) if request_timeout else None
-
-    last_err = None
-    for attempt in range(1, max(1, int(max_retries)) + 1):
-        try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url, headers=headers) as resp:
-                    # 优先尝试 JSON，失败再读文本
-                    try:
-                        data = await resp.json()
-                    except Exception:
-                        text = await resp.text()
-                        return f"NEW API 返回非 JSON 数据（HTTP {resp.status}）：{text[:200]}"
-
-            # 兼容两种成功/失败风格：{"code": true} 或 {"success": true}
-            ok_flag = bool(data.get("code", False) or data.get("success", False))
-            if not ok_flag and resp.status != 200:
-                # 非 200 且标识不成功
-                last_err = data.get("message") or f"HTTP {resp.status}"
-            if not ok_flag and resp.status == 200 and "data" not in data:
-                # 虽 200 但无 data
-                last_err = data.get("message") or "响应缺少 data 字段"
-            if ok_flag and "data" not in data:
-                last_err = "响应缺少 data 字段"
-            if ok_flag and "data" in data:
-                d = data["data"] or {}
-                name = d.get("name", "-")
-                total_granted = d.get("total_granted", 0)
-                total_used = d.get("total_used", 0)
-                total_available = d.get("total_available", 0)
-                unlimited = d.get("unlimited_quota", False)
-                model_limits_enabled = d.get("model_limits_enabled", False)
-                model_limits = d.get("model_limits") or {}
-                expires_at = d.get("expires_at", 0)
-
-                # 格式化到期时间
-                expires_str = "永不过期" if not expires_at else datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M:%S")
-
-                # 模型限额摘要
-                model_summary = "未启用"
-                if model_limits_enabled and isinstance(model_limits, dict):
-                    enabled_models = [m for m, v in model_limits.items() if v]
-                    if enabled_models:
-                        model_summary = ", ".join(enabled_models[:10])
-                        if len(enabled_models) > 10:
-                            model_summary += " 等"
-                    else:
-                        model_summary = "启用但列表为空"
-
-                result = (
-                    f"NEW API 令牌用量信息:\n"
-                    f"令牌名称: {name}\n"
-                    f"额度（总/已用/剩余）: {total_granted} / {total_used} / {total_available}\n"
-                    f"是否无限额度: {'是' if unlimited else '否'}\n"
-                    f"模型限额: {'启用' if model_limits_enabled else '未启用'}\n"
-                    f"允许模型: {model_summary}\n"
-                    f"到期时间: {expires_str}\n"
-                )
-                return result
-
-        except aiohttp.ClientError as e:
-            last_err = str(e)
-        except asyncio.TimeoutError:
-            last_err = "请求超时"
-
-        # 简单指数退避
-        await asyncio.sleep(min(2 ** (attempt - 1), 3))
-
-    return f"查询 NEW API 用量失败：{last_err or '未知错误'}"
-
-async def ping_host(host, count=4, ping_timeout=30.0, test_ports=None, tcp_timeout=3.0):
-    if test_ports is None:
-        test_ports = [22, 23, 80, 443, 5000, 6099, 6185]
-    """使用系统ping命令测试主机连通性和延迟"""
     try:
-        system = platform.system().lower()
-        
-        # 尝试不同的ping命令路径
-        ping_commands = []
-        if system == "windows":
-            ping_commands = [
-                ["ping", "-n", str(count), host],
-                ["C:\\Windows\\System32\\ping.exe", "-n", str(count), host],
-                ["ping.exe", "-n", str(count), host]
-            ]
+        # 非 200 响应也需要读取 message，因此不在策略层抛出状态码异常
+        resp = await policy.request(session, "GET", url, headers=headers, raise_for_status=False, expect_json=False)
+    except REQUEST_ERRORS as e:
+        return f"查询 NEW API 用量失败：{_request_error_result(e)}"
+
+    data = resp.data
+    if not isinstance(data, dict):
+        return f"NEW API 返回非 JSON 数据（HTTP {resp.status}）：{str(data)[:200]}"
+
+    # 令牌无效或无权限
+    if resp.status in (401, 403):
+        return BalanceResult(f"查询 NEW API 用量失败：{data.get('message') or f'HTTP {resp.status}'}", STATUS_INVALID)
+
+    # 兼容两种成功/失败风格：{"code": true} 或 {"success": true}
+    ok_flag = bool(data.get("code", False) or data.get("success", False))
+    if not ok_flag:
+        last_err = data.get("message") or (f"HTTP {resp.status}" if resp.status != 200 else "响应缺少 data 字段")
+        return f"查询 NEW API 用量失败：{last_err}"
+    if "data" not in data:
+        return "查询 NEW API 用量失败：响应缺少 data 字段"
+
+    d = data["data"] or {}
+    name = d.get("name", "-")
+    total_granted = d.get("total_granted", 0)
+    total_used = d.get("total_used", 0)
+    total_available = d.get("total_available", 0)
+    unlimited = d.get("unlimited_quota", False)
+    model_limits_enabled = d.get("model_limits_enabled", False)
+    model_limits = d.get("model_limits") or {}
+    expires_at = d.get("expires_at", 0)
+
+    # 格式化到期时间
+    expires_str = "永不过期" if not expires_at else datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M:%S")
+
+    # 模型限额摘要
+    model_summary = "未启用"
+    if model_limits_enabled and isinstance(model_limits, dict):
+        enabled_models = [m for m, v in model_limits.items() if v]
+        if enabled_models:
+            model_summary = ", ".join(enabled_models[:10])
+            if len(enabled_models) > 10:
+                model_summary += " 等"
         else:
-            ping_commands = [
-                ["ping", "-c", str(count), host],
-                ["/bin/ping", "-c", str(count), host],
-                ["/usr/bin/ping", "-c", str(count), host],
-                ["/sbin/ping", "-c", str(count), host]
-            ]
-        
-        # 尝试执行ping命令
-        last_error = None
-        for cmd in ping_commands:
-            try:
-                process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                
-                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=ping_timeout)
-                
-                if process.returncode == 0:
-                    output = decode_output(stdout)
-                    ping_result = parse_ping_output(output, host)
-                    
-                    # 在ping成功时也测试端口连通性
-                    port_result = await port_connectivity_test(host, test_ports, tcp_timeout)
-                    return ping_result + port_result
-                else:
-                    error = decode_output(stderr)
-                    last_error = f"Ping命令执行失败: {error}"
-                    
-            except FileNotFoundError:
-                continue  # 尝试下一个ping命令路径
-            except Exception as e:
-                last_error = str(e)
-                continue
-        
-        # 如果所有ping命令都失败，使用Python实现的简单连通性测试
-        return await fallback_connectivity_test(host, test_ports, tcp_timeout)
-            
-    except asyncio.TimeoutError:
-        return f"Ping超时: {host} ({ping_timeout}秒无响应)"
-    except Exception as e:
-        return await fallback_connectivity_test(host, test_ports, tcp_timeout)
-
-async def fallback_connectivity_test(host, test_ports=None, timeout=3.0):
-    if test_ports is None:
-        test_ports = [22, 23, 80, 443, 5000, 6099, 6185]
-    """备用连通性测试（当ping命令不可用时）"""
-    result = f"连通性测试 - {host}:\n"
-    result += "⚠️ 系统ping命令不可用，使用TCP连接测试\n\n"
-    
-    successful_connections = 0
-    total_time = 0
-    connection_results = []
-    
-    try:
-        # 首先尝试解析域名
-        try:
-            socket.gethostbyname(host)
-            result += f"✅ 域名解析: 成功\n"
-        except socket.gaierror:
-            result += f"❌ 域名解析: 失败\n"
-            return result
-        
-        # 测试指定端口的连通性
-        for port in test_ports:
-            start_time = time.time()
-            try:
-                reader, writer = await asyncio.wait_for(
-                    asyncio.open_connection(host, port),
-                    timeout=timeout
-                )
-                writer.close()
-                await writer.wait_closed()
-                
-                end_time = time.time()
-                response_time = (end_time - start_time) * 1000
-                total_time += response_time
-                successful_connections += 1
-                connection_results.append(f"✅ 端口{port}: {response_time:.0f}ms")
-                
-            except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
-                connection_results.append(f"❌ 端口{port}: 超时")
-            except Exception:
-                connection_results.append(f"❌ 端口{port}: 失败")
-        
-        # 构建结果
-        result += f"测试端口: {successful_connections}/{len(test_ports)}个可连接\n"
-        
-        if successful_connections > 0:
-            avg_time = total_time / successful_connections
-            result += f"平均连接时间: {avg_time:.0f}ms\n"
-            
-            if avg_time < 100:
-                quality = "优秀"
-            elif avg_time < 300:
-                quality = "良好"
-            else:
-                quality = "一般"
-            result += f"连接质量: {quality}\n"
-            result += f"主机状态: 可达\n\n"
-        else:
-            result += f"连接质量: 无法连接\n"
-            result += f"主机状态: 不可达\n\n"
-        
-        result += "端口测试详情:\n"
-        for conn_result in connection_results:
-            result += f"  {conn_result}\n"
-            
-        result += "\n💡 提示: 请安装ping命令获得更准确的延迟测试"
-        
-    except Exception as e:
-        result += f"连通性测试失败: {str(e)}"
-    
-    return result
-
-async def port_connectivity_test(host, test_ports=None, timeout=3.0):
-    if test_ports is None:
-        test_ports = [22, 23, 80, 443, 5000, 6099, 6185]
-    """端口连通性测试"""
-    successful_connections = 0
-    total_time = 0
-    connection_results = []
-    
-    try:
-        # 测试指定端口的连通性
-        for port in test_ports:
-            start_time = time.time()
-            try:
-                reader, writer = await asyncio.wait_for(
-                    asyncio.open_connection(host, port),
-                    timeout=timeout
-                )
-                writer.close()
-                await writer.wait_closed()
-                
-                end_time = time.time()
-                response_time = (end_time - start_time) * 1000
-                total_time += response_time
-                successful_connections += 1
-                connection_results.append(f"✅ 端口{port}: {response_time:.0f}ms")
-                
-            except (asyncio.TimeoutError, ConnectionRefusedError, OSError):
-                connection_results.append(f"❌ 端口{port}: 超时")
-            except Exception:
-                connection_results.append(f"❌ 端口{port}: 失败")
-        
-        # 构建结果
-        result = f"\n🔌 端口连通性测试:\n"
-        result += f"测试端口: {successful_connections}/{len(test_ports)}个可连接\n"
-        
-        if successful_connections > 0:
-            avg_time = total_time / successful_connections
-            result += f"平均连接时间: {avg_time:.0f}ms\n"
-        
-        result += "端口测试详情:\n"
-        for conn_result in connection_results:
-            result += f"  {conn_result}\n"
-        
-        return result
-        
-    except Exception as e:
-        return f"\n🔌 端口连通性测试失败: {str(e)}"
-
-def decode_output(data):
-    """尝试多种编码方式解码输出"""
-    encodings = ['utf-8', 'gbk', 'gb2312', 'cp936', 'latin1']
-    
-    for encoding in encodings:
-        try:
-            return data.decode(encoding)
-        except (UnicodeDecodeError, LookupError):
-            continue
-    
-    # 如果所有编码都失败，使用utf-8并忽略错误
-    return data.decode('utf-8', errors='ignore')
-
-def parse_ping_output(output, host):
-    """解析ping命令输出"""
-    lines = output.split('\n')
-    
-    # 提取基本信息
-    result = f"Ping测试结果 - {host}:\n"
-    
-    # 查找延迟信息
-    delays = []
-    packet_loss = "未知"
-    packets_sent = 0
-    packets_received = 0
-    
-    for line in lines:
-        line = line.strip()
-        
-        # 解析延迟时间（支持中英文和各种格式）
-        # 英文格式: time=165ms 或 time=8.24 ms (注意空格)
-        # 中文格式: 时间=165ms 或 ʱ=165ms (编码问题)
-        if 'time=' in line.lower() or '时间=' in line or 'ʱ=' in line:
-            # 使用正则表达式提取数字，支持带空格的格式
-            time_match = re.search(r'(?:time=|时间=|ʱ=)(\d+(?:\.\d+)?)\s*ms', line, re.IGNORECASE)
-            if time_match:
-                try:
-                    delay = float(time_match.group(1))
-                    delays.append(delay)
-                except ValueError:
-                    pass
-        
-        # 解析丢包率（支持中英文）
-        # 英文: (0% packet loss) 或 (0% loss)
-        # 中文: (0% 丢失) 或类似格式
-        if '% packet loss' in line.lower() or '% loss' in line.lower() or '% 丢失' in line or '%' in line:
-            # 提取百分比数字
-            loss_match = re.search(r'(\d+(?:\.\d+)?)%', line)
-            if loss_match:
-                packet_loss = f"{loss_match.group(1)}%"
-        
-        # 解析数据包统计（Windows中文格式）
-        # 数据包: 已发送 = 4，已接收 = 4，丢失 = 0 (0% 丢失)
-        if '已发送' in line or '已接收' in line or 'ѷ' in line or 'ѽ' in line:
-            sent_match = re.search(r'(?:已发送|ѷ)\s*=\s*(\d+)', line)
-            recv_match = re.search(r'(?:已接收|ѽ)\s*=\s*(\d+)', line)
-            if sent_match:
-                packets_sent = int(sent_match.group(1))
-            if recv_match:
-                packets_received = int(recv_match.group(1))
-    
-    # 构建结果
-    if delays:
-        min_delay = min(delays)
-        max_delay = max(delays)
-        avg_delay = sum(delays) / len(delays)
-        
-        # 如果有数据包统计，使用它；否则使用延迟数据个数
-        sent_count = packets_sent if packets_sent > 0 else len(delays)
-        recv_count = packets_received if packets_received > 0 else len(delays)
-        
-        result += f"发送数据包: {sent_count}个\n"
-        result += f"接收数据包: {recv_count}个\n"
-        result += f"丢包率: {packet_loss}\n"
-        result += f"最小延迟: {min_delay:.2f}ms\n"
-        result += f"最大延迟: {max_delay:.2f}ms\n"
-        result += f"平均延迟: {avg_delay:.2f}ms\n"
-        
-        # 网络质量评估
-        if avg_delay < 50:
-            quality = "优秀"
-        elif avg_delay < 100:
-            quality = "良好"  
-        elif avg_delay < 200:
-            quality = "一般"
-        else:
-            quality = "较差"
-        
-        result += f"网络质量: {quality}"
-        
-        # 如果解析出丢包率，提供连接稳定性评估
-        if packet_loss != "未知" and packet_loss != "0%":
-            result += f"\n连接稳定性: 有丢包，建议检查网络"
-        elif packet_loss == "0%":
-            result += f"\n连接稳定性: 稳定"
-            
-    else:
-        result += "无法解析延迟信息\n"
-        result += f"丢包率: {packet_loss}\n"
-        
-        # 如果有原始的数据包统计但没有延迟，至少显示连通性
-        if packets_sent > 0:
-            result += f"发送数据包: {packets_sent}个\n"
-            result += f"接收数据包: {packets_received}个\n"
-            if packets_received > 0:
-                result += "连接状态: 可达\n"
-            else:
-                result += "连接状态: 不可达\n"
-        
-        # 显示部分原始输出用于调试
-        result += "\n原始输出片段:\n" + output[:300] + "..."
-    
-    return result
-
-# 精简的中英文对照表（备用翻译，API已支持直接中文返回）
-TRANSLATION_MAP = {
-    # 常见国家/地区
-    'United States': '美国',
-    'China': '中国', 
-    'Hong Kong': '香港',
-    'Taiwan': '台湾',
-    'Japan': '日本',
-    'South Korea': '韩国',
-    'United Kingdom': '英国',
-    'Singapore': '新加坡',
-    
-    # 常见运营商
-    'China Telecom': '中国电信',
-    'China Unicom': '中国联通', 
-    'China Mobile': '中国移动',
-    'Alibaba Cloud': '阿里云',
-    'Tencent Cloud': '腾讯云',
-    'Google LLC': '谷歌',
-    'Microsoft Corporation': '微软公司',
-    'Amazon Technologies': '亚马逊技术',
-    'Cloudflare': 'Cloudflare',
-}
-
-def translate_to_chinese(text):
-    """将英文文本翻译成中文"""
-    if not text or text == '未知':
-        return text
-    
-    # 直接查找完整匹配
-    if text in TRANSLATION_MAP:
-        return TRANSLATION_MAP[text]
-    
-    # 尝试部分匹配（用于处理复合词汇）
-    result = text
-    for en_text, cn_text in TRANSLATION_MAP.items():
-        if en_text.lower() in text.lower():
-            result = result.replace(en_text, cn_text)
-    
-    return result
-
-# 获取域名的IPv4和IPv6地址
-def get_domain_ips(domain):
-    """获取域名的IPv4和IPv6地址"""
-    ipv4_addresses = []
-    ipv6_addresses = []
-    
-    try:
-        # 获取IPv4地址
-        try:
-            ipv4_info = socket.getaddrinfo(domain, None, socket.AF_INET)
-            ipv4_addresses = list(set([info[4][0] for info in ipv4_info]))
-        except socket.gaierror:
-            pass
-        
-        # 获取IPv6地址
-        try:
-            ipv6_info = socket.getaddrinfo(domain, None, socket.AF_INET6)
-            ipv6_addresses = list(set([info[4][0] for info in ipv6_info]))
-        except socket.gaierror:
-            pass
-            
-    except Exception:
-        pass
-    
-    return ipv4_addresses, ipv6_addresses
-
-# 检查是否为IP地址
-def is_ip_address(address):
-    """检查字符串是否为有效的IP地址（IPv4或IPv6）"""
-    try:
-        socket.inet_pton(socket.AF_INET, address)
-        return True, "IPv4"
-    except socket.error:
-        try:
-            socket.inet_pton(socket.AF_INET6, address)
-            return True, "IPv6"
-        except socket.error:
-            return False, None
+            model_summary = "启用但列表为空"
+
+    result = (
+        f"NEW API 令牌用量信息:\n"
+        f"令牌名称: {name}\n"
+        f"额度（总/已用/剩余）: {total_granted} / {total_used} / {total_available}\n"
+        f"是否无限额度: {'是' if unlimited else '否'}\n"
+        f"模型限额: {'启用' if model_limits_enabled else '未启用'}\n"
+        f"允许模型: {model_summary}\n"
+        f"到期时间: {expires_str}\n"
+    )
+    # 无限额度的令牌没有可比较的剩余额度
+    remaining = None if unlimited else _to_float(total_available)
+    return BalanceResult(result, remaining=remaining, currency="额度")
 
 # 注册插件的装饰器
 @register(
@@ -589,7 +280,13 @@ class PluginBalanceIP(Star):
         self.context = context  # 保存context对象，供后续方法使用
         # 如果没有提供config，尝试手动创建它
         self.config = config or AstrBotConfig()
+        self._session = None  # 插件级共享的HTTP连接池，首次请求时创建
         self._load_config()
+        self._balance_monitor.start()
+        self._host_monitor.start()
+        self._metrics_exporter.start()
+        # 后台探测一次ping命令路径、ICMP权限与控制台编码，结果供之后所有 /ping 使用
+        start_capability_probe()
 
     def _load_config(self):
         """加载并初始化插件配置"""
@@ -597,42 +294,203 @@ class PluginBalanceIP(Star):
         network_config = self.config.get("network_config", {})
         self.ping_timeout = network_config.get("ping_timeout", 30.0)
         self.tcp_timeout = network_config.get("tcp_timeout", 3.0)
-        self.test_ports = network_config.get("test_ports", [22, 23, 80, 443, 5000, 6099, 6185])
+        # 未配置时使用网络工具模块的默认端口
+        self.test_ports = network_config.get("test_ports") or None
+        self.use_icmp_socket = network_config.get("use_icmp_socket", True)
+        self.ping_max_timeouts = network_config.get("ping_max_timeouts", 3)
+        self.ping_progress_interval = network_config.get("ping_progress_interval", 3.0)
+        # 多目标 /ping 与 /查询IP：单条命令的目标上限，以及全插件共享的并发探测上限
+        self.max_targets = max(1, int(network_config.get("max_targets", 20)))
+        self.dual_stack = network_config.get("dual_stack", False)
+        self.tcping_samples = max(1, int(network_config.get("tcping_samples", 4)))
+        self.tcping_interval = max(0.0, float(network_config.get("tcping_interval", 1.0)))
+        self._network_semaphore = asyncio.Semaphore(max(1, int(network_config.get("target_concurrency", 8))))
+        self._dns_cache = DNSCache(
+            ttl=network_config.get("dns_cache_ttl", 300.0),
+            negative_ttl=network_config.get("dns_negative_ttl", 30.0),
+        )
         
         # API配置
         api_config = self.config.get("api_config", {})
         self.request_timeout = api_config.get("request_timeout", 10.0)
         self.max_retries = api_config.get("max_retries", 3)
         self.newapi_base_url = api_config.get("newapi_base_url", "")
+        self.pool_limit = api_config.get("pool_limit", 100)
+        self.pool_limit_per_host = api_config.get("pool_limit_per_host", 10)
+        # 所有上游请求共用的超时/重试/熔断策略
+        self._request_policy = RequestPolicy(
+            timeout=self.request_timeout,
+            max_retries=self.max_retries,
+            breaker_threshold=api_config.get("breaker_threshold", 5),
+            breaker_cooldown=api_config.get("breaker_cooldown", 30.0),
+        )
+        # NEW API 实例：newapi_base_url 为“默认”实例，另可配置多个具名中转，各自独立的超时、熔断与连接池
+        self._newapi_instances, self._newapi_config_errors = parse_newapi_instances(
+            api_config.get("newapi_instances", []), self.newapi_base_url
+        )
+        for instance in self._newapi_instances:
+            instance.policy = RequestPolicy(
+                timeout=instance.timeout or self.request_timeout,
+                max_retries=self.max_retries,
+                breaker_threshold=api_config.get("breaker_threshold", 5),
+                breaker_cooldown=api_config.get("breaker_cooldown", 30.0),
+            )
+        for error in self._newapi_config_errors:
+            logger.warning(f"NEW API 实例配置无效: {error}")
+        self.batch_concurrency = max(1, int(api_config.get("batch_concurrency", 8)))
+        self.per_host_concurrency = max(1, int(api_config.get("per_host_concurrency", 4)))
+        # 批量查询并发控制：全局信号量 + 按上游主机划分的信号量
+        self._batch_semaphore = asyncio.Semaphore(self.batch_concurrency)
+        self._host_semaphores = {}
         
-        # 显示配置
-        display_config = self.config.get("display_config", {})
-        self.show_debug_info = display_config.get("show_debug_info", False)
-        self.mask_api_keys = display_config.get("mask_api_keys", True)
-
-    # 提取API密钥或IP地址的公共方法
-    def _get_command_argument(self, event: AstrMessageEvent):
-        messages = event.get_messages()
-        if not messages:
-            return None
+        # 缓存配置
+        cache_config = self.config.get("cache_config", {})
+        self._balance_cache = BalanceCache(
+            ttl=cache_config.get("balance_cache_ttl", 60.0),
+            negative_ttl=cache_config.get("negative_cache_ttl", 15.0),
+            max_entries=cache_config.get("cache_max_entries", 512),
+        )
+        self._ip_geo = IPGeoLookup(
+            ttl=cache_config.get("ip_geo_cache_ttl", 21600.0),
+            max_entries=cache_config.get("ip_geo_cache_max_entries", 4096),
+        )
 
-        message_text = ""
-        for message in messages:
-            if isinstance(message, At):
-                continue  # 跳过 @ 消息
-            message_text = message.text
-            break
+        # 离线IP归属地库配置
+        geo_db_config = self.config.get("geo_db_config", {})
+        self._geo_db = OfflineGeoDB(
+            path=geo_db_config.get("geo_db_path", ""),
+            url=geo_db_config.get("geo_db_url", ""),
+            refresh_hours=geo_db_config.get("geo_db_refresh_hours", 168.0),
+        )
+        self._geo_db_download_task = None
+
+        # 余额历史配置
+        history_config = self.config.get("history_config", {})
+        self._balance_history = None
+        if history_config.get("enable", True):
+            self._balance_history = BalanceHistory(
+                history_config.get("db_path") or os.path.join(self._plugin_data_dir(), DEFAULT_HISTORY_DB_NAME)
+            )
+
+        # 余额监控配置
+        monitor_config = self.config.get("monitor_config", {})
+        monitor_entries, self._monitor_config_errors = parse_monitor_entries(
+            monitor_config.get("entries", []) if monitor_config.get("enable", False) else [],
+            list(PROVIDER_NAMES),
+            monitor_config.get("default_threshold", 1.0),
+        )
+        self.monitor_alert_target = monitor_config.get("alert_target", "")
+        self._balance_monitor = BalanceMonitor(
+            monitor_entries,
+            self._monitor_poll,
+            self._send_monitor_alert,
+            interval=monitor_config.get("interval_minutes", 30) * 60,
+            jitter=monitor_config.get("jitter_seconds", 60),
+        )
 
-        if not message_text:
-            return None
+        # 主机监控配置
+        host_monitor_config = self.config.get("host_monitor_config", {})
+        host_targets, self._host_monitor_config_errors = parse_host_targets(
+            host_monitor_config.get("targets", []) if host_monitor_config.get("enable", False) else []
+        )
+        self.host_monitor_ping_count = max(1, int(host_monitor_config.get("ping_count", 3)))
+        self._host_monitor = HostMonitor(
+            host_targets,
+            self._host_monitor_probe,
+            interval=host_monitor_config.get("interval_seconds", 60),
+            window=host_monitor_config.get("window_minutes", 60) * 60,
+        )
 
-        parts = message_text.split()
-        if len(parts) < 2:
-            return None
-        return parts[1].strip()
+        # 命令准入控制配置
+        admission_config = self.config.get("admission_config", {})
+        self._admission = None
+        if admission_config.get("enable", True):
+            self._admission = AdmissionController(
+                user_rate=admission_config.get("user_rate_per_minute", 6),
+                user_burst=admission_config.get("user_burst", 5),
+                group_rate=admission_config.get("group_rate_per_minute", 20),
+                group_burst=admission_config.get("group_burst", 15),
+                merge_inflight=admission_config.get("merge_inflight", True),
+            )
+        self.admission_admin_exempt = admission_config.get("admin_exempt", True)
+
+        # 运行指标配置
+        metrics_config = self.config.get("metrics_config", {})
+        METRICS.enabled = metrics_config.get("enable", False)
+        self._metrics_exporter = PrometheusExporter(
+            METRICS,
+            metrics_config.get("prometheus_file", "") if METRICS.enabled else "",
+            interval=metrics_config.get("export_interval_seconds", 60),
+        )
 
-    # 提取多个API密钥的方法（支持批量查询）
-    def _get_multiple_api_keys(self, event: AstrMessageEvent):
+        # 显示配置
+        display_config = self.config.get("display_config", {})
+        self.show_debug_info = display_config.get("show_debug_info", False)
+        self.mask_api_keys = display_config.get("mask_api_keys", True)
+        # 批量查询结果按完成顺序分段发送：单条消息的字数上限与凑批等待时间
+        self.batch_chunk_chars = max(200, int(display_config.get("batch_chunk_chars", 1500)))
+        # 密钥数达到该值时批量查询默认输出汇总表
+        self.summary_min_keys = max(2, int(display_config.get("summary_min_keys", 10)))
+        self.stream_flush_seconds = max(0.0, float(display_config.get("stream_flush_seconds", 2.0)))
+
+    def _plugin_data_dir(self):
+        """插件数据目录：优先使用 AstrBot 的 StarTools.get_data_dir，旧版本没有该接口时使用 AstrBot 数据目录的绝对路径"""
+        try:
+            from astrbot.api.star import StarTools
+            return str(StarTools.get_data_dir(PLUGIN_NAME))
+        except (ImportError, AttributeError):
+            return os.path.abspath(os.path.join("data", "plugin_data", PLUGIN_NAME))
+
+    def _get_session(self, instance=None) -> aiohttp.ClientSession:
+        """获取插件共享的HTTP会话（懒加载，连接池复用keep-alive连接）
+
+        指定 NEW API 实例时返回该实例独占的会话，连接数上限为实例配置的连接数。
+        """
+        if instance is not None:
+            if instance.session is None or instance.session.closed:
+                pool_limit = instance.pool_limit or self.pool_limit_per_host
+                connector = aiohttp.TCPConnector(
+                    limit=pool_limit,
+                    limit_per_host=pool_limit,
+                    ttl_dns_cache=POOL_DNS_CACHE_TTL,
+                    keepalive_timeout=POOL_KEEPALIVE_TIMEOUT,
+                )
+                instance.session = aiohttp.ClientSession(connector=connector)
+            return instance.session
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=POOL_DNS_CACHE_TTL,
+                keepalive_timeout=POOL_KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def terminate(self):
+        """插件卸载时停止后台任务并关闭共享的HTTP会话"""
+        self._balance_monitor.stop()
+        self._host_monitor.stop()
+        self._metrics_exporter.stop()
+        if self._balance_history is not None:
+            self._balance_history.close()
+        if self._geo_db_download_task is not None and not self._geo_db_download_task.done():
+            self._geo_db_download_task.cancel()
+        self._geo_db.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        for instance in self._newapi_instances:
+            if instance.session is not None and not instance.session.closed:
+                await instance.session.close()
+            instance.session = None
+
+    def _admission_exempt(self, event: AstrMessageEvent):
+        """管理员是否免于命令限流"""
+        return self.admission_admin_exempt and event.is_admin()
+
+    # 提取多个参数的方法：支持空格、换行符、逗号分隔
+    def _get_argument_list(self, event: AstrMessageEvent):
         messages = event.get_messages()
         if not messages:
             return []
@@ -672,7 +530,44 @@ class PluginBalanceIP(Star):
                 api_keys.append(line)
         
         # 过滤空字符串
-        filtered_keys = [key for key in api_keys if key]
+        return [key for key in api_keys if key]
+
+    # 提取多个API密钥的方法（支持批量查询）
+    def _parse_below_threshold(self, arg):
+        """解析“低于阈值”参数（如 <5、低于5），不是该参数时返回 None"""
+        for prefix in BELOW_PREFIXES:
+            if arg.startswith(prefix):
+                try:
+                    return float(arg[len(prefix):])
+                except ValueError:
+                    return None
+        return None
+
+    def _get_balance_options(self, event: AstrMessageEvent, arguments=None):
+        """拆分余额命令的参数，返回 (密钥列表, 输出模式, 低于阈值, 重复密钥提醒)
+
+        输出模式：True 为汇总表，False 为逐个密钥的详细结果，None 为按密钥数量自动选择。
+        """
+        summary = None
+        below = None
+        remaining = self._get_argument_list(event) if arguments is None else arguments
+        arguments = []
+        for arg in remaining:
+            threshold = self._parse_below_threshold(arg)
+            if threshold is not None:
+                below = threshold
+            elif arg in SUMMARY_FLAGS:
+                summary = True
+            elif arg in DETAIL_FLAGS:
+                summary = False
+            else:
+                arguments.append(arg)
+        api_keys, warning = self._get_multiple_api_keys(event, arguments)
+        return api_keys, summary, below, warning
+
+    def _get_multiple_api_keys(self, event: AstrMessageEvent, arguments=None):
+        """去重后的密钥列表与重复密钥提醒（没有重复时为 None），提醒随结果传递，不存放在插件状态中"""
+        filtered_keys = self._get_argument_list(event) if arguments is None else arguments
         
         # 检查是否有重复的API key
         unique_keys = list(dict.fromkeys(filtered_keys))
@@ -688,48 +583,460 @@ class PluginBalanceIP(Star):
             
             # 添加重复提醒到结果中（通过在第一个重复密钥前添加标记）
             if self.show_debug_info:
-                self._duplicate_warning = f"⚠️ 检测到重复的API密钥: {', '.join([self._mask_api_key(key) for key in duplicates])}"
+                warning = f"⚠️ 检测到重复的API密钥: {', '.join([self._mask_api_key(key) for key in duplicates])}"
             else:
-                self._duplicate_warning = f"⚠️ 检测到重复的API密钥"
+                warning = "⚠️ 检测到重复的API密钥"
         else:
-            self._duplicate_warning = None
+            warning = None
         
-        return unique_keys
+        return unique_keys, warning
+
+    def _get_host_semaphore(self, host):
+        """获取指定上游主机的并发信号量"""
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_concurrency)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def _key_timeout(self, policy=None):
+        """单个密钥查询的总超时（覆盖全部重试与退避时间，OpenAI需两次请求）"""
+        return (policy or self._request_policy).worst_case_duration() * 2 + 5.0
+
+    async def _record_history(self, provider, api_key, result):
+        """将成功且带余额数值的查询结果写入历史库"""
+        if self._balance_history is None:
+            return
+        if getattr(result, "status", None) != STATUS_OK or getattr(result, "remaining", None) is None:
+            return
+        try:
+            await self._balance_history.arecord(provider, hash_api_key(api_key), result.remaining, result.currency)
+        except Exception as e:
+            logger.warning(f"写入余额历史失败: {e}")
+
+    def _with_snapshot_age(self, result, age):
+        """监控快照结果末尾注明更新时间"""
+        return result.with_text(f"{result.rstrip()}\n📡 监控快照，{format_cache_age(age)}前更新\n")
+
+    def _with_cache_age(self, result, age):
+        """缓存命中时在结果末尾注明数据年龄"""
+        if age > 0:
+            return result.with_text(f"{result.rstrip()}\n⏱️ 缓存数据，{format_cache_age(age)}前获取\n")
+        return result
+
+    def _newapi_instance(self, name=None):
+        """按名称查找 NEW API 实例，name 为 None 时返回第一个实例；不存在返回 None"""
+        for instance in self._newapi_instances:
+            if name is None or instance.name == name:
+                return instance
+        return None
+
+    def _platform_name(self, provider, instance=None):
+        """余额平台的显示名称，配置了多个 NEW API 实例时注明实例名称"""
+        if provider == "newapi" and instance is not None and len(self._newapi_instances) > 1:
+            return f"{PROVIDER_NAMES[provider]}（{instance}）"
+        return PROVIDER_NAMES[provider]
+
+    def _provider_spec(self, provider, instance=None):
+        """返回余额平台的 (查询函数, 显示名称, 上游主机)，instance 为 NEW API 实例名称"""
+        if provider == "siliconflow":
+            async def _q(k: str):
+                return await query_siliconflow_balance(k, self._get_session(), self._request_policy)
+            return _q, PROVIDER_NAMES[provider], urlparse(SILICONFLOW_API_URL).hostname
+        if provider == "openai":
+            async def _q(k: str):
+                return await query_openai_balance(k, self._get_session(), self._request_policy)
+            return _q, PROVIDER_NAMES[provider], urlparse(OPENAI_API_BASE_URL).hostname
+        if provider == "deepseek":
+            async def _q(k: str):
+                return await query_ds_balance(k, self._get_session(), self._request_policy)
+            return _q, PROVIDER_NAMES[provider], urlparse(DEEPSEEK_API_URL).hostname
+        if provider == "newapi":
+            target = self._newapi_instance(instance)
+            async def _q(k: str):
+                return await query_newapi_balance(target.base_url, k, self._get_session(target), target.policy)
+            return _q, self._platform_name(provider, target.name), target.host
+        raise ValueError(f"未知的余额平台: {provider}")
+
+    def _batch_query_func(self, provider, use_cache=True, instance=None):
+        """返回查询单个密钥的协程函数，在并发上限内执行，异常与超时转换为结果文本
+
+        use_cache=False 时跳过缓存与监控快照直接请求上游（供后台监控轮询使用）。
+        NEW API 未指定实例且配置了多个实例时，密钥同时发往全部实例，取最先成功的结果。
+        """
+        if provider == "newapi" and instance is None and len(self._newapi_instances) > 1:
+            return self._newapi_fanout_func(use_cache)
+        provider_query, platform_name, host = self._provider_spec(provider, instance)
+        cache_provider = (platform_name, host)
+
+        async def query_func(api_key):
+            result = await provider_query(api_key)
+            await self._record_history(provider, api_key, result)
+            return result
+
+        host_semaphore = self._get_host_semaphore(host)
+        key_timeout = self._key_timeout(self._newapi_instance(instance).policy if provider == "newapi" else None)
+
+        async def _query_one(api_key):
+            if use_cache:
+                # 监控中的密钥直接使用最新快照，其次使用缓存，均无需占用并发名额
+                # （监控快照按平台保存，只用于未指定 NEW API 实例的查询）
+                snapshot = self._balance_monitor.snapshot(provider, api_key) if instance is None else None
+                if snapshot is not None:
+                    METRICS.inc("balance_lookups_total", provider=provider, source="snapshot")
+                    return self._with_snapshot_age(*snapshot)
+                cached = self._balance_cache.lookup(cache_provider, api_key)
+                if cached is not None:
+                    METRICS.inc("balance_lookups_total", provider=provider, source="cache")
+                    return self._with_cache_age(*cached)
+            source = "upstream"
+            async with self._batch_semaphore, host_semaphore:
+                try:
+                    if not use_cache:
+                        return await asyncio.wait_for(query_func(api_key), timeout=key_timeout)
+                    result, age = await asyncio.wait_for(
+                        self._balance_cache.fetch(cache_provider, api_key, lambda: query_func(api_key)),
+                        timeout=key_timeout,
+                    )
+                    if age > 0:
+                        # 排队等待并发名额期间已有其他查询写入缓存
+                        source = "cache"
+                    return self._with_cache_age(result, age)
+                except asyncio.TimeoutError:
+                    return f"查询超时（{key_timeout:.0f}秒内无响应）"
+                except Exception as e:
+                    return f"查询失败: {str(e)}"
+                finally:
+                    METRICS.inc("balance_lookups_total", provider=provider, source=source)
+
+        return _query_one
+
+    def _newapi_fanout_func(self, use_cache=True):
+        """返回把一个密钥同时发往全部 NEW API 实例的查询函数：首个成功的结果立即返回，其余查询取消"""
+        query_funcs = {
+            instance.name: self._batch_query_func("newapi", use_cache, instance.name)
+            for instance in self._newapi_instances
+        }
+
+        async def _query_first(api_key):
+            if use_cache:
+                snapshot = self._balance_monitor.snapshot("newapi", api_key)
+                if snapshot is not None:
+                    METRICS.inc("balance_lookups_total", provider="newapi", source="snapshot")
+                    return self._with_snapshot_age(*snapshot)
+            name, result, failures = await first_ok({
+                name: query_one(api_key) for name, query_one in query_funcs.items()
+            })
+            if failures is None:
+                return result.with_text(f"{result.rstrip()}\n🔀 实例: {name}（{len(query_funcs)} 个实例中最先成功）\n")
+            text = "所有 NEW API 实例均未查询成功:\n" + "\n".join(
+                f"  {name}: {str(result).strip().splitlines()[0] if str(result).strip() else '未知错误'}"
+                for name, result in failures
+            )
+            # 全部实例都判定为无效时密钥无效，否则视为查询失败
+            if all(result_status(result) == STATUS_INVALID for _, result in failures):
+                return BalanceResult(text, STATUS_INVALID)
+            return text
+
+        return _query_first
+
+    async def _run_batch(self, api_keys, provider, use_cache=True, instance=None):
+        """在并发上限内同时查询多个密钥，结果顺序与输入一致"""
+        query_one = self._batch_query_func(provider, use_cache, instance)
+        return await asyncio.gather(*(query_one(api_key) for api_key in api_keys))
+
+    async def _iter_batch(self, api_keys, provider, flush_after=None, instance=None):
+        """并发查询多个密钥，按完成顺序分批产出 [(序号, 结果)]
+
+        flush_after 为秒数时，一批中最早完成的结果等待超过该时间即产出本批，
+        为 None 时每个结果完成即单独产出。提前关闭生成器会取消尚未完成的查询。
+        """
+        query_one = self._batch_query_func(provider, instance=instance)
+
+        async def _indexed(index, api_key):
+            return index, await query_one(api_key)
+
+        loop = asyncio.get_running_loop()
+        pending = {asyncio.ensure_future(_indexed(index, api_key)) for index, api_key in enumerate(api_keys)}
+        ready = []
+        deadline = None
+        try:
+            while pending:
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if done and deadline is None and flush_after is not None:
+                    deadline = loop.time() + flush_after
+                ready.extend(task.result() for task in done)
+                if ready and (flush_after is None or not pending or loop.time() >= deadline):
+                    yield sorted(ready)
+                    ready = []
+                    deadline = None
+        finally:
+            for task in pending:
+                task.cancel()
 
     # 批量查询方法
-    async def _batch_query_balance(self, api_keys, query_func, platform_name):
-        """批量查询余额的通用方法"""
+    async def _stream_batch_query_balance(self, api_keys, provider, summary=None, below=None, instance=None,
+                                          warning=None):
+        """批量查询余额：按完成顺序分段产出结果文本，每段不超过 batch_chunk_chars，最后产出汇总行
+
+        summary 为 True（或未指定且密钥数达到 summary_min_keys、或给出了 below 阈值）时
+        改为全部完成后输出按余额排序的汇总表，below 只列出余额低于该值的密钥。
+        instance 为 NEW API 实例名称，warning 为重复密钥提醒。
+        """
+        platform_name = self._platform_name(provider, instance)
         if not api_keys:
-            return f"请输入API密钥，格式为：{platform_name}余额 <API密钥1> [API密钥2] [API密钥3]...\n支持用空格、换行符或逗号分隔多个密钥"
-        
-        if len(api_keys) == 1:
+            yield (
+                f"请输入API密钥，格式为：{platform_name}余额 <API密钥1> [API密钥2] [API密钥3]... [汇总|详细] [<阈值]\n"
+                "支持用空格、换行符或逗号分隔多个密钥"
+            )
+            return
+
+        if len(api_keys) == 1 and below is None:
             # 单个密钥，直接查询
-            return await query_func(api_keys[0])
-        
-        # 多个密钥，批量查询
-        results = []
-        results.append(f"=== {platform_name}批量余额查询结果 ===")
-        results.append(f"共查询 {len(api_keys)} 个API密钥\n")
-        
+            yield (await self._run_batch(api_keys, provider, instance=instance))[0]
+            return
+
+        if summary is None:
+            summary = below is not None or len(api_keys) >= self.summary_min_keys
+        if summary:
+            started = time.perf_counter()
+            results = await self._run_batch(api_keys, provider, instance=instance)
+            lines = self._format_balance_table(
+                platform_name, api_keys, results, below, time.perf_counter() - started, warning=warning
+            )
+            for chunk in self._chunk_lines(lines):
+                yield chunk
+            return
+
+        started = time.perf_counter()
+        header = [f"=== {platform_name}批量余额查询结果 ===", f"共查询 {len(api_keys)} 个API密钥，结果按完成顺序分批发送"]
         # 如果有重复密钥，显示提醒
-        if hasattr(self, '_duplicate_warning') and self._duplicate_warning:
-            results.append(self._duplicate_warning + "\n")
-        
-        for i, api_key in enumerate(api_keys, 1):
-            # 隐藏部分密钥内容以保护隐私
-            masked_key = self._mask_api_key(api_key)
-            results.append(f"【密钥 {i}】 {masked_key}")
-            results.append("-" * 50)
-            
-            try:
-                result = await query_func(api_key)
-                results.append(result)
-            except Exception as e:
-                results.append(f"查询失败: {str(e)}")
-            
-            results.append("")  # 添加空行分隔
-        
-        return "\n".join(results)
+        if warning:
+            header.append(warning)
+        yield "\n".join(header)
+
+        counts = {STATUS_OK: 0, STATUS_INVALID: 0}
+        failed = 0
+        chunk = []
+        chunk_size = 0
+        async for ready in self._iter_batch(api_keys, provider, self.stream_flush_seconds, instance):
+            for index, result in ready:
+                status = result_status(result)
+                if status in counts:
+                    counts[status] += 1
+                else:
+                    failed += 1
+                # 隐藏部分密钥内容以保护隐私
+                entry = f"【密钥 {index + 1}/{len(api_keys)}】 {self._mask_api_key(api_keys[index])}\n{'-' * 50}\n{result.rstrip()}\n"
+                if chunk and chunk_size + len(entry) > self.batch_chunk_chars:
+                    yield "\n".join(chunk)
+                    chunk = []
+                    chunk_size = 0
+                chunk.append(entry)
+                chunk_size += len(entry) + 1
+            # 本批结果发送出去，不等待后续较慢的密钥
+            if chunk:
+                yield "\n".join(chunk)
+                chunk = []
+                chunk_size = 0
+
+        yield (
+            f"📋 {platform_name}批量查询完成：共 {len(api_keys)} 个密钥，成功 {counts[STATUS_OK]}，"
+            f"无效 {counts[STATUS_INVALID]}，失败 {failed}，耗时 {time.perf_counter() - started:.1f} 秒"
+        )
+
+    def _chunk_lines(self, lines):
+        """把文本行按 batch_chunk_chars 拼成若干条消息"""
+        chunk = []
+        chunk_size = 0
+        for line in lines:
+            if chunk and chunk_size + len(line) > self.batch_chunk_chars:
+                yield "\n".join(chunk)
+                chunk = []
+                chunk_size = 0
+            chunk.append(line)
+            chunk_size += len(line) + 1
+        if chunk:
+            yield "\n".join(chunk)
+
+    def _format_balance_table(self, platform_name, api_keys, results, below=None, elapsed=None, tip=True,
+                              warning=None):
+        """批量查询的汇总表：每个密钥一行，问题密钥在前，其余按剩余余额从低到高排序"""
+        rows = []
+        totals = {}
+        counts = {"ok": 0, "exhausted": 0, "invalid": 0, "failed": 0}
+        for index, (api_key, result) in enumerate(zip(api_keys, results)):
+            status = result_status(result)
+            remaining = getattr(result, "remaining", None)
+            currency = getattr(result, "currency", "") or ""
+            if status == STATUS_INVALID:
+                counts["invalid"] += 1
+                rows.append((0, 0.0, index, "❌ 无效/无权限"))
+            elif status != STATUS_OK:
+                counts["failed"] += 1
+                reason = result.strip().splitlines()[0] if result.strip() else "未知错误"
+                rows.append((0, 0.0, index, f"❗ {reason[:40]}"))
+            elif remaining is None:
+                counts["ok"] += 1
+                rows.append((2, 0.0, index, "♾️ 无限额度/未知"))
+            else:
+                totals[currency] = totals.get(currency, 0.0) + remaining
+                if remaining <= 0:
+                    counts["exhausted"] += 1
+                    rows.append((1, remaining, index, f"⚠️ 已耗尽 {remaining:g} {currency}".rstrip()))
+                else:
+                    counts["ok"] += 1
+                    rows.append((1, remaining, index, f"✅ {remaining:.2f} {currency}".rstrip()))
+
+        if below is not None:
+            # 只保留余额低于阈值的密钥（无效与查询失败的密钥同样列出）
+            rows = [row for row in rows if row[0] == 0 or (row[0] == 1 and row[1] < below)]
+        rows.sort(key=lambda row: (row[0], row[1], row[2]))
+
+        title = f"=== {platform_name}余额汇总（{len(api_keys)} 个密钥"
+        title += f"，仅列出低于 {below:g} 的 {len(rows)} 个）===" if below is not None else "）==="
+        lines = [title]
+        if warning:
+            lines.append(warning)
+        width = len(str(len(api_keys)))
+        for _, _, index, state in rows:
+            lines.append(f"#{index + 1:<{width}} {self._mask_api_key(api_keys[index])}  {state}")
+        if not rows:
+            lines.append("（没有符合条件的密钥）")
+
+        total_text = "；".join(f"{amount:.2f} {currency}".rstrip() for currency, amount in totals.items())
+        lines.append(
+            f"📋 正常 {counts['ok']} · 已耗尽 {counts['exhausted']} · 无效 {counts['invalid']} · 失败 {counts['failed']}"
+            + (f" | 合计 {total_text}" if total_text else "")
+            + (f" | 耗时 {elapsed:.1f} 秒" if elapsed is not None else "")
+        )
+        if tip:
+            lines.append("💡 追加参数“详细”查看每个密钥的完整信息")
+        return lines
+
+    async def _mixed_query_balance(self, api_keys, summary=None, below=None, warning=None):
+        """混合平台批量查询：按格式识别密钥所属平台，各平台并发查询，无法识别的密钥同时尝试全部候选平台
+
+        返回按平台分组的报告文本行。
+        """
+        started = time.perf_counter()
+        candidates = [provider for provider in KEY_TRIAL_ORDER if provider != "newapi" or self._newapi_instances]
+        query_funcs = {provider: self._batch_query_func(provider) for provider in candidates}
+        groups = {provider: [] for provider in PROVIDER_NAMES}  # 平台 -> [(密钥, 结果)]
+        classified = {}
+        unknown = []
+        for api_key in api_keys:
+            provider = classify_api_key(api_key)
+            if provider is None:
+                unknown.append(api_key)
+            else:
+                classified.setdefault(provider, []).append(api_key)
+
+        async def _query_group(provider, keys):
+            results = await asyncio.gather(*(query_funcs[provider](api_key) for api_key in keys))
+            groups[provider].extend(zip(keys, results))
+
+        async def _trial(api_key):
+            # 同时尝试全部候选平台，首个查询成功的平台即为密钥所属平台，其余查询随即取消；
+            # 耗时取决于最快成功的平台，不会因逐个等待各平台超时而拖慢整个报告
+            provider, result, attempts = await first_ok({
+                provider: query_funcs[provider](api_key) for provider in candidates
+            })
+            if attempts is None:
+                groups[provider].append((api_key, result))
+                return None
+            return api_key, attempts
+
+        outcomes = await asyncio.gather(
+            *(_query_group(provider, keys) for provider, keys in classified.items()),
+            *(_trial(api_key) for api_key in unknown),
+        )
+        unresolved = [outcome for outcome in outcomes if outcome]
+
+        if summary is None:
+            summary = below is not None or len(api_keys) >= self.summary_min_keys
+        # 各平台内按输入顺序排列（同时尝试候选平台识别的密钥完成时间不定）
+        order = {api_key: index for index, api_key in enumerate(api_keys)}
+        found = {
+            provider: sorted(pairs, key=lambda pair: order[pair[0]]) for provider, pairs in groups.items() if pairs
+        }
+        lines = [f"=== 混合平台余额查询（共 {len(api_keys)} 个密钥，识别出 {len(found)} 个平台）==="]
+        if warning:
+            lines.append(warning)
+        for provider, pairs in found.items():
+            platform_name = PROVIDER_NAMES[provider]
+            keys = [api_key for api_key, _ in pairs]
+            results = [result for _, result in pairs]
+            lines.append("")
+            if summary:
+                lines.extend(self._format_balance_table(platform_name, keys, results, below, tip=False))
+                continue
+            lines.append(f"【{platform_name}】{len(pairs)} 个密钥")
+            for i, (api_key, result) in enumerate(pairs, 1):
+                lines.append(f"【密钥 {i}】 {self._mask_api_key(api_key)}\n{'-' * 50}\n{result.rstrip()}\n")
+
+        if unresolved:
+            lines.append(f"\n❓ 无法确定平台的密钥（{len(unresolved)} 个，候选平台均未查询成功）:")
+            for api_key, attempts in unresolved:
+                tried = " · ".join(
+                    f"{PROVIDER_NAMES[provider]} {'无效' if result_status(result) == STATUS_INVALID else '失败'}"
+                    for provider, result in attempts
+                )
+                lines.append(f"  {self._mask_api_key(api_key)}: {tried}")
+
+        platforms = " · ".join(f"{PROVIDER_NAMES[provider]} {len(pairs)}" for provider, pairs in found.items())
+        lines.append(
+            f"\n📋 {platforms or '无'}"
+            + (f" · 未识别 {len(unresolved)}" if unresolved else "")
+            + f" | 耗时 {time.perf_counter() - started:.1f} 秒"
+        )
+        if summary:
+            lines.append("💡 追加参数“详细”查看每个密钥的完整信息")
+        return lines
+
+    async def _compare_newapi_balance(self, api_keys, warning=None):
+        """把每个密钥同时发往全部 NEW API 实例，返回逐实例对比的报告文本行
+
+        对比总是直接请求各实例（不使用缓存与监控快照），余额与耗时都是本次实测值；
+        每个实例受各自的超时约束，较慢的实例超时后记为失败，不会无限拖延结果。
+        """
+        started = time.perf_counter()
+        query_funcs = [
+            (instance.name, self._batch_query_func("newapi", use_cache=False, instance=instance.name))
+            for instance in self._newapi_instances
+        ]
+
+        async def _timed(query_one, api_key):
+            begin = time.perf_counter()
+            result = await query_one(api_key)
+            return result, time.perf_counter() - begin
+
+        rows = await asyncio.gather(*(
+            asyncio.gather(*(_timed(query_one, api_key) for _, query_one in query_funcs)) for api_key in api_keys
+        ))
+
+        lines = [f"=== NEW API 多实例对比（{len(api_keys)} 个密钥 × {len(query_funcs)} 个实例）==="]
+        if warning:
+            lines.append(warning)
+        width = max(len(name) for name, _ in query_funcs)
+        for i, (api_key, results) in enumerate(zip(api_keys, rows), 1):
+            lines.append(f"\n【密钥 {i}】 {self._mask_api_key(api_key)}")
+            for (name, _), (result, elapsed) in zip(query_funcs, results):
+                status = result_status(result)
+                remaining = getattr(result, "remaining", None)
+                if status == STATUS_INVALID:
+                    state = "❌ 无效/无权限"
+                elif status != STATUS_OK:
+                    reason = result.strip().splitlines()[0] if result.strip() else "未知错误"
+                    state = f"❗ {reason[:40]}"
+                elif remaining is None:
+                    state = "♾️ 无限额度/未知"
+                else:
+                    state = f"✅ {remaining:g} {getattr(result, 'currency', '')}".rstrip()
+                lines.append(f"  {name:<{width}}  {state} | {elapsed:.2f}秒")
+        lines.append(f"\n📋 对比完成，耗时 {time.perf_counter() - started:.1f} 秒")
+        return lines
 
     def _mask_api_key(self, api_key):
         """掩码API密钥，保护隐私"""
@@ -741,212 +1048,611 @@ class PluginBalanceIP(Star):
 
     # 查询硅基余额命令
     @filter.command("硅基余额")
+    @admission_controlled(1.0, per_argument=0.1)
     async def siliconflow_balance(self, event: AstrMessageEvent):
         """查询硅基流动余额（支持批量查询）"""
-        api_keys = self._get_multiple_api_keys(event)
-        result = await self._batch_query_balance(api_keys, query_siliconflow_balance, "硅基流动")
-        yield event.plain_result(result)
+        api_keys, summary, below, warning = self._get_balance_options(event)
+        async for text in self._stream_batch_query_balance(api_keys, "siliconflow", summary, below, warning=warning):
+            yield event.plain_result(text)
 
     # 查询GPT余额命令
     @filter.command("GPT余额")
+    @admission_controlled(1.0, per_argument=0.1)
     async def openai_balance(self, event: AstrMessageEvent):
         """查询OpenAI余额（支持批量查询）"""
-        api_keys = self._get_multiple_api_keys(event)
-        result = await self._batch_query_balance(api_keys, query_openai_balance, "OpenAI")
-        yield event.plain_result(result)
+        api_keys, summary, below, warning = self._get_balance_options(event)
+        async for text in self._stream_batch_query_balance(api_keys, "openai", summary, below, warning=warning):
+            yield event.plain_result(text)
 
     # 查询DS余额命令
     @filter.command("DS余额")
+    @admission_controlled(1.0, per_argument=0.1)
     async def ds_balance(self, event: AstrMessageEvent):
         """查询DeepSeek余额（支持批量查询）"""
-        api_keys = self._get_multiple_api_keys(event)
-        result = await self._batch_query_balance(api_keys, query_ds_balance, "DeepSeek")
-        yield event.plain_result(result)
+        api_keys, summary, below, warning = self._get_balance_options(event)
+        async for text in self._stream_batch_query_balance(api_keys, "deepseek", summary, below, warning=warning):
+            yield event.plain_result(text)
 
     # 查询NEW余额命令
     @filter.command("NEW余额")
+    @admission_controlled(1.0, per_argument=0.1)
     async def newapi_balance(self, event: AstrMessageEvent):
-        """查询 NEW API 余额（支持批量查询）"""
-        if not self.newapi_base_url:
-            yield event.plain_result("未配置 newapi_base_url（NEW API 基地址）。请在插件设置中配置，如：https://your-newapi-server")
+        """查询 NEW API 余额（支持批量查询；多个实例时可指定实例、并发取最快结果或逐实例对比）"""
+        if not self._newapi_instances:
+            yield event.plain_result(
+                "未配置 NEW API 实例。请在插件设置中配置 newapi_base_url（如：https://your-newapi-server）"
+                "或 newapi_instances"
+            )
+            return
+        # 参数中的实例名称与“对比”标记先拆出，其余交给通用的余额参数解析
+        instance = None
+        compare = False
+        arguments = []
+        for arg in self._get_argument_list(event):
+            if arg in COMPARE_FLAGS:
+                compare = True
+            elif instance is None and self._newapi_instance(arg) is not None:
+                instance = arg
+            else:
+                arguments.append(arg)
+        api_keys, summary, below, warning = self._get_balance_options(event, arguments)
+        if len(self._newapi_instances) > 1 and not api_keys:
+            names = "、".join(instance.name for instance in self._newapi_instances)
+            yield event.plain_result(
+                "请输入API密钥，格式为：NEW余额 [实例名称] <API密钥1> [API密钥2]... [对比|汇总|详细] [<阈值]\n"
+                f"已配置实例: {names}\n"
+                "不指定实例时同时查询全部实例并返回最先成功的结果，追加“对比”逐实例列出结果"
+            )
+            return
+        if compare and len(self._newapi_instances) > 1:
+            for chunk in self._chunk_lines(await self._compare_newapi_balance(api_keys, warning)):
+                yield event.plain_result(chunk)
+            return
+        async for text in self._stream_batch_query_balance(api_keys, "newapi", summary, below, instance, warning):
+            yield event.plain_result(text)
+
+    # 混合平台余额查询命令
+    @filter.command("余额")
+    @admission_controlled(1.0, per_argument=0.2)
+    async def mixed_balance(self, event: AstrMessageEvent):
+        """自动识别密钥所属平台并查询余额（支持多个平台的密钥混合批量查询）"""
+        api_keys, summary, below, warning = self._get_balance_options(event)
+        if not api_keys:
+            yield event.plain_result(
+                "请输入API密钥，格式为：余额 <API密钥1> [API密钥2]... [汇总|详细] [<阈值]\n"
+                "可混合硅基流动、DeepSeek、OpenAI、NEW API 的密钥，自动按格式识别平台"
+            )
+            return
+        yield event.plain_result(f"正在识别并查询 {len(api_keys)} 个密钥，请稍候...")
+        for chunk in self._chunk_lines(await self._mixed_query_balance(api_keys, summary, below, warning)):
+            yield event.plain_result(chunk)
+
+    async def _monitor_poll(self, provider, api_keys):
+        """后台监控轮询：同一平台的密钥走一次并发批量查询，跳过缓存"""
+        if provider == "newapi" and not self._newapi_instances:
+            return ["未配置 NEW API 实例"] * len(api_keys)
+        return await self._run_batch(api_keys, provider, use_cache=False)
+
+    async def _send_monitor_alert(self, text):
+        """推送余额预警到配置的会话"""
+        if not self.monitor_alert_target:
+            logger.warning(f"未配置余额预警推送目标 alert_target，预警内容: {text}")
+            return
+        await self.context.send_message(self.monitor_alert_target, MessageChain().message(text))
+
+    # 余额监控状态命令
+    @filter.command("余额监控")
+    @admission_controlled(0.2)
+    async def balance_monitor_status(self, event: AstrMessageEvent):
+        """查看后台余额监控的最新快照"""
+        rows = self._balance_monitor.status_rows()
+        if not rows:
+            lines = ["未启用余额监控或未配置监控密钥。", "请在插件设置 monitor_config 中开启并添加：平台|密钥|别名|阈值"]
+            lines.extend(self._monitor_config_errors)
+            yield event.plain_result("\n".join(lines))
             return
-        api_keys = self._get_multiple_api_keys(event)
 
-        async def _q(k: str):
-            return await query_newapi_balance(self.newapi_base_url, k, self.request_timeout, self.max_retries)
+        lines = [f"📡 余额监控（共 {len(rows)} 个密钥，每 {self._balance_monitor.interval / 60:g} 分钟轮询）"]
+        for entry, result, age in rows:
+            name = entry.alias or self._mask_api_key(entry.api_key)
+            platform_name = PROVIDER_NAMES[entry.provider]
+            if result is None:
+                lines.append(f"⏳ {name}（{platform_name}）: 等待首次轮询")
+                continue
+            remaining = getattr(result, "remaining", None)
+            if getattr(result, "status", None) == STATUS_INVALID:
+                state = "❌ 密钥无效"
+            elif remaining is None:
+                state = "✅ 无限额度/未知"
+            else:
+                flag = "⚠️" if entry.threshold is not None and remaining < entry.threshold else "✅"
+                state = f"{flag} {remaining:g} {getattr(result, 'currency', '')}"
+            lines.append(f"{name}（{platform_name}）: {state}（{format_cache_age(age)}前）")
+        lines.extend(self._monitor_config_errors)
+        if not self.monitor_alert_target:
+            lines.append(f"\n💡 未配置预警推送目标，可将当前会话ID填入 alert_target：{event.unified_msg_origin}")
+        yield event.plain_result("\n".join(lines))
+
+    # 余额趋势命令
+    @filter.command("余额趋势")
+    @admission_controlled(0.5)
+    async def balance_trend(self, event: AstrMessageEvent):
+        """查看密钥的历史消耗速率与预计耗尽时间"""
+        if self._balance_history is None:
+            yield event.plain_result("未启用余额历史记录，请在插件设置 history_config 中开启。")
+            return
+        arguments = self._get_argument_list(event)
+        provider = None
+        keys = []
+        for arg in arguments:
+            if arg.lower() in PROVIDER_NAMES:
+                provider = arg.lower()
+            else:
+                keys.append(arg)
+        if len(keys) != 1:
+            yield event.plain_result(
+                f"请输入一个API密钥，格式为：余额趋势 <API密钥> [平台]\n平台可选：{', '.join(PROVIDER_NAMES)}"
+            )
+            return
 
-        result = await self._batch_query_balance(api_keys, _q, "NEW API")
-        yield event.plain_result(result)
+        api_key = keys[0]
+        trends = await self._balance_history.atrends(hash_api_key(api_key), provider)
+        if not trends:
+            yield event.plain_result("暂无该密钥的余额记录，查询过余额后才会开始记录。")
+            return
+
+        sections = [self._format_trend(api_key, trend) for trend in trends]
+        yield event.plain_result("\n\n".join(sections))
+
+    def _format_trend(self, api_key, trend):
+        """格式化单个平台的余额趋势"""
+        currency = trend["currency"]
+        lines = [
+            f"📈 余额趋势 {self._mask_api_key(api_key)}（{PROVIDER_NAMES.get(trend['provider'], trend['provider'])}）",
+            f"当前余额: {trend['remaining']:g} {currency}（{format_cache_age(max(0.0, time.time() - trend['last_ts']))}前）",
+            f"记录次数: {trend['samples']}（自 {datetime.fromtimestamp(trend['first_ts']).strftime('%Y-%m-%d %H:%M')} 起）",
+        ]
+        if trend["hourly_rate"] is None:
+            lines.append("消耗速率: 记录不足，至少需要两次间隔超过1分钟的查询")
+            return "\n".join(lines)
+
+        lines.append(f"消耗速率: {trend['hourly_rate']:.4g} {currency}/小时（近{SHORT_TAU_HOURS:g}小时加权）")
+        lines.append(f"日均消耗: {trend['daily_rate']:.4g} {currency}/天（近{LONG_TAU_HOURS / 24:g}天加权）")
+        hours_left = trend["hours_left"]
+        if hours_left is None:
+            lines.append("预计耗尽: 近期无消耗")
+        else:
+            depletion_at = datetime.fromtimestamp(trend["last_ts"] + hours_left * 3600)
+            if hours_left < 48:
+                left = f"约 {hours_left:.1f} 小时后"
+            else:
+                left = f"约 {hours_left / 24:.1f} 天后"
+            lines.append(f"预计耗尽: {left}（{depletion_at.strftime('%Y-%m-%d %H:%M')}）")
+        return "\n".join(lines)
 
     # 查询IP命令
     @filter.command("查询IP")
+    @admission_controlled(0.5, per_argument=0.25)
     async def query_ip_info(self, event: AstrMessageEvent):
-        """查询指定IP地址或域名的归属地和运营商"""
-        target = self._get_command_argument(event)
-        if not target:
-            yield event.plain_result("请输入IP地址或域名，格式为：查询IP <IP地址/域名（不用加https:/）>")
+        """查询IP地址或域名的归属地和运营商（支持多个目标）"""
+        detailed, _, targets = self._get_network_targets(event)
+        if not targets:
+            yield event.plain_result("请输入IP地址或域名，格式为：查询IP <IP地址/域名（不用加https:/）> [更多目标...] [详细]\n支持用空格、换行符或逗号分隔多个目标")
+            return
+        if len(targets) > self.max_targets:
+            yield event.plain_result(f"一次最多查询{self.max_targets}个目标，当前为{len(targets)}个")
             return
 
         try:
-            # 检查输入是否为IP地址
-            is_ip, ip_type = is_ip_address(target)
-            
-            result_parts = []
-            
-            if is_ip:
-                # 直接查询IP地址
-                result_parts.append(f"🔍 查询目标: {target} ({ip_type}地址)")
-                ip_info = await self._query_single_ip(target)
-                result_parts.append(ip_info)
-            else:
-                # 域名解析
-                result_parts.append(f"🔍 查询目标: {target} (域名)")
-                
-                # 获取域名的IP地址
-                ipv4_addresses, ipv6_addresses = get_domain_ips(target)
-                
-                if not ipv4_addresses and not ipv6_addresses:
-                    yield event.plain_result(f"无法解析域名 {target}，请检查域名是否有效。")
-                    return
-                
-                # 显示解析的IP地址
-                if ipv4_addresses:
-                    result_parts.append(f"IPv4地址: {', '.join(ipv4_addresses)}")
-                if ipv6_addresses:
-                    result_parts.append(f"IPv6地址: {', '.join(ipv6_addresses[:3])}{'...' if len(ipv6_addresses) > 3 else ''}")
-                
-                # 查询第一个IPv4地址的详细信息（ip-api.com主要支持IPv4）  
-                if ipv4_addresses:
-                    result_parts.append(f"详细信息 (基于IPv4: {ipv4_addresses[0]}):")
-                    ip_info = await self._query_single_ip(ipv4_addresses[0])
-                    result_parts.append(ip_info)
+            # 先并发解析全部目标，再一次性批量查询所有地址的地理信息
+            resolutions = await asyncio.gather(
+                *(self._with_network_slot(self._resolve_ip_target(target)) for target in targets)
+            )
+            lookup_ips = []
+            for ip_type, ipv4_addresses, ipv6_addresses in resolutions:
+                if ip_type:
+                    lookup_ips.extend(ipv4_addresses or ipv6_addresses)
                 else:
-                    result_parts.append(f"该域名仅有IPv6地址，当前API服务暂不支持IPv6地理信息查询")
+                    # 仅有IPv6地址的域名查询第一个IPv6地址
+                    lookup_ips.extend(ipv4_addresses or ipv6_addresses[:1])
+            geo_data, geo_error = await self._lookup_ip_geo(lookup_ips, detailed)
+
+            if len(targets) > 1 and not detailed:
+                yield event.plain_result(self._format_ip_table(targets, resolutions, geo_data, geo_error))
+                return
 
-            final_result = '\n'.join(result_parts)
-            yield event.plain_result(final_result)
+            sections = []
+            for target, (ip_type, ipv4_addresses, ipv6_addresses) in zip(targets, resolutions):
+                sections.append(self._format_ip_target(
+                    target, ip_type, ipv4_addresses, ipv6_addresses, geo_data, geo_error
+                ))
+            yield event.plain_result('\n\n'.join(sections))
 
         except Exception as e:
             yield event.plain_result(f"查询IP信息时发生错误: {str(e)}")
 
-    async def _query_single_ip(self, ip_address):
-        """查询单个IP地址的详细信息"""
-        try:
-            # 构建带中文语言参数和完整字段的URL
-            # 请求所有可用字段以获取最完整的信息
-            fields = "status,message,country,countryCode,region,regionName,city,zip,lat,lon,timezone,isp,org,as,asname,mobile,proxy,hosting,query"
-            url = f"{IP_API_URL}{ip_address}?lang=zh-CN&fields={fields}"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    data = await response.json()
-
-            # 检查API响应
-            if data['status'] == 'fail':
-                return f"无法查询IP地址 {ip_address} 的详细信息: {data.get('message', '未知错误')}"
-
-            # 提取信息，优先使用API返回的中文，必要时进行翻译
-            country = data.get('country', '未知')
-            country_code = data.get('countryCode', '未知')
-            region = data.get('regionName', '未知') 
-            region_code = data.get('region', '未知')
-            city = data.get('city', '未知')
-            zip_code = data.get('zip', '未知')
-            isp = data.get('isp', '未知')
-            org = data.get('org', '未知')
-            asn = data.get('as', '未知')
-            asn_name = data.get('asname', '未知')
-            lat = data.get('lat', '未知')
-            lon = data.get('lon', '未知')
-            timezone = data.get('timezone', '未知')
-            is_mobile = data.get('mobile', False)
-            is_proxy = data.get('proxy', False)
-            is_hosting = data.get('hosting', False)
-
-            # 如果API返回的还是英文，则使用翻译表进行翻译
-            country = translate_to_chinese(country) if country != '未知' else country
-            region = translate_to_chinese(region) if region != '未知' else region
-            city = translate_to_chinese(city) if city != '未知' else city
-            isp = translate_to_chinese(isp) if isp != '未知' else isp
-            org = translate_to_chinese(org) if org != '未知' else org
-
-            # 构建更详细的查询结果
-            result = f"🌍 地理位置:\n"
-            result += f"  国家: {country}"
-            if country_code != '未知':
-                result += f" ({country_code})"
-            result += f"\n  省/州: {region}"
-            if region_code != '未知':
-                result += f" ({region_code})"
-            result += f"\n  城市: {city}\n"
-            result += f"  邮政编码: {zip_code}\n"
-            result += f"  坐标: {lat}, {lon}\n"
-            result += f"  时区: {timezone}\n\n"
-            
-            result += f"🏢 网络信息:\n"
-            result += f"  ISP运营商: {isp}\n"
-            result += f"  组织机构: {org}\n"
-            if asn != '未知':
-                result += f"  ASN编号: {asn}\n"
-            if asn_name != '未知' and asn_name != asn:
-                result += f"  ASN名称: {asn_name}\n"
-            
-            # 特殊属性标识
-            special_attrs = []
-            if is_mobile:
-                special_attrs.append("📱 移动网络")
-            if is_proxy:
-                special_attrs.append("🔒 代理/VPN")
-            if is_hosting:
-                special_attrs.append("🖥️ 托管服务")
-            
-            if special_attrs:
-                result += f"\n🏷️ 特殊属性:\n"
-                for attr in special_attrs:
-                    result += f"  {attr}\n"
-            
-            return result.rstrip()
+    def _get_network_targets(self, event: AstrMessageEvent):
+        """拆分网络命令的参数，返回 (是否要求详细信息, 是否双栈测试, 去重后的目标列表)"""
+        arguments = self._get_argument_list(event)
+        detailed = any(arg in DETAIL_FLAGS for arg in arguments)
+        dual_stack = any(arg in DUAL_STACK_FLAGS for arg in arguments)
+        flags = DETAIL_FLAGS + DUAL_STACK_FLAGS
+        targets = list(dict.fromkeys(arg for arg in arguments if arg not in flags))
+        return detailed, dual_stack, targets
+
+    async def _with_network_slot(self, coro):
+        """在全插件共享的网络探测并发上限内执行"""
+        async with self._network_semaphore:
+            return await coro
+
+    def _format_ip_table(self, targets, resolutions, geo_data, geo_error):
+        """多目标查询的汇总表：每个目标一行，可解析的排在前面"""
+        from .net_tools import format_ip_brief
+
+        rows = []
+        for target, (ip_type, ipv4_addresses, ipv6_addresses) in zip(targets, resolutions):
+            addresses = ipv4_addresses or ipv6_addresses
+            if not addresses:
+                rows.append((1, f"❌ {target}: 无法解析"))
+                continue
+            brief = format_ip_brief(addresses[0], geo_data.get(addresses[0]))
+            more = f"（共{len(addresses)}个地址）" if len(addresses) > 1 else ""
+            label = f"{target} → {brief}" if not ip_type else brief
+            rows.append((0, f"✅ {label}{more}"))
+
+        resolved = sum(1 for rank, _ in rows if rank == 0)
+        lines = [f"🔍 IP查询汇总（{resolved}/{len(targets)}个目标可解析）:"]
+        # 稳定排序：可解析的保持输入顺序排在前面
+        lines.extend(f"{index}. {text}" for index, (_, text) in enumerate(sorted(rows, key=lambda row: row[0]), 1))
+        if geo_error:
+            lines.append(f"\n⚠️ {geo_error}")
+        lines.append("\n💡 追加参数“详细”查看每个目标的完整信息")
+        return "\n".join(lines)
+
+    async def _resolve_ip_target(self, target):
+        """解析查询目标，返回 (IP类型, IPv4地址列表, IPv6地址列表)，域名的IP类型为None"""
+        from .net_tools import get_domain_ips, is_ip_address
+
+        is_ip, ip_type = is_ip_address(target)
+        if is_ip:
+            if ip_type == "IPv4":
+                return ip_type, [target], []
+            return ip_type, [], [target]
+        ipv4_addresses, ipv6_addresses = await get_domain_ips(target, self._dns_cache)
+        return None, ipv4_addresses, ipv6_addresses
+
+    async def _lookup_ip_geo(self, ip_addresses, detailed=False):
+        """批量查询地理信息，返回 ({ip: 数据}, 错误信息)
+
+        配置了离线库时优先查本地，仅未命中或要求详细信息时才请求在线API。
+        """
+        geo_data = {}
+        remote_ips = ip_addresses
+        if self._geo_db.enabled and not detailed:
+            self._schedule_geo_db_download()
+            remote_ips = []
+            for ip_address in ip_addresses:
+                data = self._geo_db.lookup(ip_address)
+                if data:
+                    geo_data[ip_address] = data
+                else:
+                    remote_ips.append(ip_address)
+            METRICS.inc("ip_geo_lookups_total", len(geo_data), source="offline")
 
+        if not remote_ips:
+            return geo_data, None
+        started = time.perf_counter()
+        source = "error"
+        try:
+            geo_data.update(await self._ip_geo.lookup(self._get_session(), remote_ips, self._request_policy))
+            source = "online"
+            return geo_data, None
+        except (IPGeoRateLimited, CircuitOpenError) as e:
+            return geo_data, str(e)
+        except asyncio.TimeoutError:
+            return geo_data, "查询IP详细信息超时，请稍后再试"
         except aiohttp.ClientError as e:
-            return f"查询IP详细信息时发生网络错误: {str(e)}"
+            return geo_data, f"查询IP详细信息时发生网络错误: {str(e)}"
+        finally:
+            METRICS.observe("ip_geo_lookup_seconds", time.perf_counter() - started)
+            METRICS.inc("ip_geo_lookups_total", len(remote_ips), source=source)
+
+    def _schedule_geo_db_download(self):
+        """离线库需要更新时在后台下载，不阻塞当前查询"""
+        if self._geo_db_download_task is not None and not self._geo_db_download_task.done():
+            return
+        if not self._geo_db.needs_download():
+            return
+
+        async def _download():
+            try:
+                await self._geo_db.download(self._get_session())
+                logger.info(f"离线IP归属地库已更新: {self._geo_db.path}")
+            except Exception as e:
+                logger.warning(f"下载离线IP归属地库失败: {e}")
+
+        self._geo_db_download_task = asyncio.ensure_future(_download())
+
+    def _format_ip_target(self, target, ip_type, ipv4_addresses, ipv6_addresses, geo_data, geo_error):
+        """构建单个查询目标的结果文本"""
+        from .net_tools import format_ip_brief, format_ip_info
+
+        if ip_type:
+            ip_address = (ipv4_addresses or ipv6_addresses)[0]
+            return (
+                f"🔍 查询目标: {target} ({ip_type}地址)\n"
+                + format_ip_info(ip_address, geo_data.get(ip_address), geo_error)
+            )
+
+        if not ipv4_addresses and not ipv6_addresses:
+            return f"无法解析域名 {target}，请检查域名是否有效。"
+
+        result_parts = [f"🔍 查询目标: {target} (域名)"]
+        # 显示解析的IP地址
+        if ipv4_addresses:
+            result_parts.append(f"IPv4地址: {', '.join(ipv4_addresses)}")
+        if ipv6_addresses:
+            result_parts.append(f"IPv6地址: {', '.join(ipv6_addresses[:3])}{'...' if len(ipv6_addresses) > 3 else ''}")
+
+        # 第一个地址（优先IPv4）显示详细信息，其余IPv4地址显示归属摘要
+        if ipv4_addresses:
+            result_parts.append(f"详细信息 (基于IPv4: {ipv4_addresses[0]}):")
+            result_parts.append(format_ip_info(ipv4_addresses[0], geo_data.get(ipv4_addresses[0]), geo_error))
+            if len(ipv4_addresses) > 1:
+                result_parts.append("\n📍 其他地址归属:")
+                for ip_address in ipv4_addresses[1:]:
+                    result_parts.append(f"  {format_ip_brief(ip_address, geo_data.get(ip_address))}")
+        else:
+            result_parts.append(f"详细信息 (基于IPv6: {ipv6_addresses[0]}):")
+            result_parts.append(format_ip_info(ipv6_addresses[0], geo_data.get(ipv6_addresses[0]), geo_error))
+        return '\n'.join(result_parts)
 
     # Ping域名命令
     @filter.command("ping")
+    @admission_controlled(1.0, per_argument=0.5)
     async def ping_domain(self, event: AstrMessageEvent):
-        """Ping指定域名或IP地址"""
-        target = self._get_command_argument(event)
-        if not target:
-            yield event.plain_result("请输入要ping的域名或IP地址，格式为：ping <域名/IP地址>")
+        """Ping指定域名或IP地址（支持多个目标）"""
+        detailed, dual_stack, targets = self._get_network_targets(event)
+        dual_stack = dual_stack or self.dual_stack
+        if not targets:
+            yield event.plain_result("请输入要ping的域名或IP地址，格式为：ping <域名/IP地址> [更多目标...] [详细] [双栈]")
+            return
+        if len(targets) > self.max_targets:
+            yield event.plain_result(f"一次最多ping{self.max_targets}个目标，当前为{len(targets)}个")
             return
 
-        yield event.plain_result(f"正在ping {target}，请稍候...")
-        result = await ping_host(target, 4, self.ping_timeout, self.test_ports, self.tcp_timeout)
-        yield event.plain_result(result)
+        from .net_tools import PingReport, format_ping_table, iter_ping_host, probe_host
+
+        if len(targets) == 1:
+            yield event.plain_result(f"正在ping {targets[0]}，请稍候...")
+            # 单目标同样占用全插件共享的探测并发名额，直到产出最终结果
+            async with self._network_semaphore:
+                async for final, payload in iter_ping_host(
+                    targets[0], 4, self.ping_timeout, self.test_ports, self.tcp_timeout, self._dns_cache,
+                    self.use_icmp_socket, self.ping_max_timeouts, self.ping_progress_interval, dual_stack,
+                ):
+                    yield event.plain_result(payload.text if final else payload)
+            return
+
+        async def _probe(target):
+            # 单个目标出错只影响它自己的一行，不丢失其他目标的结果
+            try:
+                return await self._with_network_slot(probe_host(
+                    target, 4, self.ping_timeout, self.test_ports, self.tcp_timeout, self._dns_cache,
+                    self.use_icmp_socket, self.ping_max_timeouts, dual_stack,
+                ))
+            except Exception as e:
+                logger.warning(f"ping {target} 失败: {e}")
+                return PingReport.failed(target, e)
+
+        yield event.plain_result(f"正在并发ping {len(targets)}个目标，请稍候...")
+        reports = await asyncio.gather(*(_probe(target) for target in targets))
+        yield event.plain_result(format_ping_table(reports, detailed))
+
+    # TCPing命令
+    @filter.command("tcping")
+    @admission_controlled(1.0, per_argument=0.2)
+    async def tcping_host(self, event: AstrMessageEvent):
+        """对指定主机的TCP端口进行多次连接采样，统计延迟分布与失败原因"""
+        arguments = self._get_argument_list(event)
+        targets = [arg for arg in arguments if not arg.isdigit()]
+        ports = [int(arg) for arg in arguments if arg.isdigit() and 0 < int(arg) < 65536]
+        if len(targets) != 1:
+            yield event.plain_result("请输入一个域名或IP地址，格式为：tcping <域名/IP地址> [端口...]")
+            return
+
+        from .net_tools import DEFAULT_TEST_PORTS, format_tcping, tcping
+
+        ports = list(dict.fromkeys(ports or self.test_ports or DEFAULT_TEST_PORTS))
+        target = targets[0]
+        yield event.plain_result(f"正在对 {target} 的{len(ports)}个端口进行TCPing，请稍候...")
+        address, results = await self._with_network_slot(tcping(
+            target, ports, self.tcping_samples, self.tcping_interval, self.tcp_timeout, self._dns_cache
+        ))
+        yield event.plain_result(format_tcping(target, address, results, self.tcping_samples, self.tcping_interval))
+
+    async def _host_monitor_probe(self, target):
+        """主机监控的单次探测：复用 /ping 的ICMP与端口测试，返回 (延迟ms或None, 丢包率百分比)"""
+        from .net_tools import probe_host
+
+        # 单次探测不超过监控间隔，避免与下一轮重叠
+        ping_timeout = min(self.ping_timeout, self._host_monitor.interval * 0.8)
+        report = await self._with_network_slot(probe_host(
+            target.host, self.host_monitor_ping_count, ping_timeout, target.ports or self.test_ports,
+            self.tcp_timeout, self._dns_cache, self.use_icmp_socket, self.ping_max_timeouts,
+        ))
+        latency = report.latency
+        if report.stats is not None and report.stats.loss is not None:
+            loss = report.stats.loss
+        else:
+            loss = 0.0 if latency is not None else 100.0
+        return latency, loss
+
+    # 主机监控状态命令
+    @filter.command("主机监控")
+    @admission_controlled(0.2)
+    async def host_monitor_status(self, event: AstrMessageEvent):
+        """查看后台主机监控最近一段时间的可用率、丢包与延迟分位数"""
+        rows = self._host_monitor.status_rows()
+        if not rows:
+            lines = ["未启用主机监控或未配置监控主机。", "请在插件设置 host_monitor_config 中开启并添加：主机|端口|别名"]
+            lines.extend(self._host_monitor_config_errors)
+            yield event.plain_result("\n".join(lines))
+            return
+
+        lines = [
+            f"🖥️ 主机监控（共 {len(rows)} 个目标，每 {self._host_monitor.interval:g} 秒探测，"
+            f"统计最近 {self._host_monitor.window / 60:g} 分钟）"
+        ]
+        now = time.time()
+        for target, summary in rows:
+            name = f"{target.alias}（{target.host}）" if target.alias else target.host
+            if summary is None:
+                lines.append(f"⏳ {name}: 等待首次探测")
+                continue
+            if summary["last_latency"] is None:
+                flag, current = "❌", "不可达"
+            else:
+                flag = "✅" if summary["uptime"] >= 99 else "⚠️"
+                current = f"{summary['last_latency']:.1f}ms"
+            lines.append(f"{flag} {name}: 当前 {current}（{format_cache_age(max(0.0, now - summary['last_ts']))}前）")
+            stats = f"   可用率 {summary['uptime']:.1f}% | 丢包 {summary['loss']:.1f}%"
+            if summary["avg"] is not None:
+                stats += (
+                    f" | 平均 {summary['avg']:.1f}ms"
+                    f" | P50/P95/P99 {summary['p50']:.1f}/{summary['p95']:.1f}/{summary['p99']:.1f}ms"
+                )
+            lines.append(f"{stats} | {summary['samples']}个样本")
+        lines.extend(self._host_monitor_config_errors)
+        yield event.plain_result("\n".join(lines))
+
+    # 插件状态命令（仅管理员）
+    @filter.command("插件状态")
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @admission_controlled(0.2)
+    async def plugin_status(self, event: AstrMessageEvent):
+        """查看插件运行指标：各平台查询延迟与错误、上游请求、缓存命中、ping统计"""
+        lines = [f"📊 插件状态（已运行 {format_cache_age(max(0.0, time.time() - METRICS.started_at))}）"]
+        if not METRICS.enabled:
+            lines.append("未开启运行指标统计，请在插件设置 metrics_config 中开启。")
+        else:
+            lines.extend(self._format_metrics())
+        policies = [self._request_policy] + [instance.policy for instance in self._newapi_instances]
+        open_breakers = [host for policy in policies for host in policy.open_hosts()]
+        lines.append(f"\n🔌 熔断中的上游: {', '.join(open_breakers) if open_breakers else '无'}")
+        if METRICS.enabled and self._metrics_exporter.path:
+            lines.append(f"📝 Prometheus 指标文件: {self._metrics_exporter.path}（每 {self._metrics_exporter.interval:g} 秒写入）")
+        yield event.plain_result("\n".join(lines))
+
+    def _format_metrics(self):
+        """把运行指标整理为状态文本行"""
+        def latency(histogram):
+            p50, p95 = histogram.quantile(0.50), histogram.quantile(0.95)
+            return f"P50 {p50 * 1000:.0f}ms · P95 {p95 * 1000:.0f}ms" if histogram.count else "无耗时数据"
+
+        lines = ["\n💰 余额查询:"]
+        providers = METRICS.label_values("provider_queries_total", "provider")
+        for provider in providers:
+            total = METRICS.counter_sum("provider_queries_total", provider=provider)
+            ok = METRICS.counter_sum("provider_queries_total", provider=provider, status=STATUS_OK)
+            invalid = METRICS.counter_sum("provider_queries_total", provider=provider, status=STATUS_INVALID)
+            lines.append(
+                f"  {PROVIDER_NAMES.get(provider, provider)}: {total}次 | 成功 {ok} · 无效 {invalid} · "
+                f"失败 {total - ok - invalid} | {latency(METRICS.histogram('provider_query_seconds', provider=provider))}"
+            )
+        lookups = METRICS.counter_sum("balance_lookups_total")
+        if lookups:
+            hits = lookups - METRICS.counter_sum("balance_lookups_total", source="upstream")
+            lines.append(
+                f"  数据来源: 监控快照 {METRICS.counter_sum('balance_lookups_total', source='snapshot')} · "
+                f"缓存 {METRICS.counter_sum('balance_lookups_total', source='cache')} · "
+                f"上游 {lookups - hits}（命中率 {hits * 100 / lookups:.0f}%）"
+            )
+        if not providers and not lookups:
+            lines.append("  暂无数据")
+
+        hosts = METRICS.label_values("upstream_requests_total", "host")
+        if hosts:
+            lines.append("\n🌐 上游请求:")
+        for host in hosts:
+            total = METRICS.counter_sum("upstream_requests_total", host=host)
+            failures = [
+                f"{label} {count}" for label, count in (
+                    ("超时", METRICS.counter_sum("upstream_requests_total", host=host, outcome="timeout")),
+                    ("连接失败", METRICS.counter_sum("upstream_requests_total", host=host, outcome="connection_error")),
+                    ("4xx", METRICS.counter_sum("upstream_requests_total", host=host, outcome="4xx")),
+                    ("5xx", METRICS.counter_sum("upstream_requests_total", host=host, outcome="5xx")),
+                    ("熔断拒绝", METRICS.counter_sum("upstream_requests_total", host=host, outcome="circuit_open")),
+                ) if count
+            ]
+            lines.append(
+                f"  {host}: {total}次 | 重试 {METRICS.counter_sum('upstream_retries_total', host=host)} | "
+                f"{' · '.join(failures) or '无错误'} | {latency(METRICS.histogram('upstream_request_seconds', host=host))}"
+            )
+
+        geo_total = METRICS.counter_sum("ip_geo_lookups_total")
+        if geo_total:
+            lines.append(
+                f"\n📍 IP归属地: 离线库 {METRICS.counter_sum('ip_geo_lookups_total', source='offline')} · "
+                f"在线 {METRICS.counter_sum('ip_geo_lookups_total', source='online')} · "
+                f"失败 {METRICS.counter_sum('ip_geo_lookups_total', source='error')} | "
+                f"{latency(METRICS.histogram('ip_geo_lookup_seconds'))}"
+            )
+
+        ping_total = METRICS.counter_sum("pings_total")
+        if ping_total:
+            methods = " · ".join(
+                f"{method} {METRICS.counter_sum('pings_total', method=method)}"
+                for method in METRICS.label_values("pings_total", "method")
+            )
+            lines.append(
+                f"\n📶 Ping: {ping_total}次（{methods}）| 可达 {METRICS.counter_sum('pings_total', result='ok')} · "
+                f"仅TCP {METRICS.counter_sum('pings_total', result='tcp_only')} · "
+                f"不可达 {METRICS.counter_sum('pings_total', result='unreachable')} | "
+                f"{latency(METRICS.histogram('ping_seconds'))}"
+            )
+
+        rejected = METRICS.counter_sum("admission_rejected_total")
+        merged = METRICS.counter_sum("admission_merged_total")
+        if rejected or merged:
+            lines.append(f"\n🚦 命令限流: 拒绝 {rejected} · 合并重复请求 {merged}")
+        return lines
 
     # 查询帮助命令
     @filter.command("查询帮助")
+    @admission_controlled(0.2)
     async def query_help(self, event: AstrMessageEvent):
         """显示帮助信息"""
+        from .net_tools import DEFAULT_TEST_PORTS
+
         help_text = (
             "✨ AstrBot 余额查询与网络工具插件 ✨\n\n"
             "💰 余额查询命令（支持批量查询）：\n"
             "/硅基余额 <API密钥>: 查询硅基流动平台余额\n"
             "/DS余额 <API密钥>: 查询DeepSeek平台余额\n"
             "/GPT余额 <API密钥>: 查询OpenAI平台余额\n"
-            "/NEW余额 <API密钥>: 查询NEW API令牌用量（需配置 newapi_base_url）\n\n"
+            "/NEW余额 [实例] <API密钥>: 查询NEW API令牌用量（需配置 NEW API 实例，多实例时默认取最快结果，加“对比”逐实例对比）\n"
+            "/余额 <API密钥>: 自动识别平台，可混合多个平台的密钥批量查询\n"
+            "/余额监控: 查看后台余额监控快照（需在配置中开启）\n"
+            "/余额趋势 <API密钥> [平台]: 查看消耗速率与预计耗尽时间\n\n"
             "🚀 批量查询支持：\n"
             "• 多个密钥用空格分隔：/硅基余额 key1 key2 key3\n"
             "• 多个密钥用换行分隔：\n"
             "  /硅基余额 key1\n"
             "  key2\n"
             "  key3\n"
-            "• 多个密钥用逗号分隔：/硅基余额 key1,key2,key3\n\n"
+            "• 多个密钥用逗号分隔：/硅基余额 key1,key2,key3\n"
+            f"• 追加“汇总”输出按余额排序的一行一密钥汇总表（{self.summary_min_keys}个及以上密钥默认汇总），“详细”输出完整信息\n"
+            "• 追加“<5”或“低于5”只列出余额低于5的密钥：/硅基余额 key1 key2 <5\n\n"
             "🌐 网络工具命令：\n"
-            "/查询IP <IP地址/域名>: 查询IP归属地和运营商信息\n"
-            "/ping <域名/IP地址>: 测试网络连通性和延迟\n"
+            "/查询IP <IP地址/域名> [更多目标...] [详细]: 查询IP归属地和运营商信息（支持多个目标）\n"
+            "/ping <域名/IP地址> [更多目标...] [详细] [双栈]: 测试网络连通性和延迟（多个目标并发测试并汇总，双栈分别测试IPv4/IPv6）\n"
+            "/tcping <域名/IP地址> [端口...]: 多次TCP连接采样，统计延迟分布与失败原因\n"
+            "/主机监控: 查看后台主机监控的可用率、丢包与延迟分位数（需在配置中开启）\n"
+            "/插件状态: 查看查询延迟、错误、缓存命中等运行指标（仅管理员）\n"
             "/查询帮助: 显示此帮助信息\n\n"
             f"⚙️ 当前配置：\n"
-            f"• 测试端口: {', '.join(map(str, self.test_ports))}\n"
+            f"• 测试端口: {', '.join(map(str, self.test_ports or DEFAULT_TEST_PORTS))}\n"
             f"• Ping超时: {self.ping_timeout}秒\n"
             f"• TCP超时: {self.tcp_timeout}秒\n"
             f"• 显示调试信息: {'是' if self.show_debug_info else '否'}\n"
@@ -0,0 +1,225 @@
+"""插件运行指标：延迟直方图与计数器，可导出为 Prometheus 文本格式
+
+全插件共用模块级的 METRICS（与 DEFAULT_DNS_CACHE 相同的用法）；未启用时
+inc/observe 只做一次属性判断即返回，几乎没有额外开销。耗时统一用 time.perf_counter 计量。
+"""
+import asyncio
+import bisect
+import functools
+import os
+import time
+
+from astrbot.api import logger
+
+from .background import BackgroundLoop
+from .balance_cache import result_status
+
+METRIC_PREFIX = "astrbot_balance_"
+# 延迟直方图分桶上界（秒），最后隐含 +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_HELP = {
+    "provider_query_seconds": "余额平台单个密钥查询耗时（含重试）",
+    "provider_queries_total": "余额平台查询次数，按结果状态",
+    "upstream_request_seconds": "上游HTTP单次请求耗时",
+    "upstream_requests_total": "上游HTTP请求次数，按结果",
+    "upstream_retries_total": "上游HTTP重试次数",
+    "balance_lookups_total": "余额查询的数据来源次数（监控快照/缓存/上游）",
+    "ip_geo_lookup_seconds": "IP归属地批量查询耗时",
+    "ip_geo_lookups_total": "IP归属地查询的地址数，按数据来源",
+    "ping_seconds": "主机连通性测试耗时",
+    "pings_total": "主机连通性测试次数，按测试方式与结果",
+    "admission_rejected_total": "因限流被拒绝的命令次数",
+    "admission_merged_total": "因重复请求被合并的命令次数",
+}
+
+
+class Histogram:
+    """固定分桶的延迟直方图"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """按分桶线性插值估算分位数（秒），与 Prometheus 的 histogram_quantile 一致；无样本返回 None"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                return lower + (LATENCY_BUCKETS[index] - lower) * (rank - seen) / count
+            seen += count
+        return LATENCY_BUCKETS[-1]
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _matches(key, match):
+    labels = dict(key)
+    return all(labels.get(name) == value for name, value in match.items())
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class Metrics:
+    """计数器与直方图注册表，指标按 (名称, 标签) 区分"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._counters = {}  # 名称 -> {标签: 数值}
+        self._histograms = {}  # 名称 -> {标签: Histogram}
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        series = self._histograms.setdefault(name, {})
+        key = _label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(seconds)
+
+    def reset(self):
+        self.started_at = time.time()
+        self._counters.clear()
+        self._histograms.clear()
+
+    def label_values(self, name, label):
+        """指标中出现过的某个标签的全部取值（按首次出现顺序）"""
+        series = self._counters.get(name) or self._histograms.get(name) or {}
+        values = (dict(key).get(label) for key in series)
+        return list(dict.fromkeys(value for value in values if value is not None))
+
+    def counter_sum(self, name, **match):
+        """标签匹配 match 的计数器之和"""
+        return sum(value for key, value in self._counters.get(name, {}).items() if _matches(key, match))
+
+    def histogram(self, name, **match):
+        """标签匹配 match 的直方图合并结果"""
+        merged = Histogram()
+        for key, histogram in self._histograms.get(name, {}).items():
+            if _matches(key, match):
+                merged.merge(histogram)
+        return merged
+
+    def render_prometheus(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            metric = METRIC_PREFIX + name
+            lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            for key, value in series.items():
+                lines.append(f"{metric}{_format_labels(key)} {value}")
+        for name, series in sorted(self._histograms.items()):
+            metric = METRIC_PREFIX + name
+            lines.append(f"# HELP {metric} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        lines.append(f"# TYPE {METRIC_PREFIX}start_time_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}start_time_seconds {self.started_at:.0f}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def instrument_provider(provider):
+    """余额平台查询函数的装饰器：记录耗时与结果状态"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return await func(*args, **kwargs)
+            started = time.perf_counter()
+            status = "exception"
+            try:
+                result = await func(*args, **kwargs)
+                status = result_status(result)
+                return result
+            finally:
+                METRICS.observe("provider_query_seconds", time.perf_counter() - started, provider=provider)
+                METRICS.inc("provider_queries_total", provider=provider, status=status)
+
+        return wrapper
+
+    return decorator
+
+
+class PrometheusExporter(BackgroundLoop):
+    """按固定间隔把 METRICS 以 Prometheus 文本格式写入文件（先写临时文件再原子替换），
+    供 node_exporter 的 textfile collector 等采集"""
+
+    def __init__(self, metrics, path, interval=60.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = max(5.0, float(interval))
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _write_file(self, text):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    async def write(self):
+        # 在事件循环中渲染（指标只在事件循环中修改），文件IO放到线程中
+        await asyncio.to_thread(self._write_file, self.metrics.render_prometheus())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.write()
+            except Exception as e:
+                logger.warning(f"写入 Prometheus 指标文件失败: {e}")
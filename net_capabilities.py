@@ -0,0 +1,128 @@
+"""运行环境的网络能力探测：系统ping命令路径、免权限ICMP支持、控制台编码
+
+插件加载时在后台探测一次，结果缓存在模块中，之后所有的 /ping 直接使用，
+不再逐个尝试ping路径和输出编码。
+"""
+import asyncio
+import codecs
+import locale
+import os
+import platform
+import shutil
+import socket
+
+from astrbot.api import logger
+
+from .icmp_ping import icmp_supported
+
+WINDOWS_PING_CANDIDATES = ["ping", "C:\\Windows\\System32\\ping.exe", "ping.exe"]
+POSIX_PING_CANDIDATES = ["ping", "/bin/ping", "/usr/bin/ping", "/sbin/ping"]
+
+
+class NetCapabilities:
+    """探测结果；probed 为 False 表示探测失败，调用方应按未知处理"""
+
+    __slots__ = ("probed", "ping_path", "ping_count_flag", "icmp_v4", "icmp_v6", "icmp_raw", "console_encoding")
+
+    def __init__(self, probed=False, ping_path=None, ping_count_flag="-c", icmp_v4=False, icmp_v6=False,
+                 icmp_raw=False, console_encoding=None):
+        self.probed = probed
+        self.ping_path = ping_path
+        self.ping_count_flag = ping_count_flag
+        self.icmp_v4 = icmp_v4
+        self.icmp_v6 = icmp_v6
+        self.icmp_raw = icmp_raw
+        self.console_encoding = console_encoding
+
+    @property
+    def icmp_available(self):
+        return self.icmp_v4 or self.icmp_v6
+
+    def describe(self):
+        if not self.probed:
+            return "未知"
+        if self.icmp_available:
+            icmp = "原始套接字" if self.icmp_raw else "免权限套接字"
+        else:
+            icmp = "不可用"
+        return f"ping命令: {self.ping_path or '未找到'}，内置ICMP: {icmp}，控制台编码: {self.console_encoding}"
+
+
+def _find_ping():
+    """返回第一个可执行的ping命令路径，找不到返回 None"""
+    windows = platform.system().lower() == "windows"
+    for candidate in WINDOWS_PING_CANDIDATES if windows else POSIX_PING_CANDIDATES:
+        if os.path.isabs(candidate):
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                return candidate
+        else:
+            path = shutil.which(candidate)
+            if path:
+                return path
+    return None
+
+
+def _console_encoding():
+    """子进程控制台输出使用的编码（Windows 为OEM代码页，中文系统即 cp936/GBK）"""
+    encoding = None
+    if platform.system().lower() == "windows":
+        try:
+            import ctypes
+
+            kernel32 = ctypes.windll.kernel32
+            code_page = kernel32.GetConsoleOutputCP() or kernel32.GetOEMCP()
+            encoding = f"cp{code_page}"
+        except Exception:
+            encoding = None
+    encoding = encoding or locale.getpreferredencoding(False) or "utf-8"
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return "utf-8"
+
+
+def probe_capabilities():
+    """同步探测当前环境（会创建并立即关闭ICMP套接字）"""
+    icmp_v4, raw_v4 = icmp_supported(socket.AF_INET)
+    icmp_v6, raw_v6 = icmp_supported(socket.AF_INET6)
+    windows = platform.system().lower() == "windows"
+    return NetCapabilities(
+        probed=True,
+        ping_path=_find_ping(),
+        ping_count_flag="-n" if windows else "-c",
+        icmp_v4=icmp_v4,
+        icmp_v6=icmp_v6,
+        icmp_raw=raw_v4 if icmp_v4 else raw_v6,
+        console_encoding=_console_encoding(),
+    )
+
+
+_capabilities = None
+_probe_task = None
+
+
+async def _probe():
+    global _capabilities
+    try:
+        capabilities = await asyncio.to_thread(probe_capabilities)
+        logger.info(f"网络能力探测完成: {capabilities.describe()}")
+    except Exception as e:
+        logger.warning(f"网络能力探测失败，将逐个尝试ping方式: {e}")
+        capabilities = NetCapabilities()
+    _capabilities = capabilities
+    return capabilities
+
+
+def start_capability_probe():
+    """在后台启动一次性探测，已启动或已完成时不重复"""
+    global _probe_task
+    if _capabilities is None and _probe_task is None:
+        _probe_task = asyncio.ensure_future(_probe())
+    return _probe_task
+
+
+async def get_capabilities():
+    """返回探测结果，探测尚未完成时等待其完成"""
+    if _capabilities is not None:
+        return _capabilities
+    return await asyncio.shield(start_capability_probe())
@@ -0,0 +1,899 @@
+"""网络工具：ping、TCP端口测试、IP归属信息格式化
+
+只在使用网络命令时由插件按需导入，仅使用余额命令时不加载。
+"""
+import asyncio
+import errno
+import itertools
+import platform
+import socket
+import time
+from collections import deque
+
+from .dns_cache import DEFAULT_DNS_CACHE
+from .icmp_ping import ICMPUnavailable, icmp_ping, iter_icmp_echo
+from .metrics import METRICS
+from .net_capabilities import get_capabilities
+from .ping_parser import LineDecoder, PingOutputParser, PingStats, decode_output, format_ping_stats
+
+# 默认测试端口
+DEFAULT_TEST_PORTS = [22, 23, 80, 443, 5000, 6099, 6185]
+
+# 流式ping参数
+PING_INTERVAL = 1.0  # 系统ping与内置ICMP的发包间隔（秒）
+DEFAULT_PING_MAX_TIMEOUTS = 3  # 连续多少个包无响应时提前结束
+PING_STABLE_SAMPLES = 3  # 最近几个包的延迟极差不超过均值的10%（或1ms）时视为稳定，提前结束
+PING_STABLE_TOLERANCE = 0.1
+
+# TCP连接失败原因
+REASON_TIMEOUT = "超时"
+REASON_REFUSED = "拒绝"
+REASON_UNREACHABLE = "不可达"
+REASON_FAILED = "失败"
+_UNREACHABLE_ERRNOS = {errno.ENETUNREACH, errno.EHOSTUNREACH, errno.EADDRNOTAVAIL}
+
+# 双栈测试参数
+HAPPY_EYEBALLS_DELAY = 0.25  # RFC 8305 建议的连接尝试间隔（秒）
+MAX_ADDRESSES_PER_FAMILY = 4  # 每个地址族最多测试的地址数
+FAMILY_ICMP_COUNT = 3  # 每个地址族的ICMP测试包数
+FAMILY_ICMP_INTERVAL = 0.2
+
+
+class PingEarlyStop:
+    """判断流式ping能否提前结束：连续超时达到上限，或最近几个包的延迟已经稳定"""
+
+    def __init__(self, max_timeouts=DEFAULT_PING_MAX_TIMEOUTS, stable_samples=PING_STABLE_SAMPLES,
+                 stable_tolerance=PING_STABLE_TOLERANCE):
+        self.max_timeouts = max_timeouts
+        self.stable_tolerance = stable_tolerance
+        self.consecutive_timeouts = 0
+        self._recent = deque(maxlen=max(2, stable_samples))
+
+    def add(self, rtt):
+        """记录一个回显结果（超时为 None），可以结束时返回原因，否则返回 None"""
+        if rtt is None:
+            self.consecutive_timeouts += 1
+            self._recent.clear()
+            if self.max_timeouts and self.consecutive_timeouts >= self.max_timeouts:
+                return f"连续{self.consecutive_timeouts}个包无响应"
+            return None
+
+        self.consecutive_timeouts = 0
+        self._recent.append(rtt)
+        if len(self._recent) == self._recent.maxlen:
+            mean = sum(self._recent) / len(self._recent)
+            if max(self._recent) - min(self._recent) <= max(1.0, mean * self.stable_tolerance):
+                return f"最近{len(self._recent)}个包延迟稳定"
+        return None
+
+class _PingRun:
+    """一次流式ping的状态：逐个记录回显结果，节流输出进度，判断提前结束"""
+
+    def __init__(self, host, count, ping_timeout, max_timeouts, progress_interval):
+        self.host = host
+        self.count = count
+        self.ping_timeout = ping_timeout
+        self.progress_interval = progress_interval
+        self.rtts = []
+        self.stop_reason = None
+        self.timed_out = False
+        self._stopper = PingEarlyStop(max_timeouts)
+
+    @property
+    def delays(self):
+        return [rtt for rtt in self.rtts if rtt is not None]
+
+    def _progress_text(self, rtt):
+        text = f"⏳ Ping {self.host}: 已发送{len(self.rtts)}个，收到{len(self.delays)}个"
+        if rtt is None:
+            return text + "，最近一个包无响应"
+        return text + f"，最近延迟 {rtt:.2f}ms"
+
+    async def follow(self, replies):
+        """跟随回显流 replies（产出 (序号, 延迟ms或None)），按节流间隔产出进度文本"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.ping_timeout
+        last_progress = started
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.timed_out = True
+                    return
+                try:
+                    _, rtt = await asyncio.wait_for(replies.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self.timed_out = True
+                    return
+
+                self.rtts.append(rtt)
+                reason = self._stopper.add(rtt)
+                if reason and len(self.rtts) < self.count:
+                    self.stop_reason = reason
+                    return
+                now = loop.time()
+                if self.progress_interval and len(self.rtts) < self.count and now - last_progress >= self.progress_interval:
+                    last_progress = now
+                    yield self._progress_text(rtt)
+        finally:
+            await replies.aclose()
+
+    def stats(self):
+        return PingStats.from_delays(self.delays, sent=len(self.rtts))
+
+    def stats_text(self):
+        """按已收到的回显结果生成统计文本"""
+        result = format_ping_stats(self.host, self.stats())
+        if self.stop_reason:
+            result += f"\n⏱️ 已提前结束: {self.stop_reason}"
+        return result
+
+async def _icmp_replies(host, count, echo_timeout, resolver):
+    """进程内ICMP回显流，产出 (序号, 延迟ms或None)
+
+    无法解析或无法创建ICMP套接字时在产出第一个结果前抛出 ICMPUnavailable。
+    """
+    if is_ip_address(host)[0]:
+        address = host
+    else:
+        try:
+            ipv4, ipv6 = await resolver.resolve_all(host)
+        except Exception as e:
+            raise ICMPUnavailable(str(e))
+        addresses = ipv4 or ipv6
+        if not addresses:
+            raise ICMPUnavailable(f"无法解析 {host}")
+        address = addresses[0]
+
+    try:
+        async for reply in iter_icmp_echo(address, count, echo_timeout, PING_INTERVAL):
+            yield reply
+    except OSError as e:
+        raise ICMPUnavailable(str(e))
+
+async def _system_ping_replies(process, parser, silence_limit, encoding=None):
+    """逐行读取系统ping命令的输出并增量解析，产出 (序号, 延迟ms或None)
+
+    Linux 的 ping 对丢失的包不输出任何内容，超过 silence_limit 秒没有新输出时按一次超时计。
+    """
+    decoder = LineDecoder(encoding)
+    seq = 0
+    while True:
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), timeout=silence_limit)
+        except asyncio.TimeoutError:
+            seq += 1
+            yield seq, None
+            continue
+        if not line:
+            return
+        reply = parser.feed(decoder.decode(line))
+        if reply is not None:
+            seq += 1
+            yield seq, reply[1]
+
+def _ping_commands(host, count, capabilities):
+    """返回要尝试的ping命令：已探测到路径时只用该路径，探测确认没有ping时返回空列表"""
+    if capabilities.probed:
+        if not capabilities.ping_path:
+            return []
+        return [[capabilities.ping_path, capabilities.ping_count_flag, str(count), host]]
+    if platform.system().lower() == "windows":
+        return [
+            ["ping", "-n", str(count), host],
+            ["C:\\Windows\\System32\\ping.exe", "-n", str(count), host],
+            ["ping.exe", "-n", str(count), host]
+        ]
+    return [
+        ["ping", "-c", str(count), host],
+        ["/bin/ping", "-c", str(count), host],
+        ["/usr/bin/ping", "-c", str(count), host],
+        ["/sbin/ping", "-c", str(count), host]
+    ]
+
+class PingReport:
+    """一次主机测试的结构化结果
+
+    method 为 "icmp"（内置ICMP）、"ping"（系统ping命令）、"tcp"（仅TCP端口测试）或 "error"（测试出错）；
+    stats 为ping统计（仅TCP测试时为 None），probes 为端口测试结果，
+    families 为双栈测试的分地址族结果（未启用时为空），text 为完整结果文本。
+    """
+
+    __slots__ = ("host", "method", "stats", "probes", "families", "text")
+
+    def __init__(self, host, method, stats, probes, text, families=None):
+        self.host = host
+        self.method = method
+        self.stats = stats
+        self.probes = probes or []
+        self.families = families or []
+        self.text = text
+
+    @classmethod
+    def failed(cls, host, error):
+        """测试过程抛出异常时的结果，多目标汇总中显示为出错行"""
+        return cls(host, "error", None, [], f"Ping测试失败 - {host}: {error}")
+
+    @property
+    def open_ports(self):
+        return [response_time for _, response_time, _, _ in self.probes if response_time is not None]
+
+    @property
+    def ping_ok(self):
+        return self.stats is not None and bool(self.stats.received)
+
+    @property
+    def rank(self):
+        """可达性排序：ping可达 0，仅TCP可达 1，不可达 2，测试出错 3"""
+        if self.ping_ok:
+            return 0
+        if self.method == "error":
+            return 3
+        return 1 if self.open_ports else 2
+
+    @property
+    def latency(self):
+        """排序用延迟：ping平均延迟，否则TCP平均连接时间，不可达为 None"""
+        if self.ping_ok:
+            return self.stats.avg
+        open_ports = self.open_ports
+        return sum(open_ports) / len(open_ports) if open_ports else None
+
+def _record_ping(report, started):
+    """记录一次主机测试的耗时与结果"""
+    METRICS.observe("ping_seconds", time.perf_counter() - started, method=report.method)
+    METRICS.inc("pings_total", method=report.method, result=("ok", "tcp_only", "unreachable")[report.rank])
+    return report
+
+async def iter_ping_host(host, count=4, ping_timeout=30.0, test_ports=None, tcp_timeout=3.0, resolver=None,
+                         use_icmp=True, max_timeouts=DEFAULT_PING_MAX_TIMEOUTS, progress_interval=3.0,
+                         dual_stack=False):
+    """流式测试主机连通性和延迟，进度产出 (False, 文本)，最后产出 (True, PingReport)
+
+    优先使用进程内ICMP引擎，无权限时回退到系统ping命令（逐行读取输出），再回退到TCP连通性测试。
+    每个回显结果到达即增量统计，最多每 progress_interval 秒产出一次进度（0 表示不产出）；
+    连续 max_timeouts 个包无响应或延迟已经稳定时提前结束。
+    ICMP ping 与 TCP 端口测试同时进行，总耗时约为两者中较慢的一方。
+    dual_stack 为 True 时端口测试按 RFC 8305 在 IPv4/IPv6 地址间竞速，
+    并额外对两个地址族的全部地址并发测试，分别给出各自的延迟。
+    """
+    if test_ports is None:
+        test_ports = DEFAULT_TEST_PORTS
+    resolver = resolver or DEFAULT_DNS_CACHE
+    started = time.perf_counter()
+    # 端口测试（以及双栈测试）与ping并行启动
+    probe_task = asyncio.ensure_future(probe_ports(host, test_ports, tcp_timeout, resolver, dual_stack))
+    family_task = None
+    if dual_stack:
+        family_task = asyncio.ensure_future(
+            probe_families(host, test_ports, tcp_timeout, resolver, use_icmp)
+        )
+
+    async def family_section():
+        if family_task is None:
+            return [], ""
+        families = await family_task
+        return families, format_family_section(families)
+
+    async def finish(method, stats, ping_result):
+        probes = await probe_task
+        port_result = await port_connectivity_test(host, test_ports, tcp_timeout, probes, show_family=dual_stack)
+        families, section = await family_section()
+        return _record_ping(PingReport(host, method, stats, probes, ping_result + port_result + section, families), started)
+
+    async def fallback(error=None):
+        probes = await probe_task
+        text = await fallback_connectivity_test(host, test_ports, tcp_timeout, probes, resolver, error)
+        families, section = await family_section()
+        return _record_ping(PingReport(host, "tcp", None, probes, text + section, families), started)
+
+    def timeout_text(run):
+        if not run.rtts:
+            return f"Ping超时: {host} ({ping_timeout}秒无响应)\n"
+        run.stop_reason = f"达到{ping_timeout}秒超时上限"
+        return run.stats_text()
+
+    try:
+        capabilities = await get_capabilities()
+        if use_icmp and (capabilities.icmp_available or not capabilities.probed):
+            run = _PingRun(host, count, ping_timeout, max_timeouts, progress_interval)
+            # 每个回显请求的等待时间不超过1秒发包间隔的两倍，且总耗时不超过ping超时
+            echo_timeout = max(0.2, min(2.0, ping_timeout / max(1, count)))
+            try:
+                async for progress in run.follow(_icmp_replies(host, count, echo_timeout, resolver)):
+                    yield False, progress
+            except ICMPUnavailable:
+                pass
+            else:
+                text = timeout_text(run) if run.timed_out else run.stats_text()
+                yield True, await finish("icmp", run.stats(), text)
+                return
+
+        # Windows 的 ping 默认每个包等待4秒后才输出超时行
+        silence_limit = 5.0 if platform.system().lower() == "windows" else PING_INTERVAL * 2
+        last_error = None
+        for cmd in _ping_commands(host, count, capabilities):
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except FileNotFoundError:
+                continue  # 尝试下一个ping命令路径
+            except Exception as e:
+                last_error = f"Ping命令执行失败: {e}"
+                continue
+
+            run = _PingRun(host, count, ping_timeout, max_timeouts, progress_interval)
+            parser = PingOutputParser()
+            try:
+                async for progress in run.follow(_system_ping_replies(process, parser, silence_limit, capabilities.console_encoding)):
+                    yield False, progress
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+
+            if run.timed_out:
+                yield True, await finish("ping", run.stats(), timeout_text(run))
+                return
+            if run.stop_reason or (run.rtts and not parser.delays):
+                yield True, await finish("ping", run.stats(), run.stats_text())
+                return
+            if process.returncode == 0 or parser.delays:
+                stats = parser.stats()
+                yield True, await finish("ping", stats, format_ping_stats(host, stats, parser.raw_head))
+                return
+            error = decode_output(await process.stderr.read(), capabilities.console_encoding).strip()
+            last_error = f"Ping命令执行失败: {error or f'退出码 {process.returncode}'}"
+
+        # 如果所有ping命令都失败，使用Python实现的简单连通性测试，并附上最后一次失败的原因
+        yield True, await fallback(last_error)
+
+    except Exception:
+        yield True, await fallback()
+    finally:
+        for task in (probe_task, family_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+async def probe_host(host, count=4, ping_timeout=30.0, test_ports=None, tcp_timeout=3.0, resolver=None,
+                     use_icmp=True, max_timeouts=DEFAULT_PING_MAX_TIMEOUTS, dual_stack=False):
+    """测试主机连通性和延迟，不产出进度，直接返回 PingReport"""
+    report = None
+    async for final, payload in iter_ping_host(
+        host, count, ping_timeout, test_ports, tcp_timeout, resolver, use_icmp, max_timeouts,
+        progress_interval=0, dual_stack=dual_stack,
+    ):
+        if final:
+            report = payload
+    return report
+
+def format_ping_table(reports, detailed=False):
+    """多目标ping的汇总表：按可达性和延迟排序，detailed 时附上每个目标的完整结果"""
+    ordered = sorted(reports, key=lambda report: (report.rank, report.latency or 0.0))
+    reachable = sum(1 for report in reports if report.rank < 2)
+    lines = [f"📊 Ping汇总（{reachable}/{len(reports)}个目标可达，按延迟排序）:"]
+    for index, report in enumerate(ordered, 1):
+        ports = f"端口{len(report.open_ports)}/{len(report.probes)}"
+        if report.ping_ok:
+            stats = report.stats
+            lines.append(
+                f"{index}. ✅ {report.host}  {stats.avg:.1f}ms  丢包{stats.loss:.4g}%  {ports}"
+            )
+        elif report.method == "error":
+            lines.append(f"{index}. ❗ {report.host}  测试出错（{report.text.split(': ', 1)[-1]}）")
+        elif report.rank == 1:
+            reason = "ping无响应" if report.stats is not None else "ping不可用"
+            lines.append(f"{index}. ⚠️ {report.host}  TCP {report.latency:.0f}ms  {ports}（{reason}）")
+        else:
+            lines.append(f"{index}. ❌ {report.host}  不可达")
+        if report.families:
+            lines[-1] += "  " + " / ".join(family.brief() for family in report.families)
+
+    if detailed:
+        return "\n".join(lines) + "\n\n" + "\n\n".join(report.text.rstrip() for report in ordered)
+    lines.append("\n💡 追加参数“详细”查看每个目标的完整结果")
+    return "\n".join(lines)
+
+async def _probe_port(address, port, timeout):
+    """测试单个TCP端口，返回 (端口, 连接耗时ms, 失败原因)，成功时失败原因为None
+
+    使用单调的高精度计时器 perf_counter_ns，不受系统时钟调整影响。
+    """
+    start_ns = time.perf_counter_ns()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(address, port),
+            timeout=timeout
+        )
+        response_time = (time.perf_counter_ns() - start_ns) / 1e6
+    except asyncio.TimeoutError:
+        return port, None, REASON_TIMEOUT
+    except ConnectionRefusedError:
+        return port, None, REASON_REFUSED
+    except OSError as e:
+        if e.errno in _UNREACHABLE_ERRNOS:
+            return port, None, REASON_UNREACHABLE
+        if e.errno == errno.ETIMEDOUT:
+            return port, None, REASON_TIMEOUT
+        return port, None, REASON_FAILED
+    except Exception:
+        return port, None, REASON_FAILED
+
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return port, response_time, None
+
+class TcpingResult:
+    """单个端口的多次连接采样结果"""
+
+    __slots__ = ("port", "stats", "failures")
+
+    def __init__(self, port, samples, failures):
+        self.port = port
+        self.stats = PingStats.from_delays(samples, sent=len(samples) + sum(failures.values()))
+        self.failures = failures  # 失败原因 -> 次数
+
+    def format(self):
+        stats = self.stats
+        line = f"端口{self.port}: {stats.received}/{stats.sent}成功"
+        if stats.received:
+            line += (
+                f" | 最小 {stats.min:.2f} / 平均 {stats.avg:.2f} / P50 {stats.p50:.2f}"
+                f" / P95 {stats.p95:.2f} / 最大 {stats.max:.2f} ms"
+            )
+            if stats.jitter is not None:
+                line += f" | 抖动 {stats.jitter:.2f}ms"
+        failures = "，".join(f"{reason}{count}次" for reason, count in self.failures.items() if count)
+        if failures:
+            line += f" | {failures}"
+        return line
+
+async def _tcping_port(address, port, samples, interval, timeout):
+    loop = asyncio.get_running_loop()
+    times = []
+    failures = {REASON_REFUSED: 0, REASON_TIMEOUT: 0, REASON_UNREACHABLE: 0, REASON_FAILED: 0}
+    for index in range(samples):
+        started = loop.time()
+        _, response_time, reason = await _probe_port(address, port, timeout)
+        if response_time is None:
+            failures[reason] += 1
+        else:
+            times.append(response_time)
+        if index < samples - 1:
+            await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+    return TcpingResult(port, times, failures)
+
+async def tcping(host, ports, samples=4, interval=1.0, timeout=3.0, resolver=None):
+    """对每个端口按间隔发起 samples 次TCP连接采样，各端口并发进行
+
+    返回 (连接地址, [TcpingResult])，无法解析时地址为 None。
+    """
+    resolver = resolver or DEFAULT_DNS_CACHE
+    ipv4_addresses, ipv6_addresses = await resolver.resolve_all(host)
+    addresses = ipv4_addresses or ipv6_addresses
+    if not addresses:
+        return None, []
+    results = await asyncio.gather(*(
+        _tcping_port(addresses[0], port, samples, interval, timeout) for port in ports
+    ))
+    return addresses[0], results
+
+def format_tcping(host, address, results, samples, interval):
+    if address is None:
+        return f"❌ 无法解析 {host}"
+    lines = [f"📶 TCPing - {host} ({address})，每个端口{samples}次，间隔{interval:g}秒:"]
+    lines.extend(result.format() for result in results)
+    return "\n".join(lines)
+
+def address_family(address):
+    return "IPv6" if ":" in address else "IPv4"
+
+def interleave_addresses(ipv4_addresses, ipv6_addresses):
+    """RFC 8305 地址排序：IPv6 优先，两个地址族交替排列"""
+    ordered = []
+    for pair in itertools.zip_longest(ipv6_addresses, ipv4_addresses):
+        ordered.extend(address for address in pair if address)
+    return ordered
+
+async def happy_eyeballs_probe(addresses, port, timeout, attempt_delay=HAPPY_EYEBALLS_DELAY):
+    """按 RFC 8305 依次错开发起连接，第一个成功的连接胜出，其余尝试取消
+
+    上一个尝试失败时立即开始下一个，不必等满间隔。
+    返回 (端口, 胜出连接的耗时ms, 失败原因, 胜出地址)。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    queue = list(addresses)
+    pending = {}
+    reason = REASON_TIMEOUT
+    try:
+        while queue or pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if queue:
+                address = queue.pop(0)
+                pending[asyncio.ensure_future(_probe_port(address, port, remaining))] = address
+                wait_timeout = min(attempt_delay, remaining) if queue else remaining
+            else:
+                wait_timeout = remaining
+            done, _ = await asyncio.wait(pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                address = pending.pop(task)
+                _, response_time, reason = task.result()
+                if response_time is not None:
+                    return port, response_time, None, address
+    finally:
+        for task in pending:
+            task.cancel()
+    return port, None, reason, None
+
+async def probe_ports(host, test_ports, timeout=3.0, resolver=None, dual_stack=False):
+    """并发测试所有端口，结果为 (端口, 连接耗时ms, 失败原因, 连接地址)，顺序与端口列表一致
+
+    域名只经由异步DNS缓存解析一次，各端口直接连接解析得到的地址；
+    dual_stack 时每个端口在两个地址族之间竞速。
+    """
+    resolver = resolver or DEFAULT_DNS_CACHE
+    ipv4_addresses, ipv6_addresses = await resolver.resolve_all(host)
+    if not ipv4_addresses and not ipv6_addresses:
+        return [(port, None, "解析失败", None) for port in test_ports]
+    if dual_stack:
+        addresses = interleave_addresses(
+            ipv4_addresses[:MAX_ADDRESSES_PER_FAMILY], ipv6_addresses[:MAX_ADDRESSES_PER_FAMILY]
+        )
+        return await asyncio.gather(*(happy_eyeballs_probe(addresses, port, timeout) for port in test_ports))
+    address = (ipv4_addresses or ipv6_addresses)[0]
+    probes = await asyncio.gather(*(_probe_port(address, port, timeout) for port in test_ports))
+    return [(port, response_time, reason, address) for port, response_time, reason in probes]
+
+class FamilyProbe:
+    """双栈测试中一个地址族的结果"""
+
+    __slots__ = ("family", "addresses", "icmp", "tcp_attempts", "tcp_times")
+
+    def __init__(self, family, addresses):
+        self.family = family
+        self.addresses = addresses
+        self.icmp = None  # 首个地址的ICMP统计（PingStats），ICMP不可用时为 None
+        self.tcp_attempts = 0
+        self.tcp_times = []
+
+    @property
+    def latency(self):
+        """该地址族的代表延迟：优先ICMP平均延迟，其次最快的TCP连接"""
+        if self.icmp is not None and self.icmp.received:
+            return self.icmp.avg
+        return min(self.tcp_times) if self.tcp_times else None
+
+    def brief(self):
+        latency = self.latency
+        label = "v6" if self.family == "IPv6" else "v4"
+        return f"{label} {latency:.1f}ms" if latency is not None else f"{label} ❌"
+
+async def _family_icmp(address):
+    try:
+        rtts = await icmp_ping(address, FAMILY_ICMP_COUNT, 1.0, FAMILY_ICMP_INTERVAL)
+    except (ICMPUnavailable, OSError):
+        return None
+    return PingStats.from_delays([rtt for rtt in rtts if rtt is not None], sent=len(rtts))
+
+async def probe_families(host, test_ports, timeout=3.0, resolver=None, use_icmp=True):
+    """双栈测试：每个地址族的全部地址（各最多 MAX_ADDRESSES_PER_FAMILY 个）与全部端口并发连接，
+    并对每个地址族的首个地址做ICMP测试，返回 [FamilyProbe]（无地址的地址族不返回）"""
+    resolver = resolver or DEFAULT_DNS_CACHE
+    ipv4_addresses, ipv6_addresses = await resolver.resolve_all(host)
+    families = [
+        FamilyProbe(family, addresses[:MAX_ADDRESSES_PER_FAMILY])
+        for family, addresses in (("IPv4", ipv4_addresses), ("IPv6", ipv6_addresses))
+        if addresses
+    ]
+    capabilities = await get_capabilities()
+    icmp_enabled = use_icmp and (capabilities.icmp_available or not capabilities.probed)
+
+    async def _probe_family(family):
+        tcp = asyncio.gather(*(
+            _probe_port(address, port, timeout) for address in family.addresses for port in test_ports
+        ))
+        if icmp_enabled:
+            family.icmp, probes = await asyncio.gather(_family_icmp(family.addresses[0]), tcp)
+        else:
+            probes = await tcp
+        family.tcp_attempts = len(probes)
+        family.tcp_times = [response_time for _, response_time, _ in probes if response_time is not None]
+
+    await asyncio.gather(*(_probe_family(family) for family in families))
+    return families
+
+def format_family_section(families):
+    """双栈测试结果文本：分地址族给出ICMP与TCP延迟，并比较两个地址族"""
+    if not families:
+        return ""
+    lines = ["\n🌐 双栈测试:"]
+    for family in families:
+        parts = []
+        if family.icmp is not None:
+            if family.icmp.received:
+                parts.append(f"ICMP {family.icmp.avg:.1f}ms（丢包{family.icmp.loss:.4g}%）")
+            else:
+                parts.append("ICMP 无响应")
+        if family.tcp_times:
+            parts.append(f"TCP {len(family.tcp_times)}/{family.tcp_attempts}可连接，最快 {min(family.tcp_times):.0f}ms")
+        else:
+            parts.append(f"TCP 0/{family.tcp_attempts}可连接 ❌")
+        lines.append(f"  {family.family}（{len(family.addresses)}个地址）: {' | '.join(parts)}")
+
+    by_family = {family.family: family.latency for family in families}
+    if len(families) < 2:
+        missing = "IPv6" if "IPv4" in by_family else "IPv4"
+        lines.append(f"  ℹ️ 该主机没有{missing}地址")
+    elif by_family["IPv4"] is not None and by_family["IPv6"] is not None:
+        diff = by_family["IPv6"] - by_family["IPv4"]
+        faster, slower = ("IPv4", "IPv6") if diff > 0 else ("IPv6", "IPv4")
+        lines.append(f"  ⚖️ {slower} 比 {faster} 慢 {abs(diff):.1f}ms")
+    elif by_family["IPv4"] is not None or by_family["IPv6"] is not None:
+        broken = "IPv4" if by_family["IPv4"] is None else "IPv6"
+        lines.append(f"  ⚠️ {broken} 路径不可用")
+    return "\n".join(lines) + "\n"
+
+def _summarize_port_probes(probes, show_family=False):
+    """汇总端口测试结果，返回 (可连接数, 平均连接时间ms, 详情行列表)"""
+    successful_connections = 0
+    total_time = 0
+    connection_results = []
+    for port, response_time, reason, address in probes:
+        if response_time is not None:
+            total_time += response_time
+            successful_connections += 1
+            family = f" ({address_family(address)})" if show_family and address else ""
+            connection_results.append(f"✅ 端口{port}: {response_time:.0f}ms{family}")
+        else:
+            connection_results.append(f"❌ 端口{port}: {reason}")
+    avg_time = total_time / successful_connections if successful_connections else None
+    return successful_connections, avg_time, connection_results
+
+async def fallback_connectivity_test(host, test_ports=None, timeout=3.0, probes=None, resolver=None, error=None):
+    """备用连通性测试（当ping命令不可用时）
+
+    probes 为已完成的端口测试结果，未提供时在此处并发测试；error 为ping命令失败的原因，会显示在结果中。
+    """
+    if test_ports is None:
+        test_ports = DEFAULT_TEST_PORTS
+    resolver = resolver or DEFAULT_DNS_CACHE
+    result = f"连通性测试 - {host}:\n"
+    if error:
+        result += f"⚠️ {error}，使用TCP连接测试\n\n"
+    else:
+        result += "⚠️ 系统ping命令不可用，使用TCP连接测试\n\n"
+    
+    try:
+        # 首先尝试解析域名
+        ipv4_addresses, ipv6_addresses = await resolver.resolve_all(host)
+        if ipv4_addresses or ipv6_addresses:
+            result += f"✅ 域名解析: 成功\n"
+        else:
+            result += f"❌ 域名解析: 失败\n"
+            return result
+        
+        # 测试指定端口的连通性
+        if probes is None:
+            probes = await probe_ports(host, test_ports, timeout, resolver)
+        successful_connections, avg_time, connection_results = _summarize_port_probes(probes)
+        
+        # 构建结果
+        result += f"测试端口: {successful_connections}/{len(test_ports)}个可连接\n"
+        
+        if successful_connections > 0:
+            result += f"平均连接时间: {avg_time:.0f}ms\n"
+            
+            if avg_time < 100:
+                quality = "优秀"
+            elif avg_time < 300:
+                quality = "良好"
+            else:
+                quality = "一般"
+            result += f"连接质量: {quality}\n"
+            result += f"主机状态: 可达\n\n"
+        else:
+            result += f"连接质量: 无法连接\n"
+            result += f"主机状态: 不可达\n\n"
+        
+        result += "端口测试详情:\n"
+        for conn_result in connection_results:
+            result += f"  {conn_result}\n"
+            
+        result += "\n💡 提示: 请安装ping命令获得更准确的延迟测试"
+        
+    except Exception as e:
+        result += f"连通性测试失败: {str(e)}"
+    
+    return result
+
+async def port_connectivity_test(host, test_ports=None, timeout=3.0, probes=None, resolver=None, show_family=False):
+    """端口连通性测试
+
+    probes 为已完成的端口测试结果，未提供时在此处并发测试。
+    """
+    if test_ports is None:
+        test_ports = DEFAULT_TEST_PORTS
+    try:
+        if probes is None:
+            probes = await probe_ports(host, test_ports, timeout, resolver)
+        successful_connections, avg_time, connection_results = _summarize_port_probes(probes, show_family)
+        
+        # 构建结果
+        result = f"\n🔌 端口连通性测试:\n"
+        result += f"测试端口: {successful_connections}/{len(test_ports)}个可连接\n"
+        
+        if successful_connections > 0:
+            result += f"平均连接时间: {avg_time:.0f}ms\n"
+        
+        result += "端口测试详情:\n"
+        for conn_result in connection_results:
+            result += f"  {conn_result}\n"
+        
+        return result
+        
+    except Exception as e:
+        return f"\n🔌 端口连通性测试失败: {str(e)}"
+
+# 精简的中英文对照表（备用翻译，API已支持直接中文返回）
+TRANSLATION_MAP = {
+    # 常见国家/地区
+    'United States': '美国',
+    'China': '中国', 
+    'Hong Kong': '香港',
+    'Taiwan': '台湾',
+    'Japan': '日本',
+    'South Korea': '韩国',
+    'United Kingdom': '英国',
+    'Singapore': '新加坡',
+    
+    # 常见运营商
+    'China Telecom': '中国电信',
+    'China Unicom': '中国联通', 
+    'China Mobile': '中国移动',
+    'Alibaba Cloud': '阿里云',
+    'Tencent Cloud': '腾讯云',
+    'Google LLC': '谷歌',
+    'Microsoft Corporation': '微软公司',
+    'Amazon Technologies': '亚马逊技术',
+    'Cloudflare': 'Cloudflare',
+}
+
+def translate_to_chinese(text):
+    """将英文文本翻译成中文"""
+    if not text or text == '未知':
+        return text
+    
+    # 直接查找完整匹配
+    if text in TRANSLATION_MAP:
+        return TRANSLATION_MAP[text]
+    
+    # 尝试部分匹配（用于处理复合词汇）
+    result = text
+    for en_text, cn_text in TRANSLATION_MAP.items():
+        if en_text.lower() in text.lower():
+            result = result.replace(en_text, cn_text)
+    
+    return result
+
+def format_ip_info(ip_address, data, error=None):
+    """将 ip-api 或离线库返回数据格式化为详细信息文本"""
+    if not data:
+        return error or f"无法查询IP地址 {ip_address} 的详细信息: 未返回数据"
+
+    # 检查API响应
+    if data.get('status') == 'fail':
+        return f"无法查询IP地址 {ip_address} 的详细信息: {data.get('message', '未知错误')}"
+
+    # 提取信息，优先使用API返回的中文，必要时进行翻译
+    country = data.get('country', '未知')
+    country_code = data.get('countryCode', '未知')
+    region = data.get('regionName', '未知') 
+    region_code = data.get('region', '未知')
+    city = data.get('city', '未知')
+    zip_code = data.get('zip', '未知')
+    isp = data.get('isp', data.get('org', '未知'))
+    org = data.get('org', '未知')
+    asn = data.get('as', '未知')
+    asn_name = data.get('asname', '未知')
+    lat = data.get('lat', '未知')
+    lon = data.get('lon', '未知')
+    timezone = data.get('timezone', '未知')
+    is_mobile = data.get('mobile', False)
+    is_proxy = data.get('proxy', False)
+    is_hosting = data.get('hosting', False)
+
+    # 如果API返回的还是英文，则使用翻译表进行翻译
+    country = translate_to_chinese(country) if country != '未知' else country
+    region = translate_to_chinese(region) if region != '未知' else region
+    city = translate_to_chinese(city) if city != '未知' else city
+    isp = translate_to_chinese(isp) if isp != '未知' else isp
+    org = translate_to_chinese(org) if org != '未知' else org
+
+    # 构建更详细的查询结果
+    result = f"🌍 地理位置:\n"
+    result += f"  国家: {country}"
+    if country_code != '未知':
+        result += f" ({country_code})"
+    result += f"\n  省/州: {region}"
+    if region_code != '未知':
+        result += f" ({region_code})"
+    result += f"\n  城市: {city}\n"
+    # 离线库不提供的字段不显示
+    if 'zip' in data:
+        result += f"  邮政编码: {zip_code}\n"
+    if 'lat' in data:
+        result += f"  坐标: {lat}, {lon}\n"
+    if 'timezone' in data:
+        result += f"  时区: {timezone}\n"
+    result += "\n"
+    
+    result += f"🏢 网络信息:\n"
+    result += f"  ISP运营商: {isp}\n"
+    result += f"  组织机构: {org}\n"
+    if asn != '未知':
+        result += f"  ASN编号: {asn}\n"
+    if asn_name != '未知' and asn_name != asn:
+        result += f"  ASN名称: {asn_name}\n"
+    
+    # 特殊属性标识
+    special_attrs = []
+    if is_mobile:
+        special_attrs.append("📱 移动网络")
+    if is_proxy:
+        special_attrs.append("🔒 代理/VPN")
+    if is_hosting:
+        special_attrs.append("🖥️ 托管服务")
+    
+    if special_attrs:
+        result += f"\n🏷️ 特殊属性:\n"
+        for attr in special_attrs:
+            result += f"  {attr}\n"
+
+    if data.get('_source') == 'offline':
+        result += "\n📦 数据来源: 本地离线库（追加参数“详细”可在线查询完整信息）"
+    
+    return result.rstrip()
+
+def format_ip_brief(ip_address, data):
+    """将 ip-api 返回数据格式化为单行归属摘要"""
+    if not data or data.get('status') == 'fail':
+        return f"{ip_address}: 查询失败"
+    location = " ".join(
+        translate_to_chinese(data[field]) for field in ('country', 'regionName', 'city') if data.get(field)
+    )
+    isp = translate_to_chinese(data.get('isp', '')) or '未知'
+    return f"{ip_address}: {location or '未知'} | {isp}"
+
+# 获取域名的IPv4和IPv6地址
+async def get_domain_ips(domain, resolver=None):
+    """获取域名的IPv4和IPv6地址（异步并发解析，带缓存）"""
+    resolver = resolver or DEFAULT_DNS_CACHE
+    try:
+        return await resolver.resolve_all(domain)
+    except Exception:
+        return [], []
+
+# 检查是否为IP地址
+def is_ip_address(address):
+    """检查字符串是否为有效的IP地址（IPv4或IPv6）"""
+    try:
+        socket.inet_pton(socket.AF_INET, address)
+        return True, "IPv4"
+    except socket.error:
+        try:
+            socket.inet_pton(socket.AF_INET6, address)
+            return True, "IPv6"
+        except socket.error:
+            return False, None
@@ -0,0 +1,101 @@
+import asyncio
+from urllib.parse import urlparse
+
+from .balance_cache import STATUS_OK, result_status
+
+# 由 newapi_base_url 生成的实例名称
+DEFAULT_INSTANCE_NAME = "默认"
+
+
+class NewAPIInstance:
+    """一个具名的 NEW API 中转实例：独立的基地址、单次请求超时与连接池大小
+
+    policy 与 session 由插件在加载配置与首次请求时设置，每个实例各自一份，
+    某个中转变慢或熔断不会占用其他实例的连接与重试预算。
+    """
+
+    __slots__ = ("name", "base_url", "timeout", "pool_limit", "policy", "session")
+
+    def __init__(self, name, base_url, timeout=None, pool_limit=None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout  # None 表示使用 request_timeout
+        self.pool_limit = pool_limit  # None 表示使用 pool_limit_per_host
+        self.policy = None
+        self.session = None
+
+    @property
+    def host(self):
+        return urlparse(self.base_url).hostname
+
+
+def _valid_base_url(url):
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.hostname)
+
+
+def parse_newapi_instances(lines, default_base_url=""):
+    """解析 NEW API 实例配置，每行格式：名称|基地址|超时秒|连接数（超时和连接数可省略）
+
+    default_base_url 不为空时作为名为“默认”的实例排在最前（与已配置实例的基地址相同时不重复添加）。
+    返回 (实例列表, 无效行说明列表)
+    """
+    instances = []
+    errors = []
+    names = set()
+    for line in lines or []:
+        parts = [part.strip() for part in str(line).split("|")]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            errors.append(f"格式错误: {line}")
+            continue
+        name, base_url = parts[0], parts[1]
+        if name in names or name == DEFAULT_INSTANCE_NAME:
+            errors.append(f"实例名称重复: {line}")
+            continue
+        if not _valid_base_url(base_url):
+            errors.append(f"基地址无效: {line}")
+            continue
+        try:
+            timeout = float(parts[2]) if len(parts) > 2 and parts[2] else None
+            pool_limit = int(parts[3]) if len(parts) > 3 and parts[3] else None
+        except ValueError:
+            errors.append(f"超时或连接数不是数字: {line}")
+            continue
+        if (timeout is not None and timeout <= 0) or (pool_limit is not None and pool_limit <= 0):
+            errors.append(f"超时和连接数必须大于0: {line}")
+            continue
+        names.add(name)
+        instances.append(NewAPIInstance(name, base_url, timeout, pool_limit))
+
+    if default_base_url:
+        if not _valid_base_url(default_base_url):
+            errors.append(f"newapi_base_url 无效: {default_base_url}")
+        elif all(instance.base_url != default_base_url.rstrip("/") for instance in instances):
+            instances.insert(0, NewAPIInstance(DEFAULT_INSTANCE_NAME, default_base_url))
+    return instances, errors
+
+
+async def first_ok(queries):
+    """并发执行 {名称: 协程}，返回首个成功结果 (名称, 结果, None)，并取消其余仍在进行的查询
+
+    全部未成功时返回 (None, None, [(名称, 结果)])，顺序与 queries 一致；
+    因此一个很慢的实例只会在其他实例全部失败时才拖慢结果。
+    """
+    tasks = {asyncio.ensure_future(coro): name for name, coro in queries.items()}
+    results = {}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = f"查询失败: {e}"
+                if result_status(result) == STATUS_OK:
+                    return tasks[task], result, None
+                results[tasks[task]] = result
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None, [(name, results[name]) for name in queries]
@@ -0,0 +1,226 @@
+"""ping命令输出解析
+
+单次遍历、预编译正则，支持 iputils / busybox / BSD、macOS / Windows（中英文）格式，
+解析结果为结构化的 PingStats。
+"""
+import math
+import re
+
+# ping命令输出的候选编码（Windows 中文系统为GBK，gb2312/cp936 均为其子集或别名）
+OUTPUT_ENCODINGS = ('utf-8', 'gbk')
+
+# 每行只做一次匹配：回显延迟 / 单包超时 / 收发统计 / 往返时间汇总
+# ʱ、ѷ、ѽ 是GBK输出被错误解码后的残留字符
+_PING_LINE_RE = re.compile(
+    r"(?:time|时间|ʱ)\s*[=<]\s*(?P<time>\d+(?:\.\d+)?)\s*ms"
+    r"|(?P<timeout>request timeout|request timed out|no answer yet|请求超时)"
+    r"|(?P<tx>\d+) packets transmitted, (?P<rx>\d+) (?:packets )?received"
+    r"|(?:sent|已发送|ѷ)\s*=\s*(?P<wtx>\d+)\s*[,，]\s*(?:received|已接收|ѽ)\s*=\s*(?P<wrx>\d+)"
+    r"|(?:rtt|round-trip) min/avg/max(?:/(?:mdev|stddev))? = (?P<rtt>[\d./]+)\s*ms"
+    r"|(?:minimum|最短)\s*=\s*(?P<wmin>\d+)ms\s*[,，]\s*(?:maximum|最长)\s*=\s*(?P<wmax>\d+)ms"
+    r"\s*[,，]\s*(?:average|平均)\s*=\s*(?P<wavg>\d+)ms",
+    re.IGNORECASE,
+)
+# 丢包率只在收发统计行上查找
+_PING_LOSS_RE = re.compile(r"(\d+(?:\.\d+)?)% (?:packet loss|loss|丢失)", re.IGNORECASE)
+
+RAW_HEAD_LIMIT = 300  # 保留的原始输出长度，无法解析时用于调试展示
+
+
+def _candidate_encodings(preferred=None):
+    """候选编码：探测到的控制台编码优先，其余按 OUTPUT_ENCODINGS 顺序"""
+    if preferred and preferred not in OUTPUT_ENCODINGS:
+        return [preferred, *OUTPUT_ENCODINGS]
+    if preferred:
+        return [preferred] + [encoding for encoding in OUTPUT_ENCODINGS if encoding != preferred]
+    return list(OUTPUT_ENCODINGS)
+
+
+def decode_output(data, preferred=None):
+    """按候选编码严格解码，全部失败时用首选编码替换无法解码的字节"""
+    encodings = _candidate_encodings(preferred)
+    for encoding in encodings:
+        try:
+            return data.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return data.decode(encodings[0], errors='replace')
+
+
+class LineDecoder:
+    """逐行解码子进程输出：优先沿用上一行成功的编码，失败时再依次尝试其他候选编码"""
+
+    def __init__(self, preferred=None):
+        self._encodings = _candidate_encodings(preferred)
+
+    def decode(self, data):
+        for index, encoding in enumerate(self._encodings):
+            try:
+                text = data.decode(encoding)
+            except (UnicodeDecodeError, LookupError):
+                continue
+            if index:
+                self._encodings.insert(0, self._encodings.pop(index))
+            return text
+        return data.decode(self._encodings[0], errors='replace')
+
+
+class PingStats:
+    """ping统计结果，延迟单位均为ms，未知的字段为 None"""
+
+    __slots__ = ("sent", "received", "loss", "min", "avg", "max", "mdev", "p50", "p95", "jitter", "delays")
+
+    def __init__(self, sent=None, received=None, loss=None, min=None, avg=None, max=None,
+                 mdev=None, p50=None, p95=None, jitter=None, delays=()):
+        self.sent = sent
+        self.received = received
+        self.loss = loss
+        self.min = min
+        self.avg = avg
+        self.max = max
+        self.mdev = mdev
+        self.p50 = p50
+        self.p95 = p95
+        self.jitter = jitter
+        self.delays = delays
+
+    @classmethod
+    def from_delays(cls, delays, sent=None, received=None, loss=None):
+        """由延迟列表计算统计；sent/received/loss 未给出时按延迟个数推算"""
+        delays = list(delays)
+        if received is None:
+            received = len(delays)
+        if sent is None:
+            sent = max(received, len(delays)) or None
+        if loss is None and sent:
+            loss = (sent - received) * 100.0 / sent
+        stats = cls(sent, received, loss, delays=delays)
+        if delays:
+            count = len(delays)
+            ordered = sorted(delays)
+            stats.min = ordered[0]
+            stats.max = ordered[-1]
+            stats.avg = sum(delays) / count
+            stats.mdev = math.sqrt(max(0.0, sum(d * d for d in delays) / count - stats.avg * stats.avg))
+            # 最近秩法求分位数
+            stats.p50 = ordered[max(0, math.ceil(0.50 * count) - 1)]
+            stats.p95 = ordered[max(0, math.ceil(0.95 * count) - 1)]
+            if count > 1:
+                stats.jitter = sum(abs(b - a) for a, b in zip(delays, delays[1:])) / (count - 1)
+        return stats
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if name != "delays")
+        return f"PingStats({fields})"
+
+
+class PingOutputParser:
+    """逐行增量解析ping命令输出，每行只做一次预编译正则匹配"""
+
+    REPLY = "reply"
+    TIMEOUT = "timeout"
+
+    def __init__(self):
+        self.delays = []
+        self.timeouts = 0
+        self.sent = None
+        self.received = None
+        self.loss = None
+        self.summary_rtt = None  # 命令自身输出的 (最小, 平均, 最大, 标准差)
+        self._head = []
+        self._head_len = 0
+
+    @property
+    def raw_head(self):
+        return "\n".join(self._head)[:RAW_HEAD_LIMIT]
+
+    def feed(self, line):
+        """解析一行输出，回显行返回 (REPLY, 延迟ms) 或 (TIMEOUT, None)，其他行返回 None"""
+        line = line.strip()
+        if self._head_len < RAW_HEAD_LIMIT:
+            self._head.append(line)
+            self._head_len += len(line) + 1
+        match = _PING_LINE_RE.search(line)
+        if match is None:
+            return None
+
+        groups = match.groupdict()
+        if groups["time"] is not None:
+            delay = float(groups["time"])
+            self.delays.append(delay)
+            return self.REPLY, delay
+        if groups["timeout"] is not None:
+            self.timeouts += 1
+            return self.TIMEOUT, None
+
+        tx = groups["tx"] or groups["wtx"]
+        if tx is not None:
+            self.sent = int(tx)
+            self.received = int(groups["rx"] or groups["wrx"])
+            loss_match = _PING_LOSS_RE.search(line, match.end())
+            if loss_match:
+                self.loss = float(loss_match.group(1))
+        elif groups["rtt"] is not None:
+            values = [float(value) for value in groups["rtt"].split("/") if value]
+            if len(values) >= 3:
+                self.summary_rtt = (values[0], values[1], values[2], values[3] if len(values) > 3 else None)
+        elif groups["wmin"] is not None:
+            self.summary_rtt = (float(groups["wmin"]), float(groups["wavg"]), float(groups["wmax"]), None)
+        return None
+
+    def stats(self):
+        """汇总为 PingStats：收发统计优先采用命令自身的输出"""
+        sent = self.sent
+        if sent is None and (self.delays or self.timeouts):
+            sent = len(self.delays) + self.timeouts
+        stats = PingStats.from_delays(self.delays, sent, self.received, self.loss)
+        if not self.delays and self.summary_rtt is not None:
+            stats.min, stats.avg, stats.max, stats.mdev = self.summary_rtt
+        return stats
+
+
+def format_ping_stats(host, stats, raw_head=""):
+    """把 PingStats 格式化为ping结果文本（系统ping与内置ICMP共用）"""
+    lines = [f"Ping测试结果 - {host}:"]
+    loss_text = f"{stats.loss:.4g}%" if stats.loss is not None else "未知"
+
+    if stats.avg is None:
+        if stats.sent:
+            lines.append(f"发送数据包: {stats.sent}个")
+            lines.append(f"接收数据包: {stats.received}个")
+            lines.append(f"丢包率: {loss_text}")
+            lines.append("连接状态: 可达" if stats.received else "连接状态: 不可达")
+        else:
+            lines.append("无法解析延迟信息")
+            lines.append(f"丢包率: {loss_text}")
+        if raw_head and not stats.sent:
+            # 显示部分原始输出用于调试
+            lines.append("\n原始输出片段:\n" + raw_head + "...")
+        return "\n".join(lines)
+
+    lines.append(f"发送数据包: {stats.sent}个")
+    lines.append(f"接收数据包: {stats.received}个")
+    lines.append(f"丢包率: {loss_text}")
+    lines.append(f"最小延迟: {stats.min:.2f}ms")
+    lines.append(f"最大延迟: {stats.max:.2f}ms")
+    lines.append(f"平均延迟: {stats.avg:.2f}ms")
+    if stats.jitter is not None:
+        lines.append(f"延迟抖动: {stats.jitter:.2f}ms")
+
+    # 网络质量评估
+    if stats.avg < 50:
+        quality = "优秀"
+    elif stats.avg < 100:
+        quality = "良好"
+    elif stats.avg < 200:
+        quality = "一般"
+    else:
+        quality = "较差"
+    lines.append(f"网络质量: {quality}")
+
+    # 如果解析出丢包率，提供连接稳定性评估
+    if stats.loss:
+        lines.append("连接稳定性: 有丢包，建议检查网络")
+    elif stats.loss == 0:
+        lines.append("连接稳定性: 稳定")
+    return "\n".join(lines)
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import random
+import time
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .metrics import METRICS
+
+PolicyResponse = namedtuple("PolicyResponse", ["status", "data", "headers"])
+
+# 可重试的HTTP状态码：限流与服务端错误
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """上游主机处于熔断状态，请求被直接拒绝"""
+
+    def __init__(self, host, retry_in):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(f"{host} 近期连续请求失败，已暂停访问（熔断中），约{max(1, round(retry_in))}秒后自动恢复")
+
+
+class CircuitBreaker:
+    """单个上游主机的熔断器：连续失败达到阈值后打开，冷却结束后放行一次试探请求"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, host, threshold=5, cooldown=30.0):
+        self.host = host
+        self.threshold = max(1, int(threshold))
+        self.cooldown = float(cooldown)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def before_request(self):
+        """请求前检查，熔断中直接抛出 CircuitOpenError；本次请求是半开状态的试探请求时返回 True"""
+        if self.state == self.CLOSED:
+            return False
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == self.OPEN and elapsed >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            # 半开状态只放行一个试探请求
+            self._probing = True
+            return True
+        raise CircuitOpenError(self.host, max(0.0, self.cooldown - elapsed))
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def abandon_probe(self):
+        """试探请求未得出结果（被取消或抛出其他异常）时释放试探名额，下一个请求重新试探"""
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+
+def _parse_retry_after(value):
+    """解析 Retry-After 头（秒数或HTTP日期），返回等待秒数，无法解析返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestPolicy:
+    """所有上游请求共用的请求策略：单次超时、全抖动指数退避重试、429 Retry-After、按主机熔断"""
+
+    def __init__(self, timeout=10.0, max_retries=3, backoff_base=0.5, backoff_cap=8.0,
+                 max_retry_after=30.0, breaker_threshold=5, breaker_cooldown=30.0):
+        self.timeout = float(timeout) if timeout else None
+        self.attempts = max(1, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_cap = float(backoff_cap)
+        self.max_retry_after = float(max_retry_after)
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._breakers = {}
+
+    def breaker(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, self.breaker_threshold, self.breaker_cooldown)
+            self._breakers[host] = breaker
+        return breaker
+
+    def open_hosts(self):
+        """当前处于熔断（打开或半开）状态的上游主机列表"""
+        return [breaker.host for breaker in self._breakers.values() if breaker.state != CircuitBreaker.CLOSED]
+
+    def worst_case_duration(self):
+        """全部重试用尽时的最长耗时估计（不含超长的 Retry-After）"""
+        per_attempt = self.timeout or 300.0
+        return per_attempt * self.attempts + self.backoff_cap * (self.attempts - 1)
+
+    def _backoff(self, attempt):
+        """全抖动退避：在 [0, min(上限, 基数*2^attempt)] 内均匀取值"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    async def request(self, session, method, url, *, raise_for_status=True, expect_json=True,
+                      retry_statuses=RETRYABLE_STATUS, **kwargs):
+        """按策略发送请求，返回 PolicyResponse(status, data, headers)
+
+        expect_json=True 时按 JSON 解析响应（非 JSON 抛出 aiohttp.ContentTypeError），
+        否则优先解析 JSON，失败时返回原始文本。
+        retry_statuses 为需要重试的状态码，上游有自己的限流节奏时可去掉 429，由调用方处理。
+        可能抛出 CircuitOpenError、asyncio.TimeoutError 或 aiohttp.ClientError。
+        """
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout) if self.timeout else None
+
+        for attempt in range(self.attempts):
+            try:
+                probing = breaker.before_request()
+            except CircuitOpenError:
+                METRICS.inc("upstream_requests_total", host=host, outcome="circuit_open")
+                raise
+            if attempt:
+                METRICS.inc("upstream_retries_total", host=host)
+            last_attempt = attempt == self.attempts - 1
+            retry_delay = None
+            started = time.perf_counter()
+            try:
+                async with session.request(method, url, timeout=timeout, **kwargs) as response:
+                    METRICS.observe("upstream_request_seconds", time.perf_counter() - started, host=host)
+                    METRICS.inc("upstream_requests_total", host=host, outcome=f"{response.status // 100}xx")
+                    if response.status >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+
+                    if response.status in retry_statuses and not last_attempt:
+                        delay = self._backoff(attempt)
+                        if response.status == 429:
+                            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                            if retry_after is not None:
+                                delay = retry_after
+                        # Retry-After 过长时不再等待，直接返回本次响应
+                        if delay <= self.max_retry_after:
+                            retry_delay = delay
+
+                    if retry_delay is None:
+                        if raise_for_status:
+                            response.raise_for_status()
+                        if expect_json:
+                            data = await response.json()
+                        else:
+                            text = await response.text()
+                            try:
+                                data = json.loads(text)
+                            except ValueError:
+                                data = text
+                        return PolicyResponse(response.status, data, response.headers)
+
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                METRICS.inc(
+                    "upstream_requests_total", host=host,
+                    outcome="timeout" if isinstance(e, asyncio.TimeoutError) else "connection_error",
+                )
+                breaker.record_failure()
+                if last_attempt:
+                    raise
+                retry_delay = self._backoff(attempt)
+            except BaseException:
+                # 试探请求被取消或因其他异常中断时没有记录结果，必须释放试探名额，否则熔断器无法恢复
+                if probing:
+                    breaker.abandon_probe()
+                raise
+
+            # 在释放连接后再等待重试
+            await asyncio.sleep(retry_delay)
@@ -0,0 +1,28 @@
+"""测试公共配置：把插件目录注册为包 balance_plugin，使模块内的相对导入可用
+
+未安装 AstrBot 时注册一个只提供 astrbot.api.logger 的最小替身，
+使只依赖日志的模块（metrics、request_policy、ip_geo 等）可以直接测试。
+"""
+import logging
+import sys
+import types
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+PACKAGE_NAME = "balance_plugin"
+
+if PACKAGE_NAME not in sys.modules:
+    package = types.ModuleType(PACKAGE_NAME)
+    package.__path__ = [str(PLUGIN_DIR)]
+    sys.modules[PACKAGE_NAME] = package
+
+try:
+    import astrbot.api  # noqa: F401
+except ImportError:
+    astrbot = types.ModuleType("astrbot")
+    astrbot.__path__ = []
+    astrbot_api = types.ModuleType("astrbot.api")
+    astrbot_api.logger = logging.getLogger("astrbot")
+    astrbot.api = astrbot_api
+    sys.modules["astrbot"] = astrbot
+    sys.modules["astrbot.api"] = astrbot_api
@@ -0,0 +1,94 @@
+import asyncio
+
+from balance_plugin.balance_cache import STATUS_INVALID, BalanceCache, BalanceResult
+
+
+def test_concurrent_fetches_share_one_request():
+    cache = BalanceCache(ttl=60.0)
+    calls = []
+
+    async def fetcher():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return BalanceResult("ok")
+
+    async def run():
+        return await asyncio.gather(*(cache.fetch("p", "key", fetcher) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [age for _, age in results] == [0.0, 0.0, 0.0]
+    assert cache.lookup("p", "key") is not None
+
+
+def test_invalid_result_uses_negative_ttl():
+    cache = BalanceCache(ttl=60.0, negative_ttl=0.0)
+
+    async def fetcher():
+        return BalanceResult("无效", STATUS_INVALID)
+
+    asyncio.run(cache.fetch("p", "key", fetcher))
+    assert cache.lookup("p", "key") is None
+
+
+def test_last_waiter_cancel_cancels_upstream():
+    cache = BalanceCache()
+    state = {}
+
+    async def fetcher():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def run():
+        waiter = asyncio.ensure_future(cache.fetch("p", "key", fetcher))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert state.get("cancelled")
+    assert not cache._inflight
+
+
+def test_request_kept_while_other_waiters_remain():
+    cache = BalanceCache()
+
+    async def fetcher():
+        await asyncio.sleep(0.02)
+        return BalanceResult("ok")
+
+    async def run():
+        first = asyncio.ensure_future(cache.fetch("p", "key", fetcher))
+        second = asyncio.ensure_future(cache.fetch("p", "key", fetcher))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second
+
+    result, age = asyncio.run(run())
+    assert result == "ok" and age == 0.0
+
+
+def test_caller_after_cancel_starts_new_request():
+    cache = BalanceCache()
+    calls = []
+
+    async def fetcher():
+        calls.append(1)
+        await asyncio.sleep(0.01 if len(calls) > 1 else 3600)
+        return BalanceResult("ok")
+
+    async def run():
+        waiter = asyncio.ensure_future(cache.fetch("p", "key", fetcher))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        # 在被取消的任务完成回调执行之前就发起新的相同查询
+        second = asyncio.ensure_future(cache.fetch("p", "key", fetcher))
+        await asyncio.sleep(0)
+        return await second
+
+    result, age = asyncio.run(run())
+    assert result == "ok" and age == 0.0
+    assert len(calls) == 2
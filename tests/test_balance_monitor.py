@@ -0,0 +1,31 @@
+import asyncio
+import random
+
+from balance_plugin import balance_monitor
+from balance_plugin.balance_monitor import MIN_POLL_SLEEP, BalanceMonitor, MonitorEntry
+
+
+def test_jitter_is_clamped_to_half_the_interval():
+    monitor = BalanceMonitor([], None, None, interval=60.0, jitter=600.0)
+    assert monitor.jitter == 30.0
+
+
+def test_poll_sleep_stays_above_minimum(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) > 3:
+            raise asyncio.CancelledError
+
+    async def poll(provider, api_keys):
+        return [None for _ in api_keys]
+
+    monkeypatch.setattr(balance_monitor.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(random, "uniform", lambda low, high: low)
+    monitor = BalanceMonitor([MonitorEntry("p", "k", None, None)], poll, None, interval=10.0, jitter=60.0)
+    try:
+        asyncio.run(monitor._run())
+    except asyncio.CancelledError:
+        pass
+    assert all(delay >= MIN_POLL_SLEEP for delay in sleeps[1:])
@@ -0,0 +1,37 @@
+import asyncio
+import socket
+
+import pytest
+
+from balance_plugin.icmp_ping import (
+    ICMP_ECHO_REPLY,
+    _ICMP_HEADER,
+    _build_echo_request,
+    _checksum,
+    _parse_echo_reply,
+    icmp_ping,
+    icmp_supported,
+)
+
+requires_icmp = pytest.mark.skipif(not icmp_supported()[0], reason="当前环境无法创建ICMP套接字")
+
+
+def test_echo_request_checksum_verifies():
+    packet = _build_echo_request(socket.AF_INET, 0x1234, 7, b"abc")
+    # 带校验和的完整报文再次求和应为 0
+    assert _checksum(packet) == 0
+
+
+def test_parse_reply_strips_ipv4_header():
+    icmp = _ICMP_HEADER.pack(ICMP_ECHO_REPLY, 0, 0, 0x1234, 7) + b"payload"
+    ip_header = bytes([0x45]) + bytes(19)
+    assert _parse_echo_reply(socket.AF_INET, ip_header + icmp, True) == (0x1234, 7)
+    assert _parse_echo_reply(socket.AF_INET, icmp, False) == (0x1234, 7)
+    assert _parse_echo_reply(socket.AF_INET, b"\x00", False) is None
+
+
+@requires_icmp
+def test_loopback_ping():
+    rtts = asyncio.run(icmp_ping("127.0.0.1", count=3, timeout=1.0, interval=0.05))
+    assert len(rtts) == 3
+    assert all(rtt is not None and 0 <= rtt < 1000 for rtt in rtts)
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from collections import namedtuple
+
+import pytest
+
+from balance_plugin.ip_geo import IPGeoLookup, IPGeoRateLimited
+
+Response = namedtuple("Response", ["status", "data", "headers"])
+
+
+class _FakePolicy:
+    """按顺序返回预设响应的请求策略，记录每次请求的时间与参数"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def request(self, session, method, url, **kwargs):
+        self.calls.append((time.monotonic(), kwargs))
+        status, headers = self.responses.pop(0)
+        ips = kwargs.get("json") or [url.rsplit("/", 1)[-1]]
+        data = [{"status": "success", "query": ip} for ip in ips]
+        return Response(status, data if "json" in kwargs else data[0], headers)
+
+
+def _ips(count):
+    return [f"10.0.{i // 256}.{i % 256}" for i in range(count)]
+
+
+def test_429_waits_for_x_ttl_before_next_batch():
+    policy = _FakePolicy((429, {"X-Rl": "0", "X-Ttl": "1"}), (200, {"X-Rl": "10", "X-Ttl": "60"}))
+    lookup = IPGeoLookup(max_rate_wait=5.0)
+    started = time.monotonic()
+    results = asyncio.run(lookup.lookup(None, _ips(3), policy))
+    assert len(results) == 3
+    assert len(policy.calls) == 2
+    # 第二次请求在 X-Ttl 给出的窗口重置之后发出，而不是立即重试
+    assert policy.calls[1][0] - started >= 0.9
+    # 429 不交给请求策略自行重试
+    assert 429 not in policy.calls[0][1]["retry_statuses"]
+
+
+def test_exhausted_window_delays_following_chunk():
+    policy = _FakePolicy((200, {"X-Rl": "0", "X-Ttl": "1"}), (200, {"X-Rl": "14", "X-Ttl": "60"}))
+    lookup = IPGeoLookup(max_rate_wait=5.0)
+    results = asyncio.run(lookup.lookup(None, _ips(150), policy))
+    assert len(results) == 150
+    assert policy.calls[1][0] - policy.calls[0][0] >= 0.9
+
+
+def test_long_x_ttl_raises_rate_limited():
+    policy = _FakePolicy((429, {"X-Rl": "0", "X-Ttl": "40"}))
+    lookup = IPGeoLookup(max_rate_wait=5.0)
+    with pytest.raises(IPGeoRateLimited):
+        asyncio.run(lookup.lookup(None, _ips(2), policy))
+    assert len(policy.calls) == 1
+
+
+def test_results_are_cached():
+    policy = _FakePolicy((200, {}))
+    lookup = IPGeoLookup()
+    asyncio.run(lookup.lookup(None, ["1.1.1.1"], policy))
+    results = asyncio.run(lookup.lookup(None, ["1.1.1.1"], policy))
+    assert results["1.1.1.1"]["query"] == "1.1.1.1"
+    assert len(policy.calls) == 1
@@ -0,0 +1,29 @@
+import json
+import os
+
+import pytest
+
+from balance_plugin.ping_parser import LineDecoder, PingOutputParser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "fixtures", "ping")
+with open(os.path.join(FIXTURE_DIR, "expected.json"), encoding="utf-8") as f:
+    EXPECTED = json.load(f)
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_fixture_matches_expected(name):
+    with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+        data = f.read()
+    decoder = LineDecoder()
+    parser = PingOutputParser()
+    for line in data.splitlines():
+        parser.feed(decoder.decode(line))
+    stats = parser.stats()
+
+    for field in ("sent", "received", "loss", "min", "avg", "max"):
+        want = EXPECTED[name][field]
+        got = getattr(stats, field)
+        if want is None:
+            assert got is None, field
+        else:
+            assert got == pytest.approx(want, abs=0.001), field
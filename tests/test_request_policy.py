@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from balance_plugin.request_policy import CircuitBreaker, CircuitOpenError, RequestPolicy
+
+
+class _HangingSession:
+    """request() 永不返回的会话，用于模拟被取消的请求"""
+
+    def request(self, method, url, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        await asyncio.sleep(3600)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _open_breaker(policy, host):
+    breaker = policy.breaker(host)
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    breaker.opened_at -= breaker.cooldown  # 冷却时间已过，下一个请求为半开试探
+    return breaker
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("example.com", threshold=2, cooldown=30.0)
+    breaker.record_failure()
+    breaker.before_request()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_cancelled_half_open_probe_releases_slot():
+    policy = RequestPolicy(timeout=5.0, max_retries=1, breaker_threshold=1, breaker_cooldown=30.0)
+    breaker = _open_breaker(policy, "example.com")
+
+    async def run():
+        task = asyncio.ensure_future(policy.request(_HangingSession(), "GET", "http://example.com/"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 取消的试探不应占住名额，下一个请求可以重新试探
+    assert breaker.before_request() is True
+
+
+def test_failed_half_open_probe_reopens():
+    breaker = CircuitBreaker("example.com", threshold=1, cooldown=30.0)
+    breaker.record_failure()
+    breaker.opened_at -= breaker.cooldown
+    assert breaker.before_request() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_hosts_lists_tripped_breakers():
+    policy = RequestPolicy(breaker_threshold=1)
+    policy.breaker("ok.example.com")
+    policy.breaker("down.example.com").record_failure()
+    assert policy.open_hosts() == ["down.example.com"]
+
+
+class _FakeResponse:
+    def __init__(self, status, body="{}", headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._body = body
+
+    async def text(self):
+        return self._body
+
+    async def json(self):
+        import json
+        return json.loads(self._body)
+
+    def raise_for_status(self):
+        pass
+
+
+class _ScriptedSession:
+    """按顺序返回预设响应的会话，记录请求次数"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        self.calls += 1
+        return self.responses.pop(0)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_429_is_retried_by_default():
+    policy = RequestPolicy(max_retries=3, backoff_base=0.0)
+    session = _ScriptedSession(_FakeResponse(429), _FakeResponse(200, '{"ok": 1}'))
+    response = asyncio.run(policy.request(session, "GET", "http://example.com/"))
+    assert response.status == 200 and session.calls == 2
+
+
+def test_retry_statuses_can_exclude_429():
+    policy = RequestPolicy(max_retries=3, backoff_base=0.0)
+    session = _ScriptedSession(_FakeResponse(429), _FakeResponse(200))
+    response = asyncio.run(policy.request(
+        session, "GET", "http://example.com/", raise_for_status=False, retry_statuses={500, 502, 503, 504},
+    ))
+    assert response.status == 429 and session.calls == 1
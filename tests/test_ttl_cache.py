@@ -0,0 +1,31 @@
+import time
+
+from balance_plugin.ttl_cache import TTLCache
+
+
+def test_expired_entry_is_dropped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(max_entries=4)
+    cache.put("a", 1, ttl=10.0)
+    now[0] += 4.0
+    assert cache.get("a") == (1, 4.0)
+    now[0] += 6.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2)
+    cache.put("a", 1, ttl=60.0)
+    cache.put("b", 2, ttl=60.0)
+    cache.get("a")
+    cache.put("c", 3, ttl=60.0)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_non_positive_ttl_is_not_stored():
+    cache = TTLCache(max_entries=2)
+    cache.put("a", 1, ttl=0.0)
+    assert cache.get("a") is None
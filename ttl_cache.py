@@ -0,0 +1,44 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """TTL+LRU 键值存储：条目按各自的TTL过期（读取时清除），超出容量时淘汰最久未使用的条目
+
+    余额缓存、DNS缓存与IP归属地缓存共用，各自决定每个条目的TTL。
+    """
+
+    __slots__ = ("max_entries", "_entries")
+
+    def __init__(self, max_entries):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # key -> (写入时间, 过期时间, 值)
+
+    def get(self, key):
+        """读取未过期的条目，返回 (值, 数据年龄秒数)，未命中返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, expires_at, value = entry
+        now = time.monotonic()
+        if now >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, now - stored_at
+
+    def put(self, key, value, ttl):
+        """写入条目，ttl 不大于 0 时不缓存"""
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        self._entries[key] = (now, now + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)